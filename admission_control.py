@@ -0,0 +1,235 @@
+import collections
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Lý do từ chối request
+REJECT_RATE_LIMITED = 'rate_limited'
+REJECT_QUEUE_FULL = 'queue_full'
+REJECT_DEADLINE = 'deadline'
+REJECT_DEADLINE_EXPIRED = 'deadline_expired'
+
+
+class Rejected(Exception):
+    """
+    Request bị từ chối trước khi chạy inference (trả về 503 kèm Retry-After)
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Request rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Class kiểm soát số frame được đưa vào model khi quá tải
+
+    Mỗi camera có token bucket (giới hạn tốc độ) và hàng đợi giới hạn độ dài.
+    Các camera cùng độ ưu tiên được phục vụ xoay vòng (fair queuing) nên một
+    camera gửi dồn dập không làm chậm camera khác; policy (ví dụ RiskScheduler)
+    có thể cho từng camera độ ưu tiên và tốc độ riêng, camera ưu tiên cao hơn
+    luôn được phục vụ trước. Thời gian chờ được ước tính từ số request
+    phía trước và thời gian xử lý trung bình; nếu không kịp deadline thì từ
+    chối ngay thay vì để request nằm chờ rồi trả kết quả đã cũ.
+    """
+
+    def __init__(self, rate=5.0, burst=10, queue_size=4, max_queued=32, deadline=2.0, concurrency=1,
+                 latency_window=1000, policy=None, observer=None):
+        """
+        Khởi tạo AdmissionController
+
+        Args:
+            rate (float): Số frame mỗi giây cho mỗi camera
+            burst (int): Số frame tối đa gửi dồn một lúc của mỗi camera
+            queue_size (int): Số request chờ tối đa của mỗi camera
+            max_queued (int): Số request chờ tối đa của tất cả camera
+            deadline (float): Thời gian tối đa từ lúc nhận đến lúc xử lý xong (giây)
+            concurrency (int): Số request được xử lý đồng thời
+            latency_window (int): Số request gần nhất dùng để tính phân vị latency
+            policy (callable): policy(camera_id) -> (priority, rate) cho từng camera (priority nhỏ được
+                phục vụ trước, burst tỉ lệ theo rate), None = cùng priority 0 và tốc độ rate
+            observer (callable): observer(wait, service) sau mỗi request (giây chờ, giây xử lý)
+        """
+        self.rate = rate
+        self.burst = burst
+        self.queue_size = queue_size
+        self.max_queued = max_queued
+        self.deadline = deadline
+        self.concurrency = concurrency
+        self.policy = policy
+        self.observer = observer
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._buckets = {}                     # camera_id -> [tokens, updated_at]
+        self._queues = {}                      # camera_id -> deque ticket
+        self._order = {}                       # priority -> deque camera đang có request chờ (thứ tự xoay vòng)
+        self._priority = {}                    # camera_id -> priority của hàng đợi hiện tại
+        self._active = 0
+        self._service_time = 0.2               # Thời gian xử lý trung bình (EWMA, giây)
+        self._latencies = collections.deque(maxlen=latency_window)
+        self._admitted = collections.Counter()
+        self._rejected = collections.defaultdict(collections.Counter)
+
+    @contextmanager
+    def admit(self, camera_id):
+        """
+        Xin lượt xử lý cho một frame, chờ đến lượt theo vòng camera
+
+        Raises:
+            Rejected: Vượt giới hạn tốc độ, hàng đợi đầy hoặc không kịp deadline
+        """
+        start = time.monotonic()
+        priority, rate = self.policy(camera_id) if self.policy is not None else (0, self.rate)
+        with self._cond:
+            self._check(camera_id, start, priority, rate)
+            ticket = next(self._seq)
+            queue = self._queues.setdefault(camera_id, collections.deque())
+            if self._priority.get(camera_id) != priority:
+                # Camera đổi độ ưu tiên: chuyển cả hàng đợi sang vòng mới
+                if camera_id in self._priority:
+                    self._order[self._priority[camera_id]].remove(camera_id)
+                self._order.setdefault(priority, collections.deque()).append(camera_id)
+                self._priority[camera_id] = priority
+            queue.append(ticket)
+
+            # Chờ đến khi camera này tới lượt và còn slot, chừa thời gian xử lý trong deadline
+            while self._active >= self.concurrency or self._next_camera() != camera_id or queue[0] != ticket:
+                remaining = start + self.deadline - self._service_time - time.monotonic()
+                if remaining <= 0:
+                    self._dequeue(camera_id, ticket)
+                    self._reject(camera_id, REJECT_DEADLINE_EXPIRED, self._estimated_wait(camera_id, priority))
+                self._cond.wait(remaining)
+
+            self._dequeue(camera_id, ticket)
+            self._active += 1
+            self._admitted[camera_id] += 1
+
+        service_start = time.monotonic()
+        try:
+            yield
+        finally:
+            finished = time.monotonic()
+            with self._cond:
+                self._active -= 1
+                self._service_time = 0.8 * self._service_time + 0.2 * (finished - service_start)
+                self._latencies.append(finished - start)
+                self._cond.notify_all()
+            if self.observer is not None:
+                self.observer(service_start - start, finished - service_start)
+
+    def _check(self, camera_id, now, priority, rate):
+        # Token bucket của camera, burst tỉ lệ theo tốc độ camera được phép
+        burst = max(1.0, self.burst * rate / self.rate)
+        tokens, updated_at = self._buckets.get(camera_id, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            self._buckets[camera_id] = [tokens, now]
+            self._reject(camera_id, REJECT_RATE_LIMITED, (1 - tokens) / rate)
+
+        queue = self._queues.get(camera_id, ())
+        queued = sum(len(q) for q in self._queues.values())
+        if len(queue) >= self.queue_size or queued >= self.max_queued:
+            self._buckets[camera_id] = [tokens, now]
+            self._reject(camera_id, REJECT_QUEUE_FULL, self._estimated_wait(camera_id, priority))
+
+        # Thời gian chờ ước tính + thời gian xử lý phải nằm trong deadline
+        wait = self._estimated_wait(camera_id, priority)
+        if wait + self._service_time > self.deadline:
+            self._buckets[camera_id] = [tokens, now]
+            self._reject(camera_id, REJECT_DEADLINE, wait)
+
+        self._buckets[camera_id] = [tokens - 1, now]
+
+    def _next_camera(self):
+        # Camera đầu vòng của mức ưu tiên cao nhất đang có request chờ
+        for priority in sorted(self._order):
+            if self._order[priority]:
+                return self._order[priority][0]
+        return None
+
+    def _estimated_wait(self, camera_id, priority):
+        # Trước request mới: mọi request ưu tiên cao hơn, và trong cùng mức (xoay vòng)
+        # tối đa len(queue) + 1 request của mỗi camera khác
+        own = len(self._queues.get(camera_id, ()))
+        ahead = own + self._active
+        for cam, queue in self._queues.items():
+            if cam == camera_id:
+                continue
+            if self._priority[cam] < priority:
+                ahead += len(queue)
+            elif self._priority[cam] == priority:
+                ahead += min(len(queue), own + 1)
+        return ahead * self._service_time / self.concurrency
+
+    def _dequeue(self, camera_id, ticket):
+        queue = self._queues[camera_id]
+        order = self._order[self._priority[camera_id]]
+        was_head = order[0] == camera_id and queue[0] == ticket
+        queue.remove(ticket)
+        if not queue:
+            order.remove(camera_id)
+            del self._queues[camera_id]
+            del self._priority[camera_id]
+        elif was_head:
+            # Camera vừa được phục vụ xuống cuối vòng
+            order.rotate(-1)
+        self._cond.notify_all()
+
+    def _reject(self, camera_id, reason, retry_after):
+        self._rejected[camera_id][reason] += 1
+        raise Rejected(reason, retry_after)
+
+    def load(self):
+        """
+        Mức tải hiện tại (0-1): tỉ lệ hàng đợi đã dùng hoặc thời gian chờ ước tính so với deadline
+        """
+        with self._cond:
+            return self._load()
+
+    def _load(self):
+        queued = sum(len(q) for q in self._queues.values())
+        wait = (queued + self._active) * self._service_time / self.concurrency
+        return min(1.0, max(queued / self.max_queued, wait / self.deadline))
+
+    def stats(self):
+        """
+        Số request được nhận/bị từ chối theo camera, độ dài hàng đợi và phân vị latency
+        """
+        with self._cond:
+            latencies = np.array(self._latencies) * 1000
+            cameras = set(self._admitted) | set(self._rejected) | set(self._queues)
+            return {
+                "load": round(self._load(), 3),
+                "active": self._active,
+                "queued": sum(len(q) for q in self._queues.values()),
+                "service_time_ms": round(self._service_time * 1000, 1),
+                "latency_ms": {
+                    "p50": round(float(np.percentile(latencies, 50)), 1),
+                    "p95": round(float(np.percentile(latencies, 95)), 1),
+                    "p99": round(float(np.percentile(latencies, 99)), 1),
+                    "max": round(float(latencies.max()), 1)
+                } if len(latencies) else None,
+                "admitted": sum(self._admitted.values()),
+                "rejected": dict(sum(self._rejected.values(), collections.Counter())),
+                "cameras": {
+                    camera_id: {
+                        "admitted": self._admitted[camera_id],
+                        "rejected": dict(self._rejected.get(camera_id, {})),
+                        "queued": len(self._queues.get(camera_id, ()))
+                    }
+                    for camera_id in sorted(cameras)
+                }
+            }
+
+
+def retry_after_header(retry_after):
+    """
+    Giá trị header Retry-After (số giây nguyên, tối thiểu 1)
+    """
+    return str(max(1, math.ceil(retry_after)))
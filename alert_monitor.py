@@ -0,0 +1,83 @@
+import threading
+from collections import Counter, deque
+
+
+class AlertMonitor:
+    """
+    Class để quyết định khi nào phát cảnh báo đuối nước từ chuỗi kết quả detect
+
+    Cảnh báo được phát khi:
+    1. Có ít nhất min_frames frame trong window_seconds giây gần nhất
+    2. Class drowning xuất hiện nhiều nhất trong khoảng thời gian đó
+    3. Chưa phát cảnh báo trong cooldown giây trước đó
+    """
+
+    def __init__(self, window_seconds=10, min_frames=5, cooldown=30, drowning_class=0):
+        """
+        Khởi tạo AlertMonitor
+
+        Args:
+            window_seconds (float): Độ dài cửa sổ lịch sử (giây)
+            min_frames (int): Số frame tối thiểu trong cửa sổ để xét cảnh báo
+            cooldown (float): Thời gian chờ giữa các cảnh báo (giây)
+            drowning_class (int): Class id của drowning
+        """
+        self.window_seconds = window_seconds
+        self.min_frames = min_frames
+        self.cooldown = cooldown
+        self.drowning_class = drowning_class
+
+        self.history = deque()
+        self.last_alert_time = None
+        self._lock = threading.Lock()
+
+    def update(self, classes, current_time):
+        """
+        Thêm kết quả detect của một frame và kiểm tra cảnh báo
+
+        Args:
+            classes (list): Class id detect được trong frame
+            current_time (float): Thời điểm của frame (giây)
+
+        Returns:
+            bool: True nếu cần phát cảnh báo
+        """
+        with self._lock:
+            self.history.append({
+                'time': current_time,
+                'classes': list(classes),
+                'count': len(classes)
+            })
+
+            # Chỉ giữ lịch sử trong cửa sổ gần nhất
+            while self.history and current_time - self.history[0]['time'] > self.window_seconds:
+                self.history.popleft()
+
+            if len(self.history) < self.min_frames:
+                return False
+
+            element_counts = Counter()
+            for d in self.history:
+                element_counts.update(d['classes'])
+            if not element_counts:
+                return False
+
+            most_common_class = max(element_counts, key=element_counts.get)
+            cooled_down = self.last_alert_time is None or current_time - self.last_alert_time > self.cooldown
+            if most_common_class == self.drowning_class and cooled_down:
+                self.last_alert_time = current_time
+                return True
+
+            return False
+
+    def export_state(self):
+        """
+        Lịch sử trong cửa sổ và thời điểm cảnh báo gần nhất (dạng JSON)
+        """
+        with self._lock:
+            return {"history": list(self.history), "last_alert_time": self.last_alert_time}
+
+    def import_state(self, state):
+        with self._lock:
+            self.history = deque(state.get('history', []))
+            self.last_alert_time = state.get('last_alert_time')
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Phân tích offline video đã ghi (không cần Streamlit)
+
+Video được chia thành các đoạn bắt đầu tại keyframe, mỗi đoạn được decode
+và detect theo batch trên một process riêng. Kết quả detect và các sự kiện
+cảnh báo được ghi ra file JSONL kèm timestamp của frame.
+
+Ví dụ:
+    python analyze_video.py video_3 --workers 4 --batch 16
+    python analyze_video.py /path/to/recording.mp4 --output runs/analysis/day1.jsonl
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+import settings
+from alert_monitor import AlertMonitor
+
+# Model của từng worker process, load một lần trong initializer
+_worker_model = None
+
+
+def get_video_info(video_path):
+    """
+    Lấy thông tin cơ bản của video
+
+    Returns:
+        dict: fps, frame_count, width, height
+    """
+    vid_cap = cv2.VideoCapture(str(video_path))
+    if not vid_cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    info = {
+        "fps": vid_cap.get(cv2.CAP_PROP_FPS) or 25.0,
+        "frame_count": int(vid_cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "width": int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    }
+    vid_cap.release()
+    return info
+
+
+def find_keyframes(video_path, fps):
+    """
+    Tìm vị trí các keyframe bằng ffprobe
+
+    Returns:
+        list: Chỉ số frame của các keyframe, None nếu không có ffprobe
+    """
+    if shutil.which('ffprobe') is None:
+        return None
+
+    try:
+        output = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+             '-show_entries', 'frame=pts_time', '-of', 'csv=p=0', str(video_path)],
+            capture_output=True, text=True, check=True, timeout=600
+        ).stdout
+    except (subprocess.SubprocessError, OSError) as e:
+        print(f"ffprobe failed, falling back to fixed chunks: {e}")
+        return None
+
+    keyframes = []
+    for line in output.splitlines():
+        line = line.strip().rstrip(',')
+        if line and line != 'N/A':
+            keyframes.append(int(round(float(line) * fps)))
+    return sorted(set(keyframes)) or None
+
+
+def plan_chunks(frame_count, fps, chunk_seconds, keyframes=None):
+    """
+    Chia video thành các đoạn [start, end), mỗi đoạn bắt đầu tại keyframe
+
+    Args:
+        frame_count (int): Tổng số frame
+        fps (float): FPS của video
+        chunk_seconds (float): Độ dài mong muốn của mỗi đoạn (giây)
+        keyframes (list): Chỉ số frame của các keyframe (None = chia đều)
+
+    Returns:
+        list: Danh sách (start_frame, end_frame)
+    """
+    chunk_frames = max(1, int(chunk_seconds * fps))
+    if keyframes:
+        starts = [0]
+        for keyframe in keyframes:
+            if 0 < keyframe < frame_count and keyframe - starts[-1] >= chunk_frames:
+                starts.append(keyframe)
+    else:
+        starts = list(range(0, frame_count, chunk_frames)) or [0]
+
+    ends = starts[1:] + [frame_count]
+    return [(start, end) for start, end in zip(starts, ends) if end > start]
+
+
+def iter_frame_batches(vid_cap, start, end, batch_size, stride=1):
+    """
+    Đọc frame [start, end) theo batch, bỏ qua frame theo stride mà không decode
+
+    Yields:
+        tuple: (danh sách chỉ số frame, danh sách frame BGR)
+    """
+    if start > 0:
+        vid_cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    indices, frames = [], []
+    for frame_idx in range(start, end):
+        if (frame_idx - start) % stride:
+            if not vid_cap.grab():
+                break
+            continue
+
+        success, frame = vid_cap.read()
+        if not success:
+            break
+        indices.append(frame_idx)
+        frames.append(frame)
+
+        if len(frames) >= batch_size:
+            yield indices, frames
+            indices, frames = [], []
+
+    if frames:
+        yield indices, frames
+
+
+def detection_record(result, frame_idx, fps):
+    """
+    Chuyển kết quả YOLO của một frame thành bản ghi JSON
+    """
+    boxes = result.boxes
+    record = {
+        "type": "detection",
+        "frame": frame_idx,
+        "timestamp": round(frame_idx / fps, 3),
+        "boxes": [],
+        "classes": [],
+        "confidences": []
+    }
+    if boxes is not None and len(boxes) > 0:
+        record["boxes"] = [[round(v, 1) for v in box] for box in boxes.xyxy.cpu().numpy().tolist()]
+        record["classes"] = [int(c) for c in boxes.cls.cpu().numpy().tolist()]
+        record["confidences"] = [round(c, 4) for c in boxes.conf.cpu().numpy().tolist()]
+    return record
+
+
+def _init_worker(model_path, threads_per_worker):
+    global _worker_model
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+    from ultralytics import YOLO
+    _worker_model = YOLO(model_path)
+
+
+def _analyze_chunk(task):
+    """
+    Detect một đoạn video trong worker process, ghi kết quả ra file tạm
+
+    Returns:
+        tuple: (chunk_index, part_path, số frame đã detect)
+    """
+    chunk_index, video_path, start, end, fps, options, part_path = task
+
+    vid_cap = cv2.VideoCapture(str(video_path))
+    processed = 0
+    with open(part_path, 'w') as part:
+        for indices, frames in iter_frame_batches(vid_cap, start, end, options['batch'], options['stride']):
+            results = _worker_model.predict(frames, conf=options['conf'], imgsz=options['imgsz'], verbose=False)
+            for frame_idx, result in zip(indices, results):
+                part.write(json.dumps(detection_record(result, frame_idx, fps)) + '\n')
+            processed += len(frames)
+    vid_cap.release()
+    return chunk_index, part_path, processed
+
+
+def analyze_video(video_path, output_path, model_path=settings.DROWNING_MODEL, workers=None,
+                  batch=16, chunk_seconds=60, conf=0.25, stride=1, imgsz=settings.MODEL_IMGSZ):
+    """
+    Phân tích toàn bộ video trên nhiều process
+
+    Returns:
+        dict: Thống kê kết quả
+    """
+    started = time.time()
+    info = get_video_info(video_path)
+    fps = info['fps']
+
+    keyframes = find_keyframes(video_path, fps)
+    chunks = plan_chunks(info['frame_count'], fps, chunk_seconds, keyframes)
+
+    workers = workers or min(len(chunks), os.cpu_count() or 1)
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    options = {'batch': batch, 'conf': conf, 'stride': stride, 'imgsz': imgsz}
+
+    print(f"Video: {video_path} ({info['frame_count']} frames, {fps:.1f} fps, {info['width']}x{info['height']})")
+    print(f"Chunks: {len(chunks)} ({'keyframe aligned' if keyframes else 'fixed size'}), workers: {workers}")
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='analysis-', dir=output_dir)
+
+    tasks = [
+        (i, video_path, start, end, fps, options, os.path.join(tmp_dir, f'part-{i:05d}.jsonl'))
+        for i, (start, end) in enumerate(chunks)
+    ]
+
+    frames_processed = 0
+    parts = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(model_path), threads_per_worker)) as executor:
+            for chunk_index, part_path, processed in executor.map(_analyze_chunk, tasks):
+                parts[chunk_index] = part_path
+                frames_processed += processed
+                print(f"  chunk {chunk_index + 1}/{len(chunks)} done ({processed} frames)")
+
+        # Ghép kết quả theo thứ tự và tính cảnh báo theo thời gian của video
+        alerts = _merge_parts([parts[i] for i in range(len(chunks))], output_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    elapsed = time.time() - started
+    video_seconds = info['frame_count'] / fps if fps else 0
+    summary = {
+        "video": str(video_path),
+        "output": str(output_path),
+        "frames_processed": frames_processed,
+        "alerts": alerts,
+        "elapsed_seconds": round(elapsed, 2),
+        "speed_x_realtime": round(video_seconds / elapsed, 2) if elapsed > 0 else None
+    }
+    return summary
+
+
+def _merge_parts(part_paths, output_path):
+    alert_monitor = AlertMonitor(window_seconds=10, min_frames=5, cooldown=30)
+    alerts = 0
+    with open(output_path, 'w') as output:
+        for part_path in part_paths:
+            with open(part_path) as part:
+                for line in part:
+                    output.write(line)
+                    record = json.loads(line)
+                    if alert_monitor.update(record['classes'], record['timestamp']):
+                        alerts += 1
+                        output.write(json.dumps({
+                            "type": "alert",
+                            "frame": record['frame'],
+                            "timestamp": record['timestamp'],
+                            "message": settings.alertmsg
+                        }, ensure_ascii=False) + '\n')
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline drowning analysis of recorded video')
+    parser.add_argument('video', help='Video file path or a key of settings.VIDEOS_DICT')
+    parser.add_argument('--output', default=None, help='Output JSONL file (default: runs/analysis/<video>.jsonl)')
+    parser.add_argument('--model', default=settings.DROWNING_MODEL, help='Path to model file (default: best.pt)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--batch', type=int, default=16, help='Frames per inference batch (default: 16)')
+    parser.add_argument('--chunk-seconds', type=float, default=60, help='Target chunk length in seconds (default: 60)')
+    parser.add_argument('--confidence', type=float, default=0.25, help='Confidence threshold (default: 0.25)')
+    parser.add_argument('--stride', type=int, default=1, help='Analyze every Nth frame (default: 1)')
+    parser.add_argument('--imgsz', type=int, default=settings.MODEL_IMGSZ, help='Model input size')
+
+    args = parser.parse_args()
+
+    video_path = settings.VIDEOS_DICT.get(args.video, args.video)
+    if not os.path.exists(video_path):
+        print(f"Error: Video '{video_path}' not found!")
+        sys.exit(1)
+
+    output_path = args.output or os.path.join('runs', 'analysis', f"{os.path.splitext(os.path.basename(str(video_path)))[0]}.jsonl")
+
+    summary = analyze_video(video_path, output_path, args.model, args.workers, args.batch,
+                            args.chunk_seconds, args.confidence, max(1, args.stride), args.imgsz)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import cv2
 import numpy as np
@@ -7,23 +7,65 @@ import io
 from PIL import Image
 import os
 import time
-from collections import Counter
+import threading
+import math
+import json
+import functools
+import queue
 import settings
-from helper import load_model, send_message, autoplay_audio
-from distance_estimator import DistanceEstimator, estimate_distances_from_yolo_results
+from helper import send_message, autoplay_audio
+from model_registry import ModelRegistry
+from alert_monitor import AlertMonitor
+from distance_estimator import DistanceEstimator, estimate_distances_from_boxes
+from preprocess import LetterboxPreprocessor, PreprocessorPool
+from frame_renderer import draw_boxes
+from inference_gate import InferenceGate, PRIORITY_LIVE
+from admission_control import AdmissionController, Rejected, retry_after_header
+from risk_scheduler import RiskScheduler
+from degradation_controller import DegradationController, default_levels
+from video_jobs import VideoJobQueue
+from detection_log import DetectionLog, safe_camera_id
+from detection_stats import DetectionStats
 from rescue_coordinates import RescueCoordinates
+from rescue_dispatch import RescueDispatcher
+from target_tracker import TargetTracker
+from box_tracking import CameraBoxTrackers
+from intercept_solver import current_vector
+from fleet_assignment import FleetAssigner
+from current_field import CurrentField
+from water_mask import WaterMask, WaterMaskStore
+from tracing import tracer, current_trace_id
+from compact_encoding import (MIMETYPES, FastJSONProvider, negotiate, encode, compact_detection, compact_command,
+                              compact_update, pack_detection, pack_command)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson, serialize trực tiếp giá trị NumPy
 CORS(app)  # Cho phép CORS để vi mạch có thể gọi API
 
-# Load model khi khởi động
-model_path = 'best.pt'
+# Load model khi khởi động, registry giữ model và cho phép hot-swap weights
+model_path = settings.DROWNING_MODEL
+model_registry = ModelRegistry(model_path)
 try:
-    model = load_model(model_path)
+    model_registry.get()
     print("Model loaded successfully!")
 except Exception as ex:
     print(f"Error loading model: {ex}")
-    model = None
+
+# Thứ tự chạy inference: frame trực tiếp luôn chạy trước job phân tích video
+inference_gate = InferenceGate(concurrency=settings.INFERENCE_CONCURRENCY)
+
+# Hàng đợi job phân tích video chạy nền
+video_jobs = VideoJobQueue(settings.VIDEO_JOBS_DIR, model_registry, inference_gate,
+                           workers=settings.VIDEO_JOB_WORKERS, batch_size=settings.VIDEO_JOB_BATCH)
+
+# Log kết quả detect lâu dài, chia partition theo camera và theo giờ
+detection_log = DetectionLog(settings.DETECTION_LOG_DIR, flush_interval=settings.DETECTION_LOG_FLUSH_SECONDS)
+
+# Thống kê theo camera (phút/giờ/ngày) cho dashboard và phao
+detection_stats = DetectionStats()
+
+# Buffer input model dùng lại giữa các request
+preprocessors = PreprocessorPool(imgsz=settings.MODEL_IMGSZ)
 
 # Khởi tạo distance estimator
 distance_estimator = DistanceEstimator(known_width=50)  # Chiều rộng người trung bình ~50cm
@@ -31,12 +73,379 @@ distance_estimator = DistanceEstimator(known_width=50)  # Chiều rộng ngườ
 # Khởi tạo rescue coordinates calculator
 rescue_calculator = RescueCoordinates(camera_height=5.0, camera_angle=0.0)
 
-# Biến để theo dõi thời gian và kết quả detect
-detection_history = []
-last_alert_time = 0
+# Đẩy lệnh cứu hộ tới phao (long-poll / SSE), chỉ gửi target thay đổi
+rescue_dispatcher = RescueDispatcher()
+
+# Lọc vị trí/vận tốc target theo thời gian, lệnh cứu hộ dùng vị trí đã lọc
+target_tracker = TargetTracker(max_age=settings.TRACK_MAX_AGE)
+# Track id của box theo từng camera (model dùng chung nên không dùng model.track(persist=True))
+box_trackers = CameraBoxTrackers(settings.BOX_TRACKER)
+rescue_dispatch = {}      # camera_id -> {"until", "classes", "min_hits"} khi đang đẩy lệnh cứu hộ
+rescue_environments = {}  # camera_id -> thông số môi trường gần nhất
+
+# Phân công phao cho người gặp nạn (nhiều phao, nhiều target)
+fleet = FleetAssigner()
+
+# Trường dòng chảy dạng lưới, thay cho current_direction/current_speed khi có
+current_field = None
+if os.path.exists(settings.CURRENT_FIELD_PATH):
+    try:
+        current_field = CurrentField.from_file(settings.CURRENT_FIELD_PATH)
+        fleet.set_current_field(current_field)
+        print(f"Current field loaded: {current_field.info()['grid']}")
+    except Exception as ex:
+        print(f"Error loading current field: {ex}")
+
+# Vùng mặt nước của từng camera: crop frame trước inference, bỏ detection ngoài mặt nước
+water_masks = WaterMaskStore(settings.WATER_MASK_DIR)
+segmentation_model = None  # Chỉ load khi tạo mask bằng segmentation
+
+# Theo dõi kết quả detect của từng camera để quyết định cảnh báo
 ALERT_COOLDOWN = 30  # Thời gian chờ giữa các cảnh báo (giây)
+alert_monitors = {}  # camera_id -> AlertMonitor
+alert_monitors_lock = threading.Lock()
+
+def _alert_monitor(camera_id):
+    with alert_monitors_lock:
+        monitor = alert_monitors.get(camera_id)
+        if monitor is None:
+            monitor = alert_monitors[camera_id] = AlertMonitor(window_seconds=10, min_frames=5, cooldown=ALERT_COOLDOWN)
+        return monitor
+
+# Camera có dấu hiệu đuối nước được inference trước và nhận nhiều frame hơn camera yên tĩnh
+risk_scheduler = RiskScheduler(
+    half_life=settings.RISK_HALF_LIFE,
+    alert_seconds=ALERT_COOLDOWN,
+    min_rate=settings.RISK_MIN_RATE,
+    max_rate=settings.RISK_MAX_RATE,
+    quiet_capture_rate=settings.RISK_QUIET_CAPTURE_RATE
+)
+
+# Quá tải kéo dài: tự giảm chất lượng xử lý theo từng mức, khôi phục khi latency về lại mục tiêu
+light_model_path = settings.LIGHT_DROWNING_MODEL
+if light_model_path:
+    try:
+        model_registry.get(light_model_path)
+    except Exception as ex:
+        print(f"Error loading light model, skipping LIGHT_MODEL level: {ex}")
+        light_model_path = None
+
+def _on_degradation(level_name, profile):
+    risk_scheduler.quiet_rate_scale = profile['quiet_rate_scale']
+
+degradation = DegradationController(
+    default_levels(settings.MODEL_IMGSZ, settings.DEGRADED_IMGSZ, None, light_model_path,
+                   settings.DEGRADED_QUIET_RATE_SCALE),
+    settings.SLO_TARGETS,
+    on_change=_on_degradation
+)
+
+def _observe_admission(wait, service):
+    degradation.observe('queue', wait)
+    degradation.observe('total', wait + service)
+
+# Giới hạn frame trực tiếp khi quá tải: từ chối sớm (503) thay vì để mọi camera cùng chậm
+admission = AdmissionController(
+    rate=settings.ADMISSION_RATE,
+    burst=settings.ADMISSION_BURST,
+    queue_size=settings.ADMISSION_QUEUE_SIZE,
+    max_queued=settings.ADMISSION_MAX_QUEUED,
+    deadline=settings.ADMISSION_DEADLINE,
+    concurrency=settings.INFERENCE_CONCURRENCY,
+    policy=risk_scheduler.policy,
+    observer=_observe_admission
+)
+
+# Cảnh báo chờ gửi: (camera_id, ảnh cảnh báo, trace id)
+alert_queue = queue.Queue()
+
+def _alert_loop():
+    """
+    Gửi cảnh báo tuần tự ngoài request: upload imgbb + Twilio mất vài giây, không được
+    giữ lượt inference của các camera khác
+    """
+    alert_dir = os.path.join('runs', 'alerts')
+    while True:
+        camera_id, alert_frame, trace_id = alert_queue.get()
+        with tracer.trace('alert', trace_id=trace_id, camera_id=camera_id):
+            try:
+                # Gửi đúng frame đang cảnh báo: runs/detect/predict có thể không có ảnh mới (NO_ANNOTATIONS)
+                # hoặc là ảnh của camera khác (runs/detect bị xóa mỗi request nên lưu ngoài đó)
+                os.makedirs(alert_dir, exist_ok=True)
+                alert_image = os.path.join(alert_dir, f"{safe_camera_id(camera_id)}.jpg")
+                cv2.imwrite(alert_image, alert_frame)
+                send_message(alert_image)
+                print(f"Drowning alert sent for {camera_id}!")
+            except Exception as e:
+                print(f"Error sending alert for {camera_id}: {e}")
+
+threading.Thread(target=_alert_loop, name='alert-sender', daemon=True).start()
+
+def _track_targets(camera_id, distance_info, timestamp, water_level=0.0):
+    """
+    Đưa vị trí đo được trong frame vào bộ lọc target của camera
+    
+    Returns:
+        list: Target đã lọc tương ứng với các đối tượng có khoảng cách
+    """
+    measured = [obj for obj in distance_info
+                if obj.get('distance_m') and 'angle_x_degrees' in obj and 'angle_y_degrees' in obj]
+    positions = [
+        rescue_calculator.position_from_angles(
+            obj['distance_m'], obj['angle_x_degrees'], obj['angle_y_degrees'], water_level
+        )
+        for obj in measured
+    ]
+    meta = [
+        {
+            "object_id": obj.get('object_id', 0),
+            "class_id": obj.get('class_id', 0),
+            "confidence": obj.get('confidence', 0.0)
+        }
+        for obj in measured
+    ]
+    return target_tracker.update(camera_id, timestamp, positions, [obj.get('track_id') for obj in measured], meta)
+
+def _plan_rescue_targets(tracked_targets, current_direction=0.0, current_speed=0.0):
+    """
+    Tính tọa độ và lệnh cứu hộ từ vị trí đã lọc của các target
+    
+    Returns:
+        list: Thông tin cứu hộ, sắp xếp theo mức độ ưu tiên
+    """
+    rescue_targets = []
+    for target in tracked_targets:
+        # Vận tốc chỉ tin cậy khi target đã được đo vài lần, trước đó coi như trôi theo dòng chảy
+        velocity = (target['vx_mps'], target['vy_mps']) if target['hits'] >= settings.TRACK_MIN_HITS else None
+        rescue_info = rescue_calculator.calculate_rescue_from_position(
+            target['x_m'],
+            target['y_m'],
+            target['z_m'],
+            current_direction,
+            current_speed,
+            velocity=velocity,
+            current_field=current_field
+        )
+        
+        # Thêm thông tin đối tượng
+        rescue_info['track_id'] = target['track_id']
+        rescue_info['object_id'] = target.get('object_id', 0)
+        rescue_info['class_id'] = target.get('class_id', 0)
+        rescue_info['confidence'] = target.get('confidence', 0.0)
+        rescue_info['position'] = {
+            "x_m": round(target['x_m'], 2),
+            "y_m": round(target['y_m'], 2)
+        }
+        rescue_info['velocity'] = {
+            "vx_mps": round(velocity[0], 2),
+            "vy_mps": round(velocity[1], 2)
+        } if velocity is not None else None
+        
+        # Tạo lệnh điều khiển cho phao
+        rescue_info['commands'] = rescue_calculator.get_rescue_commands(rescue_info)
+        
+        rescue_targets.append(rescue_info)
+    
+    # Sắp xếp theo mức độ ưu tiên
+    rescue_targets.sort(key=lambda x: x['urgency']['priority'])
+    return rescue_targets
+
+def _rescue_environment(data):
+    """
+    Đọc thông số môi trường từ request và cập nhật thông số camera nếu cần
+    
+    Returns:
+        dict: water_level, current_direction, current_speed, camera_height, camera_angle
+    """
+    environment = {
+        "water_level": float(data.get('water_level', 0.0)),
+        "current_direction": float(data.get('current_direction', 0.0)),
+        "current_speed": float(data.get('current_speed', 0.0)),
+        "camera_height": float(data.get('camera_height', 5.0)),
+        "camera_angle": float(data.get('camera_angle', 0.0))
+    }
+    
+    # Cập nhật thông số camera nếu cần
+    global rescue_calculator
+    if (environment['camera_height'] != rescue_calculator.camera_height or
+            environment['camera_angle'] != math.degrees(rescue_calculator.camera_angle)):
+        rescue_calculator = RescueCoordinates(environment['camera_height'], environment['camera_angle'])
+    
+    return environment
+
+def _publish_rescue_targets(camera_id, rescue_targets, assignments=None):
+    """
+    Đẩy lệnh cứu hộ của một camera tới các phao đang subscribe
+    
+    Args:
+        assignments (dict): target_id -> phân công phao từ FleetAssigner
+    
+    Returns:
+        int: Version của danh sách lệnh
+    """
+    targets = {}
+    for rescue_info in rescue_targets:
+        target_id = f"{camera_id}:{rescue_info['track_id']}"
+        targets[target_id] = {
+            "scope": camera_id,
+            "target_id": target_id,
+            "camera_id": camera_id,
+            "track_id": rescue_info['track_id'],
+            "class_id": rescue_info['class_id'],
+            "priority": rescue_info['urgency']['priority'],
+            "commands": rescue_info['commands'],
+            "assignment": (assignments or {}).get(target_id)
+        }
+    return rescue_dispatcher.publish(camera_id, targets)
+
+def _dispatch_camera(camera_id, now):
+    """
+    Tính lại lệnh cứu hộ của camera từ target đã lọc (dự đoán tới now) và đẩy tới phao
+    
+    Returns:
+        int: Version của danh sách lệnh
+    """
+    dispatch = rescue_dispatch.get(camera_id)
+    if dispatch is None or dispatch['until'] < now:
+        rescue_dispatch.pop(camera_id, None)
+        fleet.set_targets(camera_id, [])
+        return _publish_rescue_targets(camera_id, [])
+    
+    tracked = [
+        target for target in target_tracker.targets(camera_id, now, min_hits=dispatch['min_hits'])
+        if dispatch['classes'] is None or target.get('class_id') in dispatch['classes']
+    ]
+    environment = rescue_environments.get(camera_id, {})
+    rescue_targets = _plan_rescue_targets(
+        tracked,
+        environment.get('current_direction', 0.0),
+        environment.get('current_speed', 0.0)
+    )
+    
+    # Phân công lại phao khi target thay đổi
+    fleet.set_targets(camera_id, [
+        {
+            "target_id": f"{camera_id}:{rescue_info['track_id']}",
+            "x_m": rescue_info['position']['x_m'],
+            "y_m": rescue_info['position']['y_m'],
+            "velocity": (rescue_info['velocity']['vx_mps'], rescue_info['velocity']['vy_mps'])
+                        if rescue_info['velocity'] else None,
+            "priority": rescue_info['urgency']['priority']
+        }
+        for rescue_info in rescue_targets
+    ], current_vector(environment.get('current_direction', 0.0), environment.get('current_speed', 0.0)))
+    assignments = {a['target_id']: a for a in fleet.solve(now)['assignments']}
+    return _publish_rescue_targets(camera_id, rescue_targets, assignments)
+
+def _camera_state_ids():
+    """
+    Các camera đang có trạng thái trên API instance này
+    """
+    with alert_monitors_lock:
+        cameras = set(alert_monitors)
+    cameras.update(target_tracker.camera_ids(), rescue_dispatch, rescue_environments,
+                   risk_scheduler.camera_ids(), water_masks.camera_ids())
+    return sorted(cameras)
+
+def _export_camera_state(camera_id, drop=False):
+    """
+    Trạng thái gắn với một camera (lịch sử cảnh báo, target đang theo dõi, lệnh cứu hộ,
+    môi trường, điểm rủi ro, mask mặt nước) dạng JSON để chuyển camera sang instance khác
+    
+    Args:
+        drop (bool): Xóa trạng thái của camera khỏi instance này và rút lệnh cứu hộ của camera
+    """
+    with alert_monitors_lock:
+        monitor = alert_monitors.pop(camera_id, None) if drop else alert_monitors.get(camera_id)
+    dispatch = rescue_dispatch.pop(camera_id, None) if drop else rescue_dispatch.get(camera_id)
+    environment = rescue_environments.pop(camera_id, None) if drop else rescue_environments.get(camera_id)
+    water_mask = water_masks.get(camera_id)
+    state = {
+        "alert": monitor.export_state() if monitor is not None else None,
+        "targets": target_tracker.export_camera(camera_id, drop=drop),
+        "dispatch": dict(dispatch, classes=sorted(dispatch['classes']) if dispatch['classes'] is not None else None)
+                    if dispatch is not None else None,
+        "environment": environment,
+        "risk": risk_scheduler.export_state(camera_id, drop=drop),
+        "water_mask": water_mask.to_dict() if water_mask is not None else None
+    }
+    if drop:
+        water_masks.remove(camera_id)
+        box_trackers.remove(camera_id)
+        fleet.set_targets(camera_id, [])
+        _publish_rescue_targets(camera_id, [])
+    return state
+
+def _import_camera_state(camera_id, state):
+    """
+    Nhận trạng thái camera từ _export_camera_state của instance khác
+    """
+    if state.get('alert') is not None:
+        _alert_monitor(camera_id).import_state(state['alert'])
+    if state.get('targets') is not None:
+        target_tracker.import_camera(camera_id, state['targets'])
+    if state.get('environment') is not None:
+        rescue_environments[camera_id] = state['environment']
+    if state.get('risk') is not None:
+        risk_scheduler.import_state(camera_id, state['risk'])
+    if state.get('water_mask') is not None:
+        water_masks.set(camera_id, WaterMask.from_dict(state['water_mask']))
+    dispatch = state.get('dispatch')
+    if dispatch is not None:
+        rescue_dispatch[camera_id] = dict(dispatch, classes=set(dispatch['classes'])
+                                          if dispatch['classes'] is not None else None)
+        # Phao subscribe instance này nhận lại lệnh cứu hộ đang chạy của camera
+        _dispatch_camera(camera_id, time.time())
+
+def _rescue_publish_loop():
+    """
+    Đẩy target đã lọc tới phao theo chu kỳ cố định, kể cả giữa các frame
+    """
+    while True:
+        time.sleep(settings.TRACK_PUBLISH_INTERVAL)
+        now = time.time()
+        for camera_id in list(rescue_dispatch.copy()):
+            try:
+                _dispatch_camera(camera_id, now)
+            except Exception as e:
+                print(f"Error publishing rescue targets for {camera_id}: {e}")
+
+threading.Thread(target=_rescue_publish_loop, name='rescue-publish', daemon=True).start()
 
-def detect_drowning(image, confidence=0.25, estimate_distance=True):
+def _rejected_response(rejected):
+    """
+    503 cho frame bị từ chối, client nên gửi lại sau Retry-After giây
+    """
+    retry_after = retry_after_header(rejected.retry_after)
+    return jsonify({
+        "error": "Server overloaded, frame rejected",
+        "reason": rejected.reason,
+        "retry_after": float(retry_after)
+    }), 503, {"Retry-After": retry_after}
+
+def _traced(view):
+    """
+    Trace frame của request detect (theo sample rate, hoặc luôn trace nếu camera gửi header X-Trace-Id),
+    trace id được trả lại trong header X-Trace-Id
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with tracer.trace(request.path.strip('/'), trace_id=request.headers.get('X-Trace-Id'),
+                          camera_id=request.args.get('camera_id')) as trace_id:
+            response = app.make_response(view(*args, **kwargs))
+        if trace_id is not None:
+            response.headers['X-Trace-Id'] = trace_id
+        return response
+    return wrapper
+
+def _response_encoding(encodings=('json', 'msgpack', 'struct')):
+    """
+    Định dạng response theo Accept header hoặc query param ?format=json|msgpack|struct
+    """
+    return negotiate(request.accept_mimetypes, request.args.get('format'), encodings)
+
+def detect_drowning(image, confidence=0.25, estimate_distance=True, camera_id='default',
+                    plan_rescue=False, environment=None):
     """
     Detect drowning trong hình ảnh
     
@@ -44,81 +453,136 @@ def detect_drowning(image, confidence=0.25, estimate_distance=True):
         image: PIL Image hoặc numpy array
         confidence: Ngưỡng confidence
         estimate_distance: Có ước tính khoảng cách hay không
+        camera_id: Id camera gửi ảnh
+        plan_rescue: Có trả về tọa độ và lệnh cứu hộ trong response hay không
+        environment: Thông số môi trường từ _rescue_environment (mặc định không có dòng chảy)
     
     Returns:
         dict: Kết quả detect
     """
-    global detection_history, last_alert_time, distance_estimator
+    global distance_estimator
     
-    if model is None:
+    if not model_registry.is_loaded():
         return {"error": "Model not loaded"}
     
     try:
-        # Xóa thư mục runs cũ
-        directory = "runs/detect"
-        if os.path.exists(directory):
-            for entry in os.listdir(directory):
-                path = os.path.join(directory, entry)
-                if os.path.isdir(path):
-                    import shutil
-                    shutil.rmtree(path)
-        
-        # Thực hiện predict
-        results = model.predict(image, conf=confidence, save=True, name='predict')
+        # Chuyển PIL Image sang numpy BGR như frame camera
+        if isinstance(image, Image.Image):
+            with tracer.span('decode'):
+                image = cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+        image_shape = image.shape[:2]  # (height, width)
+        
+        # Chỉ đưa vùng bao mặt nước của camera vào model (nếu đã có mask)
+        water_mask = water_masks.get(camera_id)
+        frame, offset = water_mask.crop(image) if water_mask is not None else (image, (0, 0))
+        
+        # Chỉ preprocess + inference giữ lượt admission control; tracking, dispatch và gửi cảnh báo
+        # chạy sau khi trả lượt để không làm camera khác chờ (và bị từ chối) theo
+        with admission.admit(camera_id):
+            # Mức giảm chất lượng hiện tại: kích thước input, model, có lưu ảnh annotate không
+            profile = degradation.profile()
+            # Khoảng từ đầu trace tới đây là thời gian chờ admission control
+            tracer.event('admitted', camera_id=camera_id, level=degradation.level)
+            
+            # Xóa thư mục runs cũ
+            directory = "runs/detect"
+            if profile['annotate'] and os.path.exists(directory):
+                for entry in os.listdir(directory):
+                    path = os.path.join(directory, entry)
+                    if os.path.isdir(path):
+                        import shutil
+                        shutil.rmtree(path)
+            
+            # Resize + pad một lần vào buffer input của model, ultralytics không resample lại.
+            # Request giữ model đang dùng kể cả khi có swap
+            with preprocessors.acquire(profile['imgsz']) as preprocessor:
+                with tracer.span('preprocess'):
+                    model_input, letterbox = preprocessor.process(frame)
+                with inference_gate.slot(PRIORITY_LIVE), model_registry.acquire(profile['model_path']) as model:
+                    inference_start = time.monotonic()
+                    with tracer.span('inference', imgsz=preprocessor.imgsz, annotate=profile['annotate']):
+                        results = model.predict(model_input, imgsz=preprocessor.imgsz, conf=confidence,
+                                                save=profile['annotate'], name='predict')
+                    degradation.observe('inference', time.monotonic() - inference_start)
+                # results[0].orig_img là buffer letterbox dùng chung của pool: không dùng results sau khi trả buffer
+                boxes, names = results[0].boxes, results[0].names
         
         # Lấy kết quả
-        boxes = results[0].boxes
         detected_classes = []
+        confidences = []
+        class_ids = scores = np.empty(0, dtype=np.float32)
+        bboxes = np.empty((0, 4), dtype=np.float32)
         distance_info = []
         
         if boxes is not None and len(boxes) > 0:
-            detected_classes = boxes.cls.cpu().numpy().tolist()
+            class_ids = boxes.cls.cpu().numpy()
+            scores = boxes.conf.cpu().numpy()
             
-            # Ước tính khoảng cách nếu được yêu cầu
-            if estimate_distance and distance_estimator.focal_length is not None:
-                # Chuyển PIL Image sang numpy array để lấy shape
-                if hasattr(image, 'size'):
-                    image_shape = (image.size[1], image.size[0])  # (height, width)
-                else:
-                    image_shape = image.shape[:2]  # (height, width)
-                
-                distance_info = estimate_distances_from_yolo_results(
-                    results, image_shape, distance_estimator, method='width'
-                )
+            # Đưa box về pixel của ảnh gốc
+            bboxes = LetterboxPreprocessor.map_boxes(boxes.xyxy.cpu().numpy(), letterbox)
+            bboxes += np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+            
+            # Bỏ detection có tâm nằm ngoài mặt nước (bờ, boong tàu, bãi đỗ xe)
+            if water_mask is not None:
+                on_water = water_mask.contains(bboxes, image_shape)
+                class_ids, scores, bboxes = class_ids[on_water], scores[on_water], bboxes[on_water]
+            detected_classes = class_ids.tolist()
+            confidences = scores.tolist()
+        
+        # Frame không có box vẫn cập nhật tracker để track bị mất được xóa đúng hạn
+        with tracer.span('box_tracking', objects=len(bboxes)):
+            track_ids = box_trackers.update(camera_id, bboxes, scores, class_ids, image)
+        
+        # Ước tính khoảng cách nếu được yêu cầu
+        if estimate_distance and distance_estimator.focal_length is not None and len(bboxes):
+            distance_info = estimate_distances_from_boxes(
+                bboxes, scores, class_ids, image_shape, distance_estimator, method='width'
+            )
+            for obj in distance_info:
+                obj['track_id'] = track_ids[obj['object_id']]
         
-        # Thêm vào lịch sử
+        # Thêm vào lịch sử (10 giây gần nhất) và kiểm tra cảnh báo
         current_time = time.time()
-        detection_history.append({
-            'time': current_time,
-            'classes': detected_classes,
-            'count': len(detected_classes)
-        })
+        alert_monitor = _alert_monitor(camera_id)
+        alert_triggered = alert_monitor.update(detected_classes, current_time)
         
-        # Chỉ giữ lịch sử trong 10 giây gần nhất
-        detection_history = [d for d in detection_history if current_time - d['time'] <= 10]
+        # Lưu vào detection log (ghi nền theo batch)
+        distances = [None] * len(detected_classes)
+        for obj in distance_info:
+            distances[obj['object_id']] = obj['distance_m']
+        detection_log.append(camera_id, current_time, bboxes, detected_classes, confidences, distances)
+        detection_stats.record(camera_id, detected_classes, confidences, alert_triggered, current_time)
+        risk_scheduler.record(camera_id, detected_classes, confidences, alert_triggered, current_time)
         
-        # Kiểm tra cảnh báo
-        alert_triggered = False
-        if len(detection_history) >= 5:  # Cần ít nhất 5 frame
-            all_classes = []
-            for d in detection_history:
-                all_classes.extend(d['classes'])
-            
-            if all_classes:
-                element_counts = Counter(all_classes)
-                most_common_class = max(element_counts, key=element_counts.get)
-                
-                # Class 0 là drowning
-                if most_common_class == 0 and current_time - last_alert_time > ALERT_COOLDOWN:
-                    alert_triggered = True
-                    last_alert_time = current_time
-                    
-                    # Gửi cảnh báo
-                    try:
-                        send_message()
-                        print("Drowning alert sent!")
-                    except Exception as e:
-                        print(f"Error sending alert: {e}")
+        if alert_triggered:
+            # Gửi cảnh báo trên luồng alert-sender (upload imgbb + Twilio mất vài giây)
+            tracer.event('alert_triggered', camera_id=camera_id)
+            # Vẽ box đã đưa về pixel ảnh gốc lên chính frame camera (image không dùng nữa sau bước này)
+            alert_frame = draw_boxes(image, bboxes, class_ids, scores, track_ids, names)
+            alert_queue.put((camera_id, alert_frame, current_trace_id()))
+        
+        # Cập nhật vị trí đã lọc của các target
+        if environment is not None:
+            rescue_environments[camera_id] = environment
+        environment = rescue_environments.get(camera_id, {})
+        tracked = _track_targets(camera_id, distance_info, current_time, environment.get('water_level', 0.0))
+        
+        rescue_targets = []
+        if plan_rescue:
+            rescue_targets = _plan_rescue_targets(
+                tracked,
+                environment.get('current_direction', 0.0),
+                environment.get('current_speed', 0.0)
+            )
+        
+        # Khi cảnh báo, đẩy lệnh cứu hộ cho người đuối nước tới phao trong thời gian cooldown
+        if alert_triggered:
+            rescue_dispatch[camera_id] = {
+                "until": current_time + ALERT_COOLDOWN,
+                "classes": {alert_monitor.drowning_class},
+                "min_hits": settings.TRACK_MIN_HITS
+            }
+        rescue_version = _dispatch_camera(camera_id, current_time)
         
         # Tạo response
         response = {
@@ -127,6 +591,7 @@ def detect_drowning(image, confidence=0.25, estimate_distance=True):
             "classes": detected_classes,
             "alert_triggered": alert_triggered,
             "confidence": confidence,
+            "camera_id": camera_id,
             "timestamp": current_time
         }
         
@@ -137,8 +602,18 @@ def detect_drowning(image, confidence=0.25, estimate_distance=True):
         else:
             response["distance_estimation_enabled"] = False
         
+        # Gợi ý nhịp chụp và chất lượng ảnh cho camera theo rủi ro và tải của server
+        response["capture"] = risk_scheduler.capture_advice(camera_id, admission.load(), current_time)
+        
+        if plan_rescue:
+            response["rescue_targets"] = rescue_targets
+            response["highest_priority"] = rescue_targets[0]['urgency']['level'] if rescue_targets else None
+            response["rescue_version"] = rescue_version
+        
         return response
         
+    except Rejected:
+        raise
     except Exception as e:
         return {"error": str(e)}
 
@@ -147,11 +622,12 @@ def health_check():
     """Kiểm tra trạng thái API"""
     return jsonify({
         "status": "healthy",
-        "model_loaded": model is not None,
+        "model_loaded": model_registry.is_loaded(),
         "timestamp": time.time()
     })
 
 @app.route('/detect', methods=['POST'])
+@_traced
 def detect_image():
     """
     API endpoint để detect drowning trong hình ảnh
@@ -162,6 +638,7 @@ def detect_image():
     """
     try:
         confidence = float(request.args.get('confidence', 0.25))
+        data = {}
         
         # Kiểm tra content type
         if request.content_type and 'application/json' in request.content_type:
@@ -190,13 +667,17 @@ def detect_image():
         
         # Thực hiện detect
         estimate_distance = request.args.get('estimate_distance', 'true').lower() == 'true'
-        result = detect_drowning(image, confidence, estimate_distance)
+        camera_id = request.args.get('camera_id') or request.form.get('camera_id') or data.get('camera_id', 'default')
+        result = detect_drowning(image, confidence, estimate_distance, camera_id)
         return jsonify(result)
         
+    except Rejected as e:
+        return _rejected_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/detect_base64', methods=['POST'])
+@_traced
 def detect_base64():
     """
     API endpoint đơn giản chỉ nhận base64 image
@@ -213,9 +694,229 @@ def detect_base64():
         # Thực hiện detect
         confidence = float(request.args.get('confidence', 0.25))
         estimate_distance = request.args.get('estimate_distance', 'true').lower() == 'true'
-        result = detect_drowning(image, confidence, estimate_distance)
+        camera_id = request.args.get('camera_id') or data.get('camera_id', 'default')
+        result = detect_drowning(image, confidence, estimate_distance, camera_id)
+        
+        # Vi mạch có thể yêu cầu định dạng rút gọn (Accept: application/msgpack / application/octet-stream)
+        encoding = _response_encoding()
+        if encoding != 'json' and 'error' not in result:
+            return Response(encode(compact_detection(result), encoding, lambda: pack_detection(result)),
+                            mimetype=MIMETYPES[encoding])
         return jsonify(result)
         
+    except Rejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/detect_and_plan', methods=['POST'])
+@_traced
+def detect_and_plan():
+    """
+    Detect, ước tính khoảng cách và tính tọa độ cứu hộ trong một request
+    
+    Accepts:
+    - JSON với base64 encoded image ('image') và thông số môi trường như /rescue_coordinates
+    
+    Lệnh cứu hộ của frame đang cảnh báo được đẩy thẳng tới phao qua /rescue_commands/subscribe.
+    """
+    try:
+        data = request.get_json()
+        if not data or 'image' not in data:
+            return jsonify({"error": "No image data provided"}), 400
+        
+        if distance_estimator.focal_length is None:
+            return jsonify({"error": "Camera not calibrated, call /calibrate_auto first"}), 400
+        
+        # Decode base64
+        image_data = base64.b64decode(data['image'])
+        image = Image.open(io.BytesIO(image_data))
+        
+        confidence = float(request.args.get('confidence', data.get('confidence', 0.25)))
+        camera_id = request.args.get('camera_id') or data.get('camera_id', 'default')
+        environment = _rescue_environment(data)
+        
+        result = detect_drowning(image, confidence, True, camera_id, plan_rescue=True, environment=environment)
+        if 'error' in result:
+            return jsonify(result), 500
+        
+        result["environment"] = environment
+        return jsonify(result)
+        
+    except Rejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/detections', methods=['GET'])
+def query_detections():
+    """
+    Truy vấn detection log theo camera và khoảng thời gian
+    
+    Query params:
+    - camera_id: Id camera (mặc định tất cả camera)
+    - start, end: Khoảng thời gian (epoch giây, mặc định 1 giờ gần nhất)
+    - limit: Số bản ghi tối đa (mặc định 1000, tối đa 10000)
+    - offset: Số bản ghi bỏ qua từ start (trang sau: start=next_start&offset=next_offset)
+    """
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 3600))
+        limit = min(int(request.args.get('limit', 1000)), 10000)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        camera_id = request.args.get('camera_id')
+        
+        records = detection_log.query(camera_id, start, end, limit, offset)
+        cursor = DetectionLog.next_cursor(records, start, offset, limit)
+        return jsonify({
+            "success": True,
+            "count": len(records),
+            "detections": records,
+            "next_start": cursor[0] if cursor is not None else None,
+            "next_offset": cursor[1] if cursor is not None else None
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    Thống kê detect theo camera trong phút/giờ/ngày gần nhất
+    
+    Query params:
+    - camera_id: Id camera (mặc định tất cả camera)
+    - window: 'minute', 'hour' hoặc 'day' (mặc định 'minute')
+    """
+    try:
+        window = request.args.get('window', 'minute')
+        camera_id = request.args.get('camera_id')
+        return jsonify({
+            "success": True,
+            "window": window,
+            "cameras": detection_stats.summary(camera_id, window),
+            "timestamp": time.time()
+        })
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/video', methods=['POST'])
+def submit_video_job():
+    """
+    Upload video để phân tích nền
+    
+    Accepts:
+    - Form data với file video (field 'video')
+    """
+    try:
+        if 'video' not in request.files:
+            return jsonify({"error": "No video file provided"}), 400
+        
+        file = request.files['video']
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+        
+        confidence = float(request.args.get('confidence', 0.25))
+        stride = int(request.args.get('stride', 1))
+        job = video_jobs.submit(file, file.filename, confidence, stride)
+        return jsonify({"success": True, "job": job}), 202
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs', methods=['GET'])
+def list_video_jobs():
+    """Danh sách các job phân tích video gần nhất"""
+    limit = int(request.args.get('limit', 50))
+    return jsonify({"jobs": video_jobs.list_jobs(limit)})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    """Trạng thái và tiến độ của job"""
+    job = video_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_video_job_results(job_id):
+    """
+    Kết quả của job theo trang
+    
+    Query params:
+    - cursor: next_cursor của trang trước (mặc định 0)
+    - limit: Số kết quả mỗi trang (mặc định 100, tối đa 1000)
+    - type: 'detection' hoặc 'alert'
+    """
+    try:
+        if video_jobs.get_job(job_id) is None:
+            return jsonify({"error": "Job not found"}), 404
+        
+        cursor = int(request.args.get('cursor', 0))
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        result_type = request.args.get('type')
+        return jsonify(video_jobs.get_results(job_id, cursor, limit, result_type))
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/model', methods=['GET'])
+def model_info():
+    """Thông tin model đang dùng"""
+    return jsonify(model_registry.info())
+
+@app.route('/model/swap', methods=['POST'])
+def swap_model():
+    """
+    Thay weights model mà không cần khởi động lại API
+    
+    Accepts:
+    - Form data với file weights (field 'weights')
+    - JSON với 'weights_path' là đường dẫn file weights trên server
+    - Không có dữ liệu: load lại file weights hiện tại
+    """
+    try:
+        new_weights_path = None
+        uploaded = False
+        target_dir = os.path.dirname(os.path.abspath(model_registry.default_path))
+        
+        if request.content_type and 'multipart/form-data' in request.content_type:
+            if 'weights' not in request.files:
+                return jsonify({"error": "No weights file provided"}), 400
+            
+            # Lưu vào cùng thư mục với weights hiện tại để os.replace là nguyên tử
+            new_weights_path = os.path.join(target_dir, f".upload-{int(time.time() * 1000)}.pt")
+            request.files['weights'].save(new_weights_path)
+            uploaded = True
+        else:
+            data = request.get_json(silent=True) or {}
+            if 'weights_path' in data:
+                if not os.path.exists(data['weights_path']):
+                    return jsonify({"error": "Weights file not found"}), 400
+                
+                # Sao chép để không lấy mất file gốc và để os.replace không đi qua ổ đĩa khác
+                import shutil
+                new_weights_path = os.path.join(target_dir, f".upload-{int(time.time() * 1000)}.pt")
+                shutil.copyfile(data['weights_path'], new_weights_path)
+                uploaded = True
+        
+        try:
+            info = model_registry.swap(new_weights_path=new_weights_path)
+        except Exception:
+            # Weights lỗi thì giữ nguyên model cũ
+            if uploaded and os.path.exists(new_weights_path):
+                os.remove(new_weights_path)
+            raise
+        
+        return jsonify({
+            "success": True,
+            "message": "Model swapped successfully",
+            "model": info
+        })
+        
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -356,55 +1057,31 @@ def get_rescue_coordinates():
             return jsonify({"error": "No distance information provided"}), 400
         
         # Lấy thông số môi trường
-        water_level = float(data.get('water_level', 0.0))
-        current_direction = float(data.get('current_direction', 0.0))
-        current_speed = float(data.get('current_speed', 0.0))
-        camera_height = float(data.get('camera_height', 5.0))
-        camera_angle = float(data.get('camera_angle', 0.0))
-        
-        # Cập nhật thông số camera nếu cần
-        global rescue_calculator
-        if camera_height != rescue_calculator.camera_height or camera_angle != math.degrees(rescue_calculator.camera_angle):
-            rescue_calculator = RescueCoordinates(camera_height, camera_angle)
-        
-        # Tính toán tọa độ cho từng đối tượng
-        rescue_targets = []
-        for obj in distance_info:
-            if 'distance_m' in obj and 'angle_x_degrees' in obj and 'angle_y_degrees' in obj:
-                rescue_info = rescue_calculator.calculate_rescue_coordinates(
-                    obj['distance_m'],
-                    obj['angle_x_degrees'],
-                    obj['angle_y_degrees'],
-                    water_level,
-                    current_direction,
-                    current_speed
-                )
-                
-                # Thêm thông tin đối tượng
-                rescue_info['object_id'] = obj.get('object_id', 0)
-                rescue_info['class_id'] = obj.get('class_id', 0)
-                rescue_info['confidence'] = obj.get('confidence', 0.0)
-                
-                # Tạo lệnh điều khiển cho phao
-                rescue_info['commands'] = rescue_calculator.get_rescue_commands(rescue_info)
-                
-                rescue_targets.append(rescue_info)
+        environment = _rescue_environment(data)
         
-        # Sắp xếp theo mức độ ưu tiên
-        rescue_targets.sort(key=lambda x: x['urgency']['priority'])
+        camera_id = data.get('camera_id', 'default')
+        rescue_environments[camera_id] = environment
+        now = time.time()
+        
+        # Tính toán tọa độ cho từng đối tượng từ vị trí đã lọc
+        tracked = _track_targets(camera_id, distance_info, now, environment['water_level'])
+        rescue_targets = _plan_rescue_targets(
+            tracked,
+            environment['current_direction'],
+            environment['current_speed']
+        )
+        
+        # Đẩy lệnh mới tới phao đang subscribe và tiếp tục cập nhật trong thời gian cooldown
+        rescue_dispatch[camera_id] = {"until": now + ALERT_COOLDOWN, "classes": None, "min_hits": 1}
+        version = _dispatch_camera(camera_id, now)
         
         return jsonify({
             "success": True,
             "rescue_targets": rescue_targets,
             "total_targets": len(rescue_targets),
             "highest_priority": rescue_targets[0]['urgency']['level'] if rescue_targets else None,
-            "environment": {
-                "water_level": water_level,
-                "current_direction": current_direction,
-                "current_speed": current_speed,
-                "camera_height": camera_height,
-                "camera_angle": camera_angle
-            }
+            "version": version,
+            "environment": environment
         })
         
     except Exception as e:
@@ -436,6 +1113,12 @@ def get_rescue_commands():
         # Tạo lệnh điều khiển
         commands = rescue_calculator.get_rescue_commands(rescue_info)
         
+        encoding = _response_encoding()
+        if encoding != 'json':
+            return Response(encode(compact_command(commands, rescue_info), encoding,
+                                   lambda: pack_command(commands, rescue_info)),
+                            mimetype=MIMETYPES[encoding])
+        
         return jsonify({
             "success": True,
             "rescue_info": rescue_info,
@@ -445,16 +1128,310 @@ def get_rescue_commands():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/current_field', methods=['GET', 'POST', 'DELETE'])
+def current_field_config():
+    """
+    Trường dòng chảy dạng lưới
+    
+    POST:
+    - JSON {"origin": [x, y], "spacing": [dx, dy], "vx": [[...]], "vy": [[...]]}
+      (hoặc "speed"/"direction" thay cho "vx"/"vy")
+    - Form data với file .json/.npz (field 'field')
+    DELETE: bỏ trường dòng chảy, quay lại dùng current_direction/current_speed
+    """
+    global current_field
+    try:
+        if request.method == 'GET':
+            return jsonify({"enabled": current_field is not None,
+                            "field": current_field.info() if current_field is not None else None})
+        
+        if request.method == 'DELETE':
+            current_field = None
+            fleet.set_current_field(None)
+            if os.path.exists(settings.CURRENT_FIELD_PATH):
+                os.remove(settings.CURRENT_FIELD_PATH)
+            return jsonify({"success": True, "enabled": False})
+        
+        if request.content_type and 'multipart/form-data' in request.content_type:
+            if 'field' not in request.files:
+                return jsonify({"error": "No current field file provided"}), 400
+            upload = request.files['field']
+            if os.path.splitext(upload.filename)[1] == '.npz':
+                with np.load(io.BytesIO(upload.read())) as data:
+                    field = CurrentField.from_dict({key: data[key] for key in data.files})
+            else:
+                field = CurrentField.from_dict(json.load(upload.stream))
+        else:
+            data = request.get_json()
+            if not data:
+                return jsonify({"error": "No current field provided"}), 400
+            field = CurrentField.from_dict(data)
+        
+        # Lưu lại để dùng khi khởi động lại API
+        with open(settings.CURRENT_FIELD_PATH, 'w') as f:
+            json.dump(field.to_dict(), f)
+        
+        current_field = field
+        fleet.set_current_field(field)
+        return jsonify({"success": True, "enabled": True, "field": field.info()})
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/water_mask', methods=['GET'])
+def list_water_masks():
+    """Mask mặt nước của các camera"""
+    return jsonify({"cameras": water_masks.info()})
+
+@app.route('/water_mask/<camera_id>', methods=['GET', 'POST', 'DELETE'])
+def water_mask_config(camera_id):
+    """
+    Vùng mặt nước của camera
+    
+    POST:
+    - Form data với frame của camera (field 'image'): tạo mask bằng model segmentation
+    - Form data thêm field 'polygons' hoặc JSON {"image_size": [w, h], "polygons": [[[x, y], ...], ...]}:
+      người vận hành đánh dấu mặt nước (tọa độ pixel hoặc tỉ lệ 0-1)
+    DELETE: bỏ mask, camera quay lại detect trên toàn frame
+    """
+    global segmentation_model
+    try:
+        if request.method == 'GET':
+            water_mask = water_masks.get(camera_id)
+            if water_mask is None:
+                return jsonify({"error": "No water mask for this camera"}), 404
+            return jsonify({"camera_id": camera_id, "water_mask": water_mask.info()})
+        
+        if request.method == 'DELETE':
+            return jsonify({"success": water_masks.remove(camera_id), "camera_id": camera_id})
+        
+        margin = request.args.get('margin', settings.WATER_MASK_MARGIN, type=float)
+        if request.content_type and 'multipart/form-data' in request.content_type:
+            if 'image' not in request.files:
+                return jsonify({"error": "No image provided"}), 400
+            image = cv2.imdecode(np.frombuffer(request.files['image'].read(), np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                return jsonify({"error": "Invalid image"}), 400
+            if 'polygons' in request.form:
+                water_mask = WaterMask.from_polygons(image.shape, json.loads(request.form['polygons']), margin=margin)
+            else:
+                if segmentation_model is None:
+                    from helper import load_model
+                    segmentation_model = load_model(settings.SEGMENTATION_MODEL)
+                water_mask = WaterMask.from_segmentation(image, segmentation_model, margin=margin)
+        else:
+            data = request.get_json()
+            if not data or 'polygons' not in data or 'image_size' not in data:
+                return jsonify({"error": "image_size and polygons are required"}), 400
+            width, height = data['image_size']
+            water_mask = WaterMask.from_polygons((int(height), int(width)), data['polygons'], margin=margin)
+        
+        water_masks.set(camera_id, water_mask)
+        return jsonify({"success": True, "camera_id": camera_id, "water_mask": water_mask.info()})
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/state/cameras', methods=['GET'])
+def state_cameras():
+    """Các camera đang có trạng thái trên instance này (dùng bởi camera_router)"""
+    return jsonify({"cameras": _camera_state_ids()})
+
+@app.route('/state/export', methods=['POST'])
+def export_state():
+    """
+    Export trạng thái camera để chuyển sang instance khác
+    
+    Request: {"camera_ids": ["cam1", ...], "drop": true}
+    """
+    try:
+        data = request.get_json() or {}
+        camera_ids = data.get('camera_ids') or _camera_state_ids()
+        drop = bool(data.get('drop', False))
+        return jsonify({"cameras": {camera_id: _export_camera_state(camera_id, drop) for camera_id in camera_ids}})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/state/import', methods=['POST'])
+def import_state():
+    """
+    Nhận trạng thái camera từ /state/export của instance khác
+    
+    Request: {"cameras": {"cam1": {...}, ...}}
+    """
+    try:
+        data = request.get_json()
+        if not data or 'cameras' not in data:
+            return jsonify({"error": "No camera state provided"}), 400
+        for camera_id, state in data['cameras'].items():
+            _import_camera_state(camera_id, state)
+        return jsonify({"success": True, "imported": sorted(data['cameras'])})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/fleet/buoys', methods=['GET', 'POST'])
+def fleet_buoys():
+    """
+    Trạng thái các phao trong đội
+    
+    POST: phao báo vị trí/trạng thái, nhận lại phân công hiện tại
+    {"buoy_id": "b1", "camera_id": "cam1", "x_m": 0.0, "y_m": 0.0, "speed_mps": 4.0, "battery": 90, "status": "IDLE"}
+    Vị trí phao theo hệ tọa độ của camera_id, phao chỉ nhận target của camera đó
+    """
+    try:
+        if request.method == 'GET':
+            return jsonify({"buoys": fleet.buoys()})
+        
+        data = request.get_json()
+        if not data or 'buoy_id' not in data:
+            return jsonify({"error": "No buoy_id provided"}), 400
+        
+        assignment = fleet.update_buoy(
+            str(data['buoy_id']),
+            float(data.get('x_m', 0.0)),
+            float(data.get('y_m', 0.0)),
+            data.get('speed_mps'),
+            float(data.get('battery', 100.0)),
+            data.get('status', 'IDLE'),
+            scope=request.args.get('camera_id') or data.get('camera_id', 'default')
+        )
+        return jsonify({"success": True, "assignment": assignment})
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/fleet/buoys/<buoy_id>', methods=['DELETE'])
+def remove_fleet_buoy(buoy_id):
+    """Xóa phao khỏi đội"""
+    fleet.remove_buoy(buoy_id)
+    return jsonify({"success": True})
+
+@app.route('/fleet/assignments', methods=['GET'])
+def fleet_assignments():
+    """Phân công phao cho các target đang cứu hộ"""
+    try:
+        return jsonify(fleet.solve())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Admission control (nhận/từ chối theo camera, latency), mức giảm chất lượng và hàng đợi inference"""
+    try:
+        return jsonify({
+            "admission": admission.stats(),
+            "risk": risk_scheduler.stats(),
+            "degradation": degradation.stats(),
+            "inference_gate": inference_gate.stats()
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/tracing', methods=['GET', 'POST'])
+def tracing_config():
+    """
+    Trạng thái tracing frame; POST {"sample_rate": 0.05} đổi tỉ lệ frame được trace khi đang chạy
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            if 'sample_rate' in data:
+                tracer.configure(sample_rate=float(data['sample_rate']))
+        return jsonify(tracer.stats())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/rescue_commands/subscribe', methods=['GET'])
+def subscribe_rescue_commands():
+    """
+    Long-poll lệnh cứu hộ: trả về ngay khi có lệnh mới hơn version client đã nhận
+
+    Query params:
+    - since: Version đã nhận (mặc định -1 = lấy toàn bộ)
+    - epoch: Epoch trả về cùng version đó, khác instance hiện tại thì nhận lại toàn bộ
+    - camera_id: Chỉ nhận target của camera này (camera_router chuyển tới instance phụ trách camera)
+    - timeout: Thời gian chờ tối đa (giây, mặc định 25, tối đa 60)
+    """
+    try:
+        since = int(request.args.get('since', -1))
+        timeout = min(float(request.args.get('timeout', 25)), 60.0)
+
+        encoding = _response_encoding(('json', 'msgpack'))
+
+        update = rescue_dispatcher.wait_for_update(since, timeout, request.args.get('epoch'),
+                                                   request.args.get('camera_id'))
+        if update is None:
+            # Hết thời gian chờ, không có thay đổi
+            update = {"version": since, "epoch": rescue_dispatcher.epoch, "changed": False}
+        else:
+            update["changed"] = True
+
+        if encoding != 'json':
+            return Response(encode(compact_update(update), encoding), mimetype=MIMETYPES[encoding])
+        return jsonify(update)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/rescue_commands/stream', methods=['GET'])
+def stream_rescue_commands():
+    """
+    Server-sent events: đẩy lệnh cứu hộ thay đổi ngay khi có cảnh báo hoặc target mới
+
+    Query params:
+    - since: Version đã nhận (mặc định -1 = gửi toàn bộ trước)
+    - epoch, camera_id: Như /rescue_commands/subscribe
+    """
+    since = int(request.args.get('since', -1))
+    epoch = request.args.get('epoch')
+    camera_id = request.args.get('camera_id')
+
+    def events(version, epoch):
+        while True:
+            update = rescue_dispatcher.wait_for_update(version, 15, epoch, camera_id)
+            epoch = None
+            if update is None:
+                yield ": keepalive\n\n"
+                continue
+            version = update["version"]
+            yield f"id: {version}\nevent: rescue_commands\ndata: {app.json.dumps(update)}\n\n"
+
+    return Response(stream_with_context(events(since, epoch)), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == '__main__':
     print("Starting Drowning Detection API...")
     print("Available endpoints:")
     print("- GET  /health - Health check")
     print("- POST /detect - Detect drowning (accepts JSON or form data)")
     print("- POST /detect_base64 - Detect drowning (base64 only)")
+    print("- POST /detect_and_plan - Detect and plan rescue in one request")
+    print("- GET  /detections - Query the detection log")
+    print("- GET  /stats - Per-camera detection rollups")
+    print("- GET  /metrics - Admission control and inference queue metrics")
+    print("- POST /jobs/video - Queue a video for background analysis")
+    print("- GET  /jobs/<job_id> - Video job progress")
+    print("- GET  /jobs/<job_id>/results - Paged video job results")
+    print("- GET  /model - Current model info")
+    print("- POST /model/swap - Hot-swap model weights")
     print("- GET/POST /config - Configure Twilio settings")
     print("- POST /calibrate - Calibrate camera with reference image")
     print("- POST /calibrate_auto - Auto calibrate camera with parameters")
     print("- POST /rescue_coordinates - Calculate rescue coordinates for multiple targets")
     print("- POST /rescue_commands - Generate rescue commands for single target")
+    print("- GET  /rescue_commands/subscribe - Long-poll rescue command updates")
+    print("- GET/POST /fleet/buoys - Report buoy state / list the fleet")
+    print("- GET  /fleet/assignments - Buoy-to-victim assignments")
+    print("- GET/POST/DELETE /current_field - Gridded water-current field")
+    print("- GET/POST/DELETE /water_mask/<camera_id> - Per-camera water region (crop + filter)")
+    print("- GET  /state/cameras, POST /state/export|/state/import - Per-camera state for camera_router.py")
+    print("- GET  /rescue_commands/stream - Rescue command updates as server-sent events")
+    print("- GET/POST /tracing - Frame tracing status / sample rate (Chrome trace files in runs/traces)")
     
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=True, threaded=True) 
\ No newline at end of file
@@ -28,10 +28,10 @@ confidence = float(st.sidebar.slider(
     "Select Model Confidence", 15, 60, 25)) / 100
 
 
-model_path = 'best.pt'
-# Load Pre-trained ML Model
+model_path = settings.DROWNING_MODEL
+# Load Pre-trained ML Model (kept warm by the registry, reloaded if the weights are swapped)
 try:
-    model = helper.load_model(model_path)
+    model = helper.get_model_registry().get(model_path)
 except Exception as ex:
     st.error(f"Unable to load model. Check the specified path: {model_path}")
     st.error(ex)
@@ -0,0 +1,79 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+from ultralytics.trackers import BOTSORT, BYTETracker
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+import settings
+
+TRACKERS = {'bytetrack': BYTETracker, 'botsort': BOTSORT}
+
+
+class CameraBoxTrackers:
+    """
+    Class gán track id cho bounding box theo từng camera (ByteTrack/BoT-SORT của ultralytics)
+
+    model.track(persist=True) giữ trạng thái tracker trong model, nhưng API
+    dùng chung một model cho mọi camera nên box của camera này sẽ bị ghép
+    với track của camera khác. Ở đây mỗi camera có tracker riêng, chạy trên
+    box đã đưa về pixel ảnh gốc và đã lọc mặt nước sau model.predict().
+    """
+
+    def __init__(self, config=settings.BOX_TRACKER, frame_rate=30):
+        """
+        Khởi tạo CameraBoxTrackers
+
+        Args:
+            config (str): File cấu hình tracker của ultralytics (bytetrack.yaml, botsort.yaml)
+            frame_rate (int): Tốc độ frame dùng để tính số frame giữ track bị mất
+        """
+        self.args = IterableSimpleNamespace(**yaml_load(check_yaml(config)))
+        if self.args.tracker_type not in TRACKERS:
+            raise ValueError(f"Unsupported tracker type '{self.args.tracker_type}'")
+        self.frame_rate = frame_rate
+        self._lock = threading.Lock()
+        self._trackers = {}  # camera_id -> (tracker, lock)
+
+    def _tracker(self, camera_id):
+        with self._lock:
+            entry = self._trackers.get(camera_id)
+            if entry is None:
+                tracker = TRACKERS[self.args.tracker_type](args=self.args, frame_rate=self.frame_rate)
+                entry = self._trackers[camera_id] = (tracker, threading.Lock())
+            return entry
+
+    def update(self, camera_id, bboxes, scores, class_ids, image=None):
+        """
+        Cập nhật tracker của camera với các box của một frame (kể cả frame không có box)
+
+        Args:
+            bboxes (np.array): [N, 4] dạng [x1, y1, x2, y2] theo pixel ảnh gốc
+            scores (np.array): Confidence của từng box
+            class_ids (np.array): Class id của từng box
+            image (np.array): Frame gốc (BoT-SORT cần để bù chuyển động camera)
+
+        Returns:
+            list: Track id của từng box, None nếu box chưa thuộc track nào đã xác nhận
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        xywh = np.concatenate([(bboxes[:, :2] + bboxes[:, 2:]) / 2, bboxes[:, 2:] - bboxes[:, :2]], axis=1)
+        detections = SimpleNamespace(
+            xyxy=bboxes,
+            xywh=xywh,
+            conf=np.asarray(scores, dtype=np.float32).reshape(-1),
+            cls=np.asarray(class_ids, dtype=np.float32).reshape(-1)
+        )
+        track_ids = [None] * len(bboxes)
+        tracker, lock = self._tracker(camera_id)
+        with lock:
+            tracks = tracker.update(detections, image)
+        # Mỗi dòng: x1, y1, x2, y2, track_id, score, cls, index của box
+        for track in np.asarray(tracks):
+            track_ids[int(track[-1])] = int(track[4])
+        return track_ids
+
+    def remove(self, camera_id):
+        with self._lock:
+            self._trackers.pop(camera_id, None)
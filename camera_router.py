@@ -0,0 +1,388 @@
+import argparse
+import bisect
+import collections
+import hashlib
+import json
+import threading
+
+import requests
+from flask import Flask, Response, jsonify, request
+
+import settings
+
+# Header không chuyển tiếp qua router (hop-by-hop hoặc do router/requests tự đặt lại)
+EXCLUDED_HEADERS = {'host', 'content-length', 'transfer-encoding', 'connection', 'keep-alive', 'content-encoding'}
+
+# Request ghi cấu hình dùng chung (không gắn với camera) được gửi tới mọi instance:
+# (method, path) -> khóa ghi nhớ lần ghi gần nhất để gửi lại cho instance thêm sau
+SHARED_WRITES = {
+    ('POST', '/calibrate'): 'calibration',
+    ('POST', '/calibrate_auto'): 'calibration',
+    ('POST', '/config'): 'config',
+    ('POST', '/model/swap'): 'model',
+    ('POST', '/current_field'): 'current_field',
+    ('DELETE', '/current_field'): 'current_field',
+    ('POST', '/tracing'): 'tracing',
+}
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hashing: mỗi instance có replicas điểm trên vòng băm, camera
+    thuộc về instance có điểm đầu tiên sau băm của camera id
+
+    Thêm/bớt một instance chỉ làm đổi chủ các camera nằm trên đoạn vòng
+    của instance đó (khoảng 1/N camera), các camera khác giữ nguyên instance.
+    """
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self.nodes = []
+        self._points = []  # [(băm, node)] đã sắp xếp
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.replicas):
+            bisect.insort(self._points, (_hash(f"{node}#{i}"), node))
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        self._points = [point for point in self._points if point[1] != node]
+
+    def node_for(self, key):
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, (_hash(key), '')) % len(self._points)
+        return self._points[index][1]
+
+    def copy(self):
+        ring = HashRing(replicas=self.replicas)
+        ring.nodes = list(self.nodes)
+        ring._points = list(self._points)
+        return ring
+
+
+class CameraRouter:
+    """
+    Class chia camera cho nhiều API instance theo consistent hashing
+
+    Mọi request của một camera luôn tới cùng một instance nên trạng thái của
+    camera (lịch sử cảnh báo, target đang theo dõi, lệnh cứu hộ, ...) nằm
+    trọn trong instance đó. Khi thêm/bớt instance, chỉ camera đổi chủ được
+    chuyển trạng thái (/state/export -> /state/import), request của các
+    camera đó chờ tới khi chuyển xong.
+
+    Cấu hình dùng chung (calibration, Twilio, model, trường dòng chảy, ...)
+    được ghi vào mọi instance và ghi nhớ để gửi lại cho instance thêm sau.
+    """
+
+    def __init__(self, nodes=(), replicas=settings.ROUTER_REPLICAS, timeout=settings.ROUTER_TIMEOUT):
+        """
+        Khởi tạo CameraRouter
+
+        Args:
+            nodes (list): URL các API instance (http://host:port)
+            replicas (int): Số điểm của mỗi instance trên vòng băm
+            timeout (float): Timeout đọc khi chuyển tiếp request (giây)
+        """
+        self.timeout = timeout
+        self.ring = HashRing([node.rstrip('/') for node in nodes], replicas)
+        self.session = requests.Session()
+        self._cond = threading.Condition()
+        self._membership_lock = threading.Lock()
+        self._moving = set()  # Camera đang được chuyển trạng thái
+        self._in_flight = collections.Counter()  # camera_id -> số request đang xử lý
+        self._cameras = set()  # Camera đã đi qua router
+        self._shared = {}  # Khóa SHARED_WRITES -> (method, path, headers, body) lần ghi gần nhất
+
+    def route(self, camera_id, track=True):
+        """
+        Instance phụ trách camera, chờ nếu camera đang được chuyển trạng thái
+
+        Args:
+            track (bool): Request thay đổi trạng thái camera (frame, ...), phải gọi
+                release(camera_id) khi xong; chuyển camera chờ các request này xong
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: camera_id not in self._moving)
+            self._cameras.add(camera_id)
+            if track:
+                self._in_flight[camera_id] += 1
+            return self.ring.node_for(camera_id)
+
+    def release(self, camera_id):
+        with self._cond:
+            self._in_flight[camera_id] -= 1
+            if self._in_flight[camera_id] <= 0:
+                del self._in_flight[camera_id]
+            self._cond.notify_all()
+
+    def primary(self):
+        """
+        Instance nhận các request không gắn với camera (fleet, model, config, ...)
+        """
+        with self._cond:
+            return self.ring.nodes[0] if self.ring.nodes else None
+
+    def assignments(self):
+        with self._cond:
+            return {camera_id: self.ring.node_for(camera_id) for camera_id in sorted(self._cameras)}
+
+    def add_node(self, node):
+        return self._change_membership(node.rstrip('/'), add=True)
+
+    def remove_node(self, node):
+        return self._change_membership(node.rstrip('/'), add=False)
+
+    def _change_membership(self, node, add):
+        # Mỗi lần chỉ một thay đổi thành viên
+        with self._membership_lock:
+            with self._cond:
+                old_ring = self.ring
+            new_ring = old_ring.copy()
+            if add:
+                new_ring.add(node)
+            else:
+                new_ring.remove(node)
+            if new_ring.nodes == old_ring.nodes:
+                return {}
+            if add:
+                # Instance mới nhận cấu hình dùng chung trước khi nhận camera
+                self._replay_shared(node)
+
+            # Camera đang có trạng thái trên các instance cũ và camera đã đi qua router
+            cameras = set(self._cameras)
+            for old_node in old_ring.nodes:
+                try:
+                    cameras.update(self._call(old_node, 'GET', '/state/cameras')['cameras'])
+                except Exception as ex:
+                    print(f"Error listing cameras on {old_node}: {ex}")
+            moves = {}
+            for camera_id in cameras:
+                source, target = old_ring.node_for(camera_id), new_ring.node_for(camera_id)
+                if source != target:
+                    moves.setdefault((source, target), []).append(camera_id)
+
+            with self._cond:
+                self._moving = {camera_id for camera_ids in moves.values() for camera_id in camera_ids}
+                self.ring = new_ring
+                # Frame đang xử lý ở instance cũ phải xong trước khi export trạng thái
+                self._cond.wait_for(lambda: not any(self._in_flight[c] for c in self._moving), self.timeout)
+            try:
+                for (source, target), camera_ids in moves.items():
+                    self._move(source, target, camera_ids)
+            finally:
+                with self._cond:
+                    self._moving = set()
+                    self._cond.notify_all()
+            print(f"Router {'added' if add else 'removed'} {node}: "
+                  f"{sum(len(c) for c in moves.values())} of {len(cameras)} cameras moved")
+            return {camera_id: target for (_, target), camera_ids in moves.items() for camera_id in camera_ids}
+
+    def _move(self, source, target, camera_ids):
+        try:
+            state = self._call(source, 'POST', '/state/export', {"camera_ids": camera_ids, "drop": True})
+        except Exception as ex:
+            # Instance cũ không còn chạy: camera bắt đầu lại với trạng thái trống
+            print(f"Error exporting {len(camera_ids)} cameras from {source}: {ex}")
+            return
+        try:
+            self._call(target, 'POST', '/state/import', state)
+        except Exception as ex:
+            print(f"Error importing {len(camera_ids)} cameras into {target}: {ex}")
+
+    def broadcast(self, flask_request, key):
+        """
+        Gửi request ghi cấu hình dùng chung tới mọi instance
+
+        Instance đầu tiên trả lỗi thì dừng và trả lỗi đó cho client (không
+        instance nào khác bị đổi cấu hình); instance khác lỗi chỉ được ghi log.
+
+        Returns:
+            flask.Response: Response của instance đầu tiên
+        """
+        headers = {k: v for k, v in flask_request.headers.items() if k.lower() not in EXCLUDED_HEADERS}
+        write = (flask_request.method, flask_request.path, headers, flask_request.get_data())
+        # Không thêm/bớt instance giữa chừng để instance mới không bỏ lỡ lần ghi này
+        with self._membership_lock:
+            nodes = list(self.ring.nodes)
+            if not nodes:
+                return jsonify({"error": "No API instance available"}), 503
+            first = self._send(nodes[0], write)
+            if first.status_code >= 400:
+                return self._response(first, nodes[0])
+            if write[1] == '/calibrate':
+                # Calibration chọn ROI trên màn hình của instance đầu tiên, các instance khác nhận kết quả
+                write = self._calibrate_auto_write(flask_request, first.json())
+            for node in nodes[1:]:
+                try:
+                    self._send(node, write).raise_for_status()
+                except requests.RequestException as ex:
+                    print(f"Error sending {write[0]} {write[1]} to {node}: {ex}")
+            if key == 'config' and key in self._shared:
+                # /config chỉ cập nhật các trường có trong request
+                merged = dict(json.loads(self._shared[key][3] or b'{}'), **(flask_request.get_json(silent=True) or {}))
+                write = write[:3] + (json.dumps(merged).encode('utf-8'),)
+            if key is not None:
+                self._shared[key] = write
+            response = self._response(first, nodes[0])
+            response.headers['X-Broadcast-To'] = ','.join(nodes)
+            return response
+
+    def _calibrate_auto_write(self, flask_request, result):
+        data = flask_request.get_json(silent=True) or {}
+        payload = {
+            "reference_distance_cm": data.get('reference_distance_cm', 100),
+            "reference_width_cm": data.get('reference_width_cm', 50),
+            "reference_width_pixels": result['reference_width_pixels']
+        }
+        return ('POST', '/calibrate_auto', {'Content-Type': 'application/json'}, json.dumps(payload).encode('utf-8'))
+
+    def _replay_shared(self, node):
+        for method, path, headers, body in self._shared.values():
+            try:
+                self._send(node, (method, path, headers, body)).raise_for_status()
+            except requests.RequestException as ex:
+                print(f"Error replaying {method} {path} to {node}: {ex}")
+
+    def _send(self, node, write):
+        method, path, headers, body = write
+        return self.session.request(method, node + path, headers=headers, data=body,
+                                    timeout=(3.05, self.timeout), allow_redirects=False)
+
+    def _response(self, upstream, node):
+        headers = [(k, v) for k, v in upstream.headers.items() if k.lower() not in EXCLUDED_HEADERS]
+        headers.append(('X-Routed-To', node))
+        return Response(upstream.content, status=upstream.status_code, headers=headers)
+
+    def _call(self, node, method, path, payload=None):
+        response = self.session.request(method, node + path, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def forward(self, node, flask_request):
+        """
+        Chuyển tiếp request tới instance, stream response về client
+        """
+        headers = {k: v for k, v in flask_request.headers.items() if k.lower() not in EXCLUDED_HEADERS}
+        upstream = self.session.request(
+            flask_request.method,
+            node + flask_request.full_path.rstrip('?'),
+            headers=headers,
+            data=flask_request.get_data(),
+            stream=True,
+            timeout=(3.05, self.timeout),
+            allow_redirects=False
+        )
+        response_headers = [(k, v) for k, v in upstream.headers.items() if k.lower() not in EXCLUDED_HEADERS]
+        response_headers.append(('X-Routed-To', node))
+        return Response(upstream.iter_content(chunk_size=None), status=upstream.status_code,
+                        headers=response_headers)
+
+
+def request_camera_id(flask_request):
+    """
+    camera_id của request (query param, form data hoặc JSON), None nếu request không gắn với camera
+    """
+    camera_id = flask_request.args.get('camera_id')
+    if camera_id:
+        return camera_id
+    if flask_request.path in ('/detect', '/detect_base64', '/detect_and_plan', '/rescue_coordinates') or \
+            (flask_request.path == '/fleet/buoys' and flask_request.method == 'POST'):
+        if flask_request.form.get('camera_id'):
+            return flask_request.form['camera_id']
+        data = flask_request.get_json(silent=True) or {}
+        return data.get('camera_id', 'default')
+    if flask_request.path.startswith('/water_mask/'):
+        return flask_request.path.split('/', 2)[2]
+    return None
+
+
+def create_app(router):
+    app = Flask(__name__)
+
+    @app.route('/router/nodes', methods=['GET', 'POST', 'DELETE'])
+    def router_nodes():
+        """
+        Danh sách instance; POST/DELETE {"url": "http://host:port"} thêm/bớt instance
+        """
+        try:
+            if request.method == 'GET':
+                return jsonify({"nodes": router.ring.nodes})
+            data = request.get_json() or {}
+            if not data.get('url'):
+                return jsonify({"error": "url is required"}), 400
+            moved = router.add_node(data['url']) if request.method == 'POST' else router.remove_node(data['url'])
+            return jsonify({"success": True, "nodes": router.ring.nodes, "moved": moved})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/router/cameras', methods=['GET'])
+    def router_cameras():
+        """Instance phụ trách từng camera đã đi qua router"""
+        return jsonify({"cameras": router.assignments()})
+
+    @app.route('/', defaults={'path': ''}, methods=['GET', 'POST', 'PUT', 'DELETE'])
+    @app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+    def proxy(path):
+        # Đọc body trước để đọc form (camera_id) xong vẫn chuyển tiếp được nguyên body
+        request.get_data()
+        # Xóa phao: phao nằm ở instance phụ trách camera của nó, xóa ở mọi instance (không ghi nhớ)
+        remove_buoy = request.method == 'DELETE' and request.path.startswith('/fleet/buoys/')
+        if (request.method, request.path) in SHARED_WRITES or remove_buoy:
+            try:
+                return router.broadcast(request, SHARED_WRITES.get((request.method, request.path)))
+            except requests.RequestException as e:
+                return jsonify({"error": f"API instance unavailable: {e}"}), 502
+
+        camera_id = request_camera_id(request)
+        if camera_id is None:
+            node = router.primary()
+            if node is None:
+                return jsonify({"error": "No API instance available"}), 503
+            try:
+                return router.forward(node, request)
+            except requests.RequestException as e:
+                return jsonify({"error": f"API instance {node} unavailable: {e}"}), 502
+
+        # Long-poll/GET không đổi trạng thái camera nên không giữ việc chuyển camera
+        track = request.method != 'GET'
+        node = router.route(camera_id, track)
+        try:
+            response = router.forward(node, request)
+        except requests.RequestException as e:
+            if track:
+                router.release(camera_id)
+            return jsonify({"error": f"API instance {node} unavailable: {e}"}), 502
+        if track:
+            response.call_on_close(lambda: router.release(camera_id))
+        return response
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Route cameras to API instances by consistent hashing')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--node', action='append', default=[], help='API instance URL (repeat for each instance)')
+    parser.add_argument('--replicas', type=int, default=settings.ROUTER_REPLICAS)
+    args = parser.parse_args()
+
+    router = CameraRouter(args.node, replicas=args.replicas)
+    print(f"Routing cameras to: {json.dumps(router.ring.nodes)}")
+    create_app(router).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+import math
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from flask.json.provider import DefaultJSONProvider
+
+# Định dạng response theo Accept header (JSON luôn là mặc định, kể cả với */*)
+MIMETYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+    'struct': 'application/octet-stream'
+}
+MIMETYPE_ALIASES = {'application/x-msgpack': 'msgpack', 'application/vnd.msgpack': 'msgpack'}
+
+# Version của layout nhị phân, tăng khi đổi layout
+STRUCT_VERSION = 3
+
+# Mã số cho các giá trị chuỗi trong lệnh cứu hộ
+PRIORITY_LEVELS = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')  # priority = index + 1
+DEPTH_MODES = ('SURFACE_LEVEL', 'FLOAT_HIGH', 'DIVE_SHALLOW', 'DIVE_DEEP')
+
+# Layout nhị phân (little-endian, không padding)
+# Detect: header + một record cho mỗi đối tượng có khoảng cách
+DETECT_HEADER = struct.Struct('<BBHHdHB')  # version, flags (bit0 alert, bit1 distance), detected_objects, records,
+                                          # timestamp, interval_ms, jpeg_quality (0 = giữ nguyên)
+DETECT_OBJECT = struct.Struct('<HBffff')  # object_id, class_id, confidence, distance_m (NaN nếu không có), angle_x, angle_y
+# Lệnh cứu hộ
+COMMAND = struct.Struct('<BBBBffffff')  # version, priority, depth_mode, flags (bit0 emergency, bit1 intercept_feasible),
+                                        # heading, speed, x, y, z, estimated_duration
+
+FLAG_ALERT = 0x01
+FLAG_DISTANCE = 0x02
+FLAG_EMERGENCY = 0x01
+FLAG_INTERCEPT = 0x02
+
+
+def available_encodings():
+    return [name for name in MIMETYPES if name != 'msgpack' or msgpack is not None]
+
+
+def negotiate(accept_mimetypes, requested=None, encodings=('json', 'msgpack', 'struct')):
+    """
+    Chọn định dạng response
+
+    Args:
+        accept_mimetypes: request.accept_mimetypes (werkzeug MIMEAccept)
+        requested (str): Định dạng chỉ định qua query param ?format= (ưu tiên hơn Accept)
+        encodings (tuple): Định dạng endpoint hỗ trợ
+
+    Returns:
+        str: 'json', 'msgpack' hoặc 'struct'
+    """
+    encodings = [name for name in encodings if name in available_encodings()]
+    if requested in encodings:
+        return requested
+
+    candidates = [MIMETYPES[name] for name in encodings]
+    candidates += [alias for alias, name in MIMETYPE_ALIASES.items() if name in encodings]
+    best = accept_mimetypes.best_match(candidates, default=MIMETYPES['json'])
+    return MIMETYPE_ALIASES.get(best) or next(name for name, mime in MIMETYPES.items() if mime == best)
+
+
+def _float(value):
+    return float('nan') if value is None else float(value)
+
+
+def _numpy_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def packb(obj):
+    # float 32-bit: đủ chính xác cho box/score/góc và khớp kiểu float của ESP32.
+    # Timestamp epoch không đủ chính xác ở float32 (sai tới 64 giây) nên gửi dạng số nguyên mili giây
+    return msgpack.packb(obj, default=_numpy_default, use_bin_type=True, use_single_float=True)
+
+
+def compact_detection(result):
+    """
+    Kết quả detect rút gọn: chỉ cảnh báo, số đối tượng và vị trí tương đối
+
+    objects: [object_id, class_id, confidence, distance_m, angle_x_degrees, angle_y_degrees]
+    timestamp_ms: epoch theo mili giây (số nguyên)
+    """
+    capture = result.get('capture', {})
+    return {
+        "alert": bool(result.get('alert_triggered')),
+        "count": int(result.get('detected_objects', 0)),
+        "timestamp_ms": int(round(float(result.get('timestamp', 0.0)) * 1000)),
+        "classes": [int(c) for c in result.get('classes', [])],
+        "objects": [
+            [int(obj['object_id']), int(obj['class_id']), round(float(obj['confidence']), 3),
+             obj['distance_m'] and round(float(obj['distance_m']), 2),
+             round(float(obj['angle_x_degrees']), 2), round(float(obj['angle_y_degrees']), 2)]
+            for obj in result.get('distance_info', [])
+        ],
+        "interval_ms": int(capture.get('interval_ms', 0)),
+        "jpeg_quality": int(capture.get('jpeg_quality', 0))
+    }
+
+
+def compact_command(commands, rescue_info=None):
+    """
+    Lệnh cứu hộ rút gọn, chuỗi (mức ưu tiên, chế độ độ sâu) đổi thành mã số
+    """
+    movement = commands['movement']
+    mission = commands['mission']
+    target = commands['target_coordinates']
+    compact = {
+        "priority": PRIORITY_LEVELS.index(mission['priority']) + 1 if mission['priority'] in PRIORITY_LEVELS else 4,
+        "depth_mode": DEPTH_MODES.index(movement['depth_mode']) if movement['depth_mode'] in DEPTH_MODES else 0,
+        "emergency": bool(mission['emergency_contact']),
+        "heading": float(movement['heading']),
+        "speed": float(movement['speed']),
+        "target": [float(target['x']), float(target['y']), float(target['z'])],
+        "eta": float(mission['estimated_duration'])
+    }
+    if rescue_info is not None:
+        compact["intercept_feasible"] = bool(rescue_info['control'].get('intercept_feasible', True))
+    return compact
+
+
+def compact_update(update):
+    """
+    Thay đổi lệnh cứu hộ (/rescue_commands/subscribe) rút gọn
+    """
+    compact = {"version": update['version'], "epoch": update.get('epoch'), "changed": update.get('changed', True)}
+    if not compact["changed"]:
+        return compact
+
+    updated = {}
+    for target_id, target in update['updated'].items():
+        assignment = target.get('assignment')
+        updated[target_id] = {
+            "priority": target['priority'],
+            "command": compact_command(target['commands']),
+            "assignment": assignment and {
+                "buoy_id": assignment['buoy_id'],
+                "heading": assignment['heading_degrees'],
+                "speed": assignment['speed_mps'],
+                "eta": assignment['intercept_time_s']
+            }
+        }
+    compact.update({"full": update['full'], "updated": updated, "removed": list(update['removed'])})
+    return compact
+
+
+def pack_detection(result):
+    compact = compact_detection(result)
+    flags = (FLAG_ALERT if compact['alert'] else 0) | (FLAG_DISTANCE if compact['objects'] else 0)
+    parts = [DETECT_HEADER.pack(STRUCT_VERSION, flags, compact['count'], len(compact['objects']),
+                                compact['timestamp_ms'] / 1000.0,
+                                min(compact['interval_ms'], 0xFFFF), compact['jpeg_quality'])]
+    for object_id, class_id, confidence, distance_m, angle_x, angle_y in compact['objects']:
+        parts.append(DETECT_OBJECT.pack(min(object_id, 0xFFFF), class_id, confidence, _float(distance_m), angle_x, angle_y))
+    return b''.join(parts)
+
+
+def pack_command(commands, rescue_info=None):
+    compact = compact_command(commands, rescue_info)
+    flags = (FLAG_EMERGENCY if compact['emergency'] else 0) | \
+        (FLAG_INTERCEPT if compact.get('intercept_feasible', True) else 0)
+    return COMMAND.pack(STRUCT_VERSION, compact['priority'], compact['depth_mode'], flags,
+                        compact['heading'], compact['speed'], *compact['target'], compact['eta'])
+
+
+def unpack_command(data):
+    """
+    Đọc lại lệnh cứu hộ từ layout nhị phân (dùng cho client Python/kiểm tra)
+    """
+    version, priority, depth_mode, flags, heading, speed, x, y, z, eta = COMMAND.unpack(data)
+    return {
+        "version": version,
+        "priority": priority,
+        "depth_mode": DEPTH_MODES[depth_mode],
+        "emergency": bool(flags & FLAG_EMERGENCY),
+        "intercept_feasible": bool(flags & FLAG_INTERCEPT),
+        "heading": heading,
+        "speed": speed,
+        "target": [x, y, z],
+        "eta": eta
+    }
+
+
+def unpack_detection(data):
+    """
+    Đọc lại kết quả detect từ layout nhị phân
+    """
+    version, flags, count, records, timestamp, interval_ms, jpeg_quality = DETECT_HEADER.unpack_from(data)
+    objects = [
+        list(DETECT_OBJECT.unpack_from(data, DETECT_HEADER.size + i * DETECT_OBJECT.size))
+        for i in range(records)
+    ]
+    for obj in objects:
+        if math.isnan(obj[3]):
+            obj[3] = None
+    return {
+        "version": version,
+        "alert": bool(flags & FLAG_ALERT),
+        "count": count,
+        "timestamp": timestamp,
+        "interval_ms": interval_ms,
+        "jpeg_quality": jpeg_quality,
+        "objects": objects
+    }
+
+
+def encode(compact, encoding, pack=None):
+    """
+    Mã hóa dữ liệu rút gọn theo định dạng đã chọn
+
+    Args:
+        compact: Dữ liệu rút gọn (dict) cho msgpack
+        encoding (str): 'msgpack' hoặc 'struct'
+        pack (callable): Hàm tạo bytes cho layout nhị phân
+    """
+    if encoding == 'msgpack':
+        return packb(compact)
+    if encoding == 'struct' and pack is not None:
+        return pack()
+    raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider dùng orjson (nhanh hơn, serialize trực tiếp NumPy array/scalar),
+    quay về json chuẩn nếu không cài orjson hoặc cần tham số orjson không có
+
+    jsonify() luôn truyền indent và separators: indent được đổi thành
+    OPT_INDENT_2, separators bỏ qua (orjson luôn xuất dạng gọn).
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'indent', 'separators'}:
+            kwargs.setdefault('default', self._default)
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self._default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, (np.generic, np.ndarray)):
+            return _numpy_default(obj)
+        return DefaultJSONProvider.default(obj)
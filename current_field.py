@@ -0,0 +1,194 @@
+import json
+import os
+
+import numpy as np
+
+from intercept_solver import solve_intercept
+
+
+class CurrentField:
+    """
+    Class trường dòng chảy dạng lưới (vx, vy theo m/s) trên khu vực camera quan sát
+
+    Hệ số nội suy song tuyến của từng ô lưới được tính sẵn khi tạo trường,
+    nên lấy mẫu tại N điểm chỉ cần một lần tra chỉ số ô và một đa thức
+    c0 + c1*fx + c2*fy + c3*fx*fy cho cả mảng điểm.
+    """
+
+    def __init__(self, origin, spacing, vx, vy):
+        """
+        Khởi tạo CurrentField
+
+        Args:
+            origin (tuple): Tọa độ (x, y) của điểm lưới [0, 0] (m)
+            spacing (tuple): Khoảng cách lưới (dx, dy) (m)
+            vx (np.array): [ny, nx] thành phần dòng chảy theo trục X (m/s)
+            vy (np.array): [ny, nx] thành phần dòng chảy theo trục Y (m/s)
+        """
+        self.origin = np.asarray(origin, dtype=np.float64).reshape(2)
+        self.spacing = np.asarray(spacing, dtype=np.float64).reshape(2)
+        field = np.stack([np.asarray(vx, dtype=np.float64), np.asarray(vy, dtype=np.float64)], axis=-1)
+        if field.ndim != 3 or field.shape[0] < 2 or field.shape[1] < 2:
+            raise ValueError("Current field grid must be at least 2x2")
+        if np.any(self.spacing <= 0):
+            raise ValueError("Grid spacing must be positive")
+        self.field = field
+        self.shape = field.shape[:2]  # (ny, nx)
+
+        # Hệ số nội suy của từng ô [ny-1, nx-1, 4, 2]
+        f00 = field[:-1, :-1]
+        f10 = field[:-1, 1:]
+        f01 = field[1:, :-1]
+        f11 = field[1:, 1:]
+        self._coefficients = np.stack([f00, f10 - f00, f01 - f00, f11 - f10 - f01 + f00], axis=2)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Tạo trường từ dict: origin, spacing và vx/vy hoặc speed/direction
+        (hướng theo độ, 0 = Bắc/trục Y, 90 = Đông/trục X)
+        """
+        if 'vx' in data and 'vy' in data:
+            vx, vy = np.asarray(data['vx'], dtype=np.float64), np.asarray(data['vy'], dtype=np.float64)
+        elif 'speed' in data and 'direction' in data:
+            speed = np.asarray(data['speed'], dtype=np.float64)
+            direction = np.radians(np.asarray(data['direction'], dtype=np.float64))
+            vx, vy = speed * np.sin(direction), speed * np.cos(direction)
+        else:
+            raise ValueError("Current field needs 'vx'/'vy' or 'speed'/'direction' grids")
+        return cls(data.get('origin', (0.0, 0.0)), data.get('spacing', (1.0, 1.0)), vx, vy)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Đọc trường dòng chảy từ file .json hoặc .npz (cùng các khóa như from_dict)
+        """
+        if os.path.splitext(str(path))[1] == '.npz':
+            with np.load(path) as data:
+                return cls.from_dict({key: data[key] for key in data.files})
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {
+            "origin": self.origin.tolist(),
+            "spacing": self.spacing.tolist(),
+            "vx": self.field[..., 0].tolist(),
+            "vy": self.field[..., 1].tolist()
+        }
+
+    def info(self):
+        speed = np.linalg.norm(self.field, axis=-1)
+        ny, nx = self.shape
+        return {
+            "origin": self.origin.tolist(),
+            "spacing": self.spacing.tolist(),
+            "grid": [ny, nx],
+            "extent": (self.origin + self.spacing * [nx - 1, ny - 1]).tolist(),
+            "max_speed": round(float(speed.max()), 3),
+            "mean_speed": round(float(speed.mean()), 3)
+        }
+
+    def sample(self, points):
+        """
+        Dòng chảy tại các điểm (nội suy song tuyến, ngoài lưới lấy giá trị biên)
+
+        Args:
+            points (np.array): [..., 2] tọa độ (m)
+
+        Returns:
+            np.array: [..., 2] vận tốc dòng chảy (m/s)
+        """
+        points = np.asarray(points, dtype=np.float64)
+        ny, nx = self.shape
+        grid = (points - self.origin) / self.spacing
+        gx = np.clip(grid[..., 0], 0.0, nx - 1)
+        gy = np.clip(grid[..., 1], 0.0, ny - 1)
+        ix = np.minimum(gx.astype(np.int64), nx - 2)
+        iy = np.minimum(gy.astype(np.int64), ny - 2)
+        fx = (gx - ix)[..., None]
+        fy = (gy - iy)[..., None]
+
+        c = self._coefficients[iy, ix]  # [..., 4, 2]
+        return c[..., 0, :] + c[..., 1, :] * fx + c[..., 2, :] * fy + c[..., 3, :] * fx * fy
+
+    def integrate_drift(self, points, duration, steps=10):
+        """
+        Vị trí của các vật trôi theo dòng chảy sau khoảng thời gian duration (RK2)
+
+        Args:
+            points (np.array): [..., 2] vị trí ban đầu (m)
+            duration (np.array): Thời gian trôi (giây), số hoặc mảng cùng shape với points[..., 0]
+            steps (int): Số bước tích phân
+
+        Returns:
+            np.array: [..., 2] vị trí sau khi trôi
+        """
+        position = np.array(points, dtype=np.float64)
+        dt = (np.asarray(duration, dtype=np.float64) / steps)[..., None]
+        for _ in range(steps):
+            midpoint = position + self.sample(position) * dt / 2
+            position = position + self.sample(midpoint) * dt
+        return position
+
+    def mean_along_path(self, starts, ends, samples=8):
+        """
+        Dòng chảy trung bình trên đoạn thẳng từ starts tới ends (đường đi của phao)
+
+        Args:
+            starts (np.array): [..., 2] điểm đầu
+            ends (np.array): [..., 2] điểm cuối
+            samples (int): Số điểm lấy mẫu trên mỗi đoạn
+
+        Returns:
+            np.array: [..., 2] dòng chảy trung bình (m/s)
+        """
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        fractions = (np.arange(samples) + 0.5) / samples
+        shape = (samples,) + (1,) * (np.broadcast(starts, ends).ndim - 1) + (1,)
+        points = starts + (ends - starts) * fractions.reshape(shape)
+        return self.sample(points).mean(axis=0)
+
+
+def solve_intercept_in_field(buoy_positions, buoy_speeds, target_positions, field,
+                             target_velocities=None, iterations=3):
+    """
+    Điểm gặp sớm nhất khi dòng chảy thay đổi theo vị trí
+
+    Lặp: giải intercept với dòng chảy trung bình trên đường đi của phao và
+    vận tốc trôi của target theo thời gian gặp của lần lặp trước.
+
+    Args:
+        buoy_positions (np.array): [B, 2] vị trí phao
+        buoy_speeds (np.array): [B] hoặc số, tốc độ phao so với nước
+        target_positions (np.array): [T, 2] vị trí target
+        field (CurrentField): Trường dòng chảy
+        target_velocities (np.array): [T, 2] vận tốc target, None = trôi theo dòng chảy
+        iterations (int): Số lần lặp
+
+    Returns:
+        dict: Như solve_intercept
+    """
+    buoys = np.asarray(buoy_positions, dtype=np.float64).reshape(-1, 2)
+    targets = np.asarray(target_positions, dtype=np.float64).reshape(-1, 2)
+    pairs = (len(buoys), len(targets), 2)
+
+    # Lần đầu: dòng chảy tại vị trí target cho cả phao và target
+    at_target = np.broadcast_to(field.sample(targets)[None, :, :], pairs)
+    current = at_target
+    velocities = at_target if target_velocities is None else target_velocities
+
+    result = solve_intercept(buoys, buoy_speeds, targets, velocities, current)
+    for _ in range(iterations - 1):
+        time = np.where(result['reachable'], result['time'], 0.0)
+        if target_velocities is None:
+            drifted = field.integrate_drift(np.broadcast_to(targets[None, :, :], pairs), time)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                velocities = np.where(time[..., None] > 0, (drifted - targets[None, :, :]) / time[..., None], at_target)
+            point = drifted
+        else:
+            point = result['point']
+        current = field.mean_along_path(np.broadcast_to(buoys[:, None, :], pairs), point)
+        result = solve_intercept(buoys, buoy_speeds, targets, velocities, current)
+    return result
@@ -0,0 +1,173 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+
+def default_levels(imgsz=640, reduced_imgsz=480, model_path=None, light_model_path=None, quiet_rate_scale=0.5):
+    """
+    Các mức giảm chất lượng, mỗi mức giữ lại các bước của mức trước
+
+    0. NORMAL: input imgsz, model chính, lưu ảnh annotate
+    1. REDUCED_INPUT: input nhỏ hơn (reduced_imgsz)
+    2. LIGHT_MODEL: model nhẹ hơn cùng bộ class (bỏ qua nếu không cấu hình)
+    3. QUIET_THROTTLE: camera yên tĩnh nhận ít frame hơn (quiet_rate_scale)
+    4. NO_ANNOTATIONS: không vẽ/lưu ảnh kết quả
+
+    Returns:
+        list: [(tên mức, profile)]
+    """
+    profile = {"imgsz": imgsz, "model_path": model_path, "quiet_rate_scale": 1.0, "annotate": True}
+    levels = [('NORMAL', dict(profile))]
+    steps = [
+        ('REDUCED_INPUT', {"imgsz": reduced_imgsz}),
+        ('LIGHT_MODEL', {"model_path": light_model_path} if light_model_path else None),
+        ('QUIET_THROTTLE', {"quiet_rate_scale": quiet_rate_scale}),
+        ('NO_ANNOTATIONS', {"annotate": False})
+    ]
+    for name, change in steps:
+        if change is None:
+            continue
+        profile.update(change)
+        levels.append((name, dict(profile)))
+    return levels
+
+
+class DegradationController:
+    """
+    Class tự giảm/khôi phục chất lượng xử lý theo latency mục tiêu (SLO)
+
+    Latency của từng stage (chờ hàng đợi, inference, ...) được ghi lại theo
+    cửa sổ thời gian. Mỗi interval giây controller so phân vị latency với
+    mục tiêu của stage: vượt mục tiêu liên tiếp up_after lần thì xuống một
+    mức, thấp hơn recover_ratio * mục tiêu ở mọi stage liên tiếp down_after
+    lần thì lên lại một mức. Ngưỡng lên/xuống khác nhau và cửa sổ được xóa
+    sau mỗi lần đổi mức (hysteresis) nên controller không dao động giữa hai mức.
+    """
+
+    def __init__(self, levels, targets, percentile=95, window=10.0, interval=2.0, up_after=2, down_after=5,
+                 recover_ratio=0.6, min_samples=5, on_change=None, history_size=100):
+        """
+        Khởi tạo DegradationController
+
+        Args:
+            levels (list): [(tên mức, profile)] từ default_levels
+            targets (dict): stage -> latency mục tiêu (giây)
+            percentile (float): Phân vị latency so với mục tiêu
+            window (float): Cửa sổ latency (giây)
+            interval (float): Thời gian giữa hai lần đánh giá (giây)
+            up_after (int): Số lần vượt mục tiêu liên tiếp để giảm chất lượng
+            down_after (int): Số lần đạt mục tiêu liên tiếp để khôi phục chất lượng
+            recover_ratio (float): Latency phải dưới recover_ratio * mục tiêu mới được khôi phục
+            min_samples (int): Số mẫu tối thiểu của stage để coi là vượt mục tiêu
+            on_change (callable): on_change(level_name, profile) mỗi khi đổi mức
+            history_size (int): Số lần đổi mức gần nhất được giữ lại
+        """
+        self.levels = levels
+        self.targets = targets
+        self.percentile = percentile
+        self.window = window
+        self.interval = interval
+        self.up_after = up_after
+        self.down_after = down_after
+        self.recover_ratio = recover_ratio
+        self.min_samples = min_samples
+        self.on_change = on_change
+
+        self._lock = threading.Lock()
+        self._level = 0
+        self._samples = collections.defaultdict(collections.deque)  # stage -> deque (thời điểm, giây)
+        self._breaches = 0
+        self._healthy = 0
+        self._evaluated_at = None
+        self._changed_at = time.time()
+        self._history = collections.deque(maxlen=history_size)
+
+    @property
+    def level(self):
+        return self._level
+
+    def profile(self):
+        """
+        Profile của mức hiện tại: imgsz, model_path, quiet_rate_scale, annotate
+        """
+        return self.levels[self._level][1]
+
+    def observe(self, stage, seconds, now=None):
+        """
+        Ghi latency của một stage, đánh giá lại mức nếu đã tới interval
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._samples[stage].append((now, seconds))
+            if self._evaluated_at is None:
+                self._evaluated_at = now
+            if now - self._evaluated_at < self.interval:
+                return
+            self._evaluated_at = now
+            change = self._evaluate(now)
+        if change is not None and self.on_change is not None:
+            self.on_change(*change)
+
+    def _latencies(self, now):
+        # Phân vị latency của từng stage trong cửa sổ (bỏ mẫu cũ)
+        latencies = {}
+        for stage, samples in self._samples.items():
+            while samples and samples[0][0] < now - self.window:
+                samples.popleft()
+            if samples:
+                latencies[stage] = (float(np.percentile([s for _, s in samples], self.percentile)), len(samples))
+        return latencies
+
+    def _evaluate(self, now):
+        latencies = self._latencies(now)
+        breached = [stage for stage, (latency, count) in latencies.items()
+                    if stage in self.targets and count >= self.min_samples and latency > self.targets[stage]]
+        healthy = all(latency < self.recover_ratio * self.targets[stage]
+                      for stage, (latency, _) in latencies.items() if stage in self.targets)
+
+        self._breaches = self._breaches + 1 if breached else 0
+        self._healthy = self._healthy + 1 if healthy and not breached else 0
+        if self._breaches >= self.up_after and self._level < len(self.levels) - 1:
+            reason = ', '.join(f"{stage} p{self.percentile:g} {latencies[stage][0] * 1000:.0f}ms > "
+                               f"{self.targets[stage] * 1000:.0f}ms" for stage in breached)
+            return self._set_level(self._level + 1, reason)
+        if self._healthy >= self.down_after and self._level > 0:
+            return self._set_level(self._level - 1, "latency below recovery threshold")
+        return None
+
+    def _set_level(self, level, reason):
+        old_name = self.levels[self._level][0]
+        self._level = level
+        name, profile = self.levels[level]
+        self._breaches = self._healthy = 0
+        self._samples.clear()  # Latency ở mức cũ không còn đúng với mức mới
+        self._changed_at = time.time()
+        self._history.append({"timestamp": self._changed_at, "from": old_name, "to": name, "reason": reason})
+        print(f"Degradation level {old_name} -> {name}: {reason}")
+        return name, profile
+
+    def stats(self, now=None):
+        """
+        Mức hiện tại, latency từng stage so với mục tiêu và lịch sử đổi mức
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            latencies = self._latencies(now)
+            name, profile = self.levels[self._level]
+            return {
+                "level": self._level,
+                "name": name,
+                "profile": dict(profile),
+                "since": self._changed_at,
+                "stages": {
+                    stage: {
+                        f"p{self.percentile:g}_ms": round(latency * 1000, 1),
+                        "target_ms": round(self.targets[stage] * 1000, 1) if stage in self.targets else None,
+                        "samples": count
+                    }
+                    for stage, (latency, count) in sorted(latencies.items())
+                },
+                "history": list(self._history)
+            }
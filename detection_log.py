@@ -0,0 +1,332 @@
+import atexit
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Cột theo frame và theo box, mỗi cột là một file nhị phân chỉ ghi nối thêm
+FRAME_COLUMNS = {
+    'ts': np.float64,        # Thời điểm detect (epoch giây)
+    'box_start': np.int64,   # Vị trí box đầu tiên của frame trong các cột box
+    'box_count': np.int32,   # Số box của frame
+}
+BOX_COLUMNS = {
+    'box': (np.float32, 4),  # [x1, y1, x2, y2] theo pixel ảnh gốc
+    'cls': (np.int16, 1),
+    'conf': (np.float32, 1),
+    'dist': (np.float32, 1),  # distance_m, NaN nếu không ước tính
+}
+
+PARTITION_FORMAT = '%Y%m%d%H'
+
+
+def partition_name(timestamp):
+    """
+    Tên partition theo giờ (UTC) của timestamp
+    """
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime(PARTITION_FORMAT)
+
+
+def safe_camera_id(camera_id):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(camera_id)) or 'default'
+
+
+class DetectionLog:
+    """
+    Class lưu kết quả detect lâu dài dạng cột, chỉ ghi nối thêm
+
+    Dữ liệu được chia partition theo camera và theo giờ:
+    <log_dir>/<camera_id>/<YYYYMMDDHH>/<cột>.bin. Request chỉ đưa bản ghi vào
+    hàng đợi, một luồng nền gom và ghi theo batch. Khi truy vấn, tên thư mục
+    partition dùng làm index theo camera/giờ, trong partition dùng tìm kiếm
+    nhị phân trên cột thời gian (đọc qua memmap) nên không phải quét toàn bộ.
+
+    Mỗi batch được fsync trước khi ghi batch tiếp theo. Lần đầu ghi vào một
+    partition (sau khi khởi động lại), các cột được cắt về độ dài hợp lệ chung
+    nên dòng ghi dở do crash giữa các cột không làm lệch vị trí box.
+    """
+
+    def __init__(self, log_dir, flush_interval=1.0, max_batch=1000, max_disorder=60.0):
+        """
+        Khởi tạo DetectionLog
+
+        Args:
+            log_dir (str): Thư mục lưu log
+            flush_interval (float): Thời gian tối đa giữa hai lần ghi (giây)
+            max_batch (int): Số bản ghi tối đa mỗi lần ghi
+            max_disorder (float): Độ lệch thứ tự thời gian tối đa giữa các bản ghi (giây),
+                dùng làm biên khi tìm kiếm nhị phân
+        """
+        self.log_dir = str(log_dir)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_disorder = max_disorder
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._queue = queue.Queue(maxsize=100000)
+        self._write_lock = threading.Lock()
+        self._box_offsets = {}
+        self._writer = threading.Thread(target=self._writer_loop, name='detection-log', daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def append(self, camera_id, timestamp, boxes, classes, confidences, distances=None):
+        """
+        Thêm kết quả detect của một frame (không chặn)
+
+        Args:
+            camera_id (str): Id camera
+            timestamp (float): Thời điểm detect
+            boxes (np.array): [N, 4] dạng [x1, y1, x2, y2]
+            classes (list): Class id của từng box
+            confidences (list): Confidence của từng box
+            distances (list): distance_m của từng box (None nếu không có)
+        """
+        count = len(classes)
+        record = (
+            safe_camera_id(camera_id),
+            float(timestamp),
+            np.asarray(boxes, dtype=np.float32).reshape(count, 4),
+            np.asarray(classes, dtype=np.int16).reshape(count),
+            np.asarray(confidences, dtype=np.float32).reshape(count),
+            np.asarray([np.nan if d is None else d for d in distances] if distances is not None
+                       else np.full(count, np.nan), dtype=np.float32).reshape(count)
+        )
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.rows_dropped += 1
+
+    def flush(self):
+        """
+        Ghi ngay các bản ghi đang chờ
+        """
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if records:
+            self._write(records)
+
+    def _writer_loop(self):
+        while True:
+            records = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(records) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    records.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(records)
+            except Exception as e:
+                print(f"Error writing detection log: {e}")
+
+    def _write(self, records):
+        # Gom theo partition, trong partition sắp xếp theo thời gian
+        partitions = {}
+        for record in records:
+            key = (record[0], partition_name(record[1]))
+            partitions.setdefault(key, []).append(record)
+
+        with self._write_lock:
+            for (camera_id, partition), rows in partitions.items():
+                rows.sort(key=lambda r: r[1])
+                self._write_partition(os.path.join(self.log_dir, camera_id, partition), rows)
+                self.rows_written += len(rows)
+
+    def _write_partition(self, path, rows):
+        os.makedirs(path, exist_ok=True)
+        box_start = self._box_offsets.get(path)
+        if box_start is None:
+            box_start = _recover_partition(path)
+
+        counts = np.array([len(r[3]) for r in rows], dtype=np.int32)
+        starts = box_start + np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+
+        # Ghi cột box trước cột frame để frame luôn trỏ tới box đã có trên đĩa
+        box_data = {
+            'box': np.concatenate([r[2] for r in rows]) if counts.sum() else np.empty((0, 4), np.float32),
+            'cls': np.concatenate([r[3] for r in rows]),
+            'conf': np.concatenate([r[4] for r in rows]),
+            'dist': np.concatenate([r[5] for r in rows]),
+        }
+        for name, (dtype, _) in BOX_COLUMNS.items():
+            _append_column(path, name, box_data[name].astype(dtype, copy=False))
+
+        frame_data = {
+            'ts': np.array([r[1] for r in rows], dtype=np.float64),
+            'box_start': starts,
+            'box_count': counts,
+        }
+        for name, dtype in FRAME_COLUMNS.items():
+            _append_column(path, name, frame_data[name].astype(dtype, copy=False))
+
+        self._box_offsets[path] = box_start + int(counts.sum())
+
+    def cameras(self):
+        """
+        Danh sách camera có dữ liệu
+        """
+        return sorted(d for d in os.listdir(self.log_dir) if os.path.isdir(os.path.join(self.log_dir, d)))
+
+    @staticmethod
+    def next_cursor(records, start, offset, limit):
+        """
+        Vị trí trang tiếp theo của query (exclusive): (start, offset), None nếu đã hết
+
+        Bản ghi cùng thời điểm với bản ghi cuối trang đã được trả về được bỏ qua
+        bằng offset, nên trang sau không lặp lại và không bị kẹt khi nhiều bản
+        ghi cùng timestamp.
+        """
+        if len(records) < limit or not records:
+            return None
+        last = records[-1]['timestamp']
+        same = sum(1 for record in records if record['timestamp'] == last)
+        return last, same + (offset if last == start else 0)
+
+    def query(self, camera_id=None, start=None, end=None, limit=1000, offset=0):
+        """
+        Truy vấn kết quả detect theo khoảng thời gian và camera
+
+        Args:
+            camera_id (str): Id camera (None = tất cả camera)
+            start (float): Thời điểm bắt đầu (epoch giây, None = không giới hạn)
+            end (float): Thời điểm kết thúc (epoch giây, None = hiện tại)
+            limit (int): Số bản ghi tối đa
+            offset (int): Bỏ qua số bản ghi đầu tiên này (phân trang, xem next_cursor)
+
+        Returns:
+            list: Bản ghi sắp xếp theo thời gian (cùng thời điểm thì theo camera, rồi theo thứ tự ghi)
+        """
+        end = time.time() if end is None else end
+        start = 0.0 if start is None else start
+        start_partition, end_partition = partition_name(max(start, 0)), partition_name(end)
+
+        cameras = [safe_camera_id(camera_id)] if camera_id else self.cameras()
+        results = []
+        for camera in cameras:
+            camera_dir = os.path.join(self.log_dir, camera)
+            if not os.path.isdir(camera_dir):
+                continue
+
+            # Index theo giờ: chỉ mở các partition nằm trong khoảng truy vấn
+            for partition in sorted(os.listdir(camera_dir)):
+                if start_partition <= partition <= end_partition:
+                    results.extend(self._query_partition(os.path.join(camera_dir, partition), camera, start, end,
+                                                         offset + limit))
+
+        results.sort(key=lambda r: (r['timestamp'], r['camera_id']))
+        return results[offset:offset + limit]
+
+    def _query_partition(self, path, camera, start, end, limit):
+        frames = _open_columns(path, FRAME_COLUMNS)
+        if frames is None:
+            return []
+        ts = frames['ts']
+
+        # Tìm kiếm nhị phân, nới biên theo độ lệch thứ tự rồi lọc chính xác
+        lo = np.searchsorted(ts, start - self.max_disorder, side='left')
+        hi = np.searchsorted(ts, end + self.max_disorder, side='right')
+        idx = np.arange(lo, hi)
+        idx = idx[(ts[lo:hi] >= start) & (ts[lo:hi] <= end)]
+        # Cắt theo thứ tự thời gian (file chỉ gần đúng thứ tự) để không bỏ sót bản ghi sớm hơn
+        idx = idx[np.argsort(ts[idx], kind='stable')][:limit]
+        if len(idx) == 0:
+            return []
+
+        boxes = {name: _open_column(path, name, dtype, width) for name, (dtype, width) in BOX_COLUMNS.items()}
+        results = []
+        for i in idx:
+            s, n = int(frames['box_start'][i]), int(frames['box_count'][i])
+            dist = boxes['dist'][s:s + n]
+            results.append({
+                "camera_id": camera,
+                "timestamp": float(ts[i]),
+                "boxes": boxes['box'][s:s + n].round(1).tolist(),
+                "classes": boxes['cls'][s:s + n].tolist(),
+                "confidences": boxes['conf'][s:s + n].round(4).tolist(),
+                "distances": [None if np.isnan(d) else round(float(d), 2) for d in dist]
+            })
+        return results
+
+
+def _column_path(path, name):
+    return os.path.join(path, f'{name}.bin')
+
+
+def _append_column(path, name, data):
+    with open(_column_path(path, name), 'ab') as f:
+        f.write(np.ascontiguousarray(data).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _truncate_column(path, name, spec, rows):
+    dtype, width = spec
+    size = rows * np.dtype(dtype).itemsize * width
+    column = _column_path(path, name)
+    if os.path.exists(column) and os.path.getsize(column) != size:
+        with open(column, 'r+b') as f:
+            f.truncate(size)
+            os.fsync(f.fileno())
+
+
+def _recover_partition(path):
+    """
+    Cắt các cột của partition về độ dài hợp lệ chung (bỏ dòng ghi dở khi crash giữa các cột)
+
+    Returns:
+        int: Số box hợp lệ, vị trí ghi box tiếp theo
+    """
+    box_rows = min(_column_length(path, name, spec) for name, spec in BOX_COLUMNS.items())
+    frame_rows = min(_column_length(path, name, (dtype, 1)) for name, dtype in FRAME_COLUMNS.items())
+
+    # Frame chỉ hợp lệ khi box của nó đã có đủ trên mọi cột box
+    ends = np.array(_open_column(path, 'box_start', np.int64, rows=frame_rows)) + \
+        np.array(_open_column(path, 'box_count', np.int32, rows=frame_rows))
+    frame_rows = int(np.argmax(ends > box_rows)) if np.any(ends > box_rows) else frame_rows
+    # Box ghi sau frame hợp lệ cuối cùng thuộc batch chưa ghi xong frame, bỏ đi
+    box_rows = int(ends[frame_rows - 1]) if frame_rows else 0
+
+    for name, dtype in FRAME_COLUMNS.items():
+        _truncate_column(path, name, (dtype, 1), frame_rows)
+    for name, spec in BOX_COLUMNS.items():
+        _truncate_column(path, name, spec, box_rows)
+    return box_rows
+
+
+def _column_length(path, name, spec):
+    dtype, width = spec
+    try:
+        return os.path.getsize(_column_path(path, name)) // (np.dtype(dtype).itemsize * width)
+    except OSError:
+        return 0
+
+
+def _open_column(path, name, dtype, width=1, rows=None):
+    length = _column_length(path, name, (dtype, width)) if rows is None else rows
+    if length == 0:
+        return np.empty((0, width) if width > 1 else 0, dtype=dtype)
+    shape = (length, width) if width > 1 else (length,)
+    return np.memmap(_column_path(path, name), dtype=dtype, mode='r', shape=shape)
+
+
+def _open_columns(path, columns):
+    # Số dòng hợp lệ là độ dài ngắn nhất (bỏ qua dòng đang ghi dở)
+    rows = min(_column_length(path, name, (dtype, 1)) for name, dtype in columns.items())
+    if rows == 0:
+        return None
+    return {name: _open_column(path, name, dtype, rows=rows) for name, dtype in columns.items()}
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import Counter
+
+# Độ phân giải: tên cửa sổ -> (độ dài bucket (giây), số bucket)
+RESOLUTIONS = {
+    'minute': (1, 60),
+    'hour': (60, 60),
+    'day': (3600, 24),
+}
+
+
+class _RollupWindow:
+    """
+    Ring buffer các bucket cùng tổng của cả cửa sổ, cập nhật cộng dồn:
+    khi bucket cũ bị loại khỏi cửa sổ thì trừ giá trị của nó khỏi tổng
+    """
+
+    def __init__(self, bucket_seconds, slots):
+        self.bucket_seconds = bucket_seconds
+        self.slots = slots
+        self.epochs = [None] * slots
+        self.counts = [Counter() for _ in range(slots)]
+        self.frames = [0] * slots
+        self.drowning_frames = [0] * slots
+        self.alerts = [0] * slots
+        self.max_conf = [0.0] * slots
+
+        self.total_counts = Counter()
+        self.total_frames = 0
+        self.total_drowning_frames = 0
+        self.total_alerts = 0
+        self.head = None
+
+    def advance(self, epoch):
+        """
+        Loại các bucket đã ra khỏi cửa sổ (tối đa slots bucket mỗi lần)
+        """
+        if self.head is not None and epoch <= self.head:
+            return
+        start = epoch - self.slots + 1 if self.head is None else max(self.head + 1, epoch - self.slots + 1)
+        for e in range(start, epoch + 1):
+            self._reset(e % self.slots, e)
+        self.head = epoch
+
+    def _reset(self, slot, epoch):
+        if self.epochs[slot] is not None:
+            self.total_counts.subtract(self.counts[slot])
+            self.total_counts += Counter()  # Bỏ các class có số đếm bằng 0
+            self.total_frames -= self.frames[slot]
+            self.total_drowning_frames -= self.drowning_frames[slot]
+            self.total_alerts -= self.alerts[slot]
+        self.epochs[slot] = epoch
+        self.counts[slot] = Counter()
+        self.frames[slot] = 0
+        self.drowning_frames[slot] = 0
+        self.alerts[slot] = 0
+        self.max_conf[slot] = 0.0
+
+    def add(self, timestamp, class_counts, max_conf, has_drowning, alert):
+        epoch = int(timestamp // self.bucket_seconds)
+        self.advance(epoch)
+        if epoch <= self.head - self.slots:
+            return  # Quá cũ, đã ra khỏi cửa sổ
+
+        slot = epoch % self.slots
+        self.counts[slot].update(class_counts)
+        self.total_counts.update(class_counts)
+        self.frames[slot] += 1
+        self.total_frames += 1
+        if has_drowning:
+            self.drowning_frames[slot] += 1
+            self.total_drowning_frames += 1
+        if alert:
+            self.alerts[slot] += 1
+            self.total_alerts += 1
+        self.max_conf[slot] = max(self.max_conf[slot], max_conf)
+
+    def summary(self, now):
+        self.advance(int(now // self.bucket_seconds))
+        window_seconds = self.bucket_seconds * self.slots
+        drowning = self.total_counts.get(0, 0)
+        return {
+            "window_seconds": window_seconds,
+            "frames": self.total_frames,
+            "counts_by_class": {int(k): v for k, v in self.total_counts.items()},
+            "drowning_detections": drowning,
+            "drowning_frames": self.total_drowning_frames,
+            "drowning_rate_per_minute": round(drowning * 60.0 / window_seconds, 3),
+            "drowning_frame_ratio": round(self.total_drowning_frames / self.total_frames, 4) if self.total_frames else 0.0,
+            "max_confidence": round(max(self.max_conf), 4),
+            "alerts": self.total_alerts
+        }
+
+
+class DetectionStats:
+    """
+    Class lưu thống kê detect theo camera ở nhiều độ phân giải (giây, phút, giờ)
+
+    Mỗi kết quả detect được cộng dồn vào bucket tương ứng, tổng của mỗi cửa
+    sổ (phút/giờ/ngày gần nhất) được giữ sẵn nên truy vấn không phụ thuộc
+    độ dài cửa sổ.
+    """
+
+    def __init__(self, drowning_class=0):
+        self.drowning_class = drowning_class
+        self._lock = threading.Lock()
+        self._cameras = {}
+
+    def record(self, camera_id, classes, confidences, alert_triggered=False, timestamp=None):
+        """
+        Cộng dồn kết quả detect của một frame
+
+        Args:
+            camera_id (str): Id camera
+            classes (list): Class id detect được
+            confidences (list): Confidence của từng box
+            alert_triggered (bool): Frame này có phát cảnh báo không
+            timestamp (float): Thời điểm detect (mặc định hiện tại)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        class_counts = Counter(int(c) for c in classes)
+        max_conf = float(max(confidences)) if len(confidences) else 0.0
+        has_drowning = self.drowning_class in class_counts
+
+        with self._lock:
+            windows = self._cameras.get(camera_id)
+            if windows is None:
+                windows = {name: _RollupWindow(*spec) for name, spec in RESOLUTIONS.items()}
+                self._cameras[camera_id] = windows
+            for window in windows.values():
+                window.add(timestamp, class_counts, max_conf, has_drowning, alert_triggered)
+
+    def summary(self, camera_id=None, window='minute', now=None):
+        """
+        Thống kê của cửa sổ gần nhất
+
+        Args:
+            camera_id (str): Id camera (None = tất cả camera)
+            window (str): 'minute', 'hour' hoặc 'day'
+
+        Returns:
+            dict: Thống kê theo camera
+        """
+        if window not in RESOLUTIONS:
+            raise ValueError(f"Unknown window '{window}', use one of {list(RESOLUTIONS)}")
+        now = time.time() if now is None else now
+
+        with self._lock:
+            cameras = [camera_id] if camera_id else list(self._cameras)
+            return {
+                camera: self._cameras[camera][window].summary(now)
+                for camera in cameras if camera in self._cameras
+            }
+
+    def cameras(self):
+        with self._lock:
+            return list(self._cameras)
@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 import math
 
+from tracing import tracer
+
 class DistanceEstimator:
     """
     Class để ước tính khoảng cách từ camera đến đối tượng
@@ -212,29 +214,53 @@ def estimate_distances_from_yolo_results(results, image_shape, distance_estimato
     Returns:
         list: Danh sách thông tin khoảng cách cho mỗi đối tượng
     """
-    distances = []
-    
     if results and len(results) > 0:
         boxes = results[0].boxes
         if boxes is not None and len(boxes) > 0:
-            for i, box in enumerate(boxes):
-                # Lấy bounding box
-                bbox = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
-                confidence = box.conf[0].cpu().numpy()
-                class_id = int(box.cls[0].cpu().numpy())
-                
-                # Ước tính khoảng cách
-                distance_info = distance_estimator.estimate_distance_from_center(
-                    bbox, image_shape[1], image_shape[0]
-                )
-                
-                if distance_info:
-                    distance_info.update({
-                        'object_id': i,
-                        'class_id': class_id,
-                        'confidence': float(confidence),
-                        'bbox': bbox.tolist()
-                    })
-                    distances.append(distance_info)
+            return estimate_distances_from_boxes(
+                boxes.xyxy.cpu().numpy(),
+                boxes.conf.cpu().numpy(),
+                boxes.cls.cpu().numpy(),
+                image_shape,
+                distance_estimator,
+                method
+            )
+    
+    return []
+
+def estimate_distances_from_boxes(boxes, confidences, class_ids, image_shape, distance_estimator, method='width'):
+    """
+    Ước tính khoảng cách từ các bounding box theo pixel của ảnh gốc
+    
+    Args:
+        boxes (np.array): [N, 4] dạng [x1, y1, x2, y2]
+        confidences (np.array): Confidence của từng box
+        class_ids (np.array): Class id của từng box
+        image_shape (tuple): (height, width) của ảnh
+        distance_estimator: DistanceEstimator instance
+        method (str): 'width' hoặc 'height'
+        
+    Returns:
+        list: Danh sách thông tin khoảng cách cho mỗi đối tượng
+    """
+    distances = []
+    
+    with tracer.span('distance_estimation', objects=len(boxes)):
+        for i, bbox in enumerate(boxes):
+            bbox = [float(v) for v in bbox]  # [x1, y1, x2, y2]
+            
+            # Ước tính khoảng cách
+            distance_info = distance_estimator.estimate_distance_from_center(
+                bbox, image_shape[1], image_shape[0]
+            )
+            
+            if distance_info:
+                distance_info.update({
+                    'object_id': i,
+                    'class_id': int(class_ids[i]),
+                    'confidence': float(confidences[i]),
+                    'bbox': bbox
+                })
+                distances.append(distance_info)
     
-    return distances 
\ No newline at end of file
+    return distances
@@ -35,9 +35,31 @@ const char* serverName = "YOUR_SERVER_IP";
 #define HREF_GPIO_NUM     23
 #define PCLK_GPIO_NUM     4
 
+// Kết quả detect dạng nhị phân (Accept: application/octet-stream), khớp compact_encoding.py
+struct __attribute__((packed)) DetectHeader {
+  uint8_t version;
+  uint8_t flags;            // bit0 alert, bit1 distance
+  uint16_t detectedObjects;
+  uint16_t records;         // Số DetectObject theo sau header
+  double timestamp;
+  uint16_t intervalMs;      // Gợi ý thời gian tới lần chụp sau (0 = giữ nguyên)
+  uint8_t jpegQuality;      // Gợi ý chất lượng JPEG (0 = giữ nguyên)
+};
+struct __attribute__((packed)) DetectObject {
+  uint8_t objectId;
+  uint8_t classId;
+  float confidence;
+  float distanceM;          // NaN nếu không ước tính được
+  float angleX;
+  float angleY;
+};
+const bool useCompactResponse = true;  // false: nhận JSON đầy đủ
+
 // Biến toàn cục
 unsigned long lastCaptureTime = 0;
-const unsigned long captureInterval = 5000; // Chụp ảnh mỗi 5 giây
+unsigned long captureInterval = 5000; // Chụp ảnh mỗi 5 giây, API gợi ý lại sau mỗi lần detect
+const unsigned long MIN_CAPTURE_INTERVAL = 100;
+const unsigned long MAX_CAPTURE_INTERVAL = 10000;
 bool alertTriggered = false;
 
 void setup() {
@@ -137,14 +159,32 @@ void captureAndDetect() {
     HTTPClient http;
     http.begin(apiUrl);
     http.addHeader("Content-Type", "application/json");
+    if (useCompactResponse) {
+      http.addHeader("Accept", "application/octet-stream");
+    }
     
     // Tạo JSON payload
     String jsonData = "{\"image\":\"" + base64Image + "\"}";
     
+    // API trả 503 + Retry-After khi quá tải
+    const char* headerKeys[] = {"Retry-After"};
+    http.collectHeaders(headerKeys, 1);
+    
     Serial.println("Sending request to API...");
     int httpResponseCode = http.POST(jsonData);
     
-    if (httpResponseCode > 0) {
+    if (httpResponseCode == 503) {
+      int retryAfter = http.header("Retry-After").toInt();
+      Serial.println("API overloaded, retry after " + String(retryAfter) + "s");
+      http.end();
+      esp_camera_fb_return(fb);
+      delay(max(retryAfter, 1) * 1000);
+      return;
+    } else if (httpResponseCode == 200 && useCompactResponse) {
+      Serial.println("HTTP Response code: " + String(httpResponseCode));
+      parseCompactResponse(http.getStreamPtr(), http.getSize());
+      
+    } else if (httpResponseCode > 0) {
       String response = http.getString();
       Serial.println("HTTP Response code: " + String(httpResponseCode));
       Serial.println("Response: " + response);
@@ -165,6 +205,59 @@ void captureAndDetect() {
   esp_camera_fb_return(fb);
 }
 
+void applyCaptureAdvice(unsigned long intervalMs, int jpegQuality) {
+  // API gợi ý chụp dày hơn khi có dấu hiệu đuối nước, thưa hơn khi yên tĩnh hoặc server quá tải
+  if (intervalMs > 0) {
+    captureInterval = constrain(intervalMs, MIN_CAPTURE_INTERVAL, MAX_CAPTURE_INTERVAL);
+  }
+  if (jpegQuality > 0) {
+    sensor_t* sensor = esp_camera_sensor_get();
+    if (sensor && sensor->status.quality != jpegQuality) {
+      sensor->set_quality(sensor, jpegQuality);
+    }
+  }
+  Serial.println("Next capture in " + String(captureInterval) + "ms, JPEG quality " + String(jpegQuality));
+}
+
+void parseCompactResponse(WiFiClient* stream, int size) {
+  // Đọc header rồi từng đối tượng, không cần buffer JSON
+  DetectHeader header;
+  if (size < (int)sizeof(header) ||
+      stream->readBytes((uint8_t*)&header, sizeof(header)) != sizeof(header)) {
+    Serial.println("Invalid compact response");
+    return;
+  }
+  
+  bool alertTriggered = header.flags & 0x01;
+  applyCaptureAdvice(header.intervalMs, header.jpegQuality);
+  Serial.println("=== Detection Results ===");
+  Serial.println("Detected objects: " + String(header.detectedObjects));
+  Serial.println("Alert triggered: " + String(alertTriggered));
+  
+  for (int i = 0; i < header.records; i++) {
+    DetectObject obj;
+    if (stream->readBytes((uint8_t*)&obj, sizeof(obj)) != sizeof(obj)) {
+      break;
+    }
+    Serial.printf("  Object %d (Class %d): %.2fm, angle %.1f/%.1f\n",
+                  obj.objectId, obj.classId, obj.distanceM, obj.angleX, obj.angleY);
+    
+    // Xử lý theo khoảng cách
+    if (obj.distanceM < 2.0) {
+      Serial.println("⚠️  WARNING: Person very close!");
+    } else if (obj.distanceM < 5.0) {
+      Serial.println("⚠️  WARNING: Person close!");
+    }
+  }
+  
+  if (alertTriggered) {
+    Serial.println("🚨 DROWNING ALERT! 🚨");
+    handleAlert();
+  }
+  
+  Serial.println("========================");
+}
+
 void parseResponse(String response) {
   // Parse JSON response
   DynamicJsonDocument doc(2048);  // Tăng buffer size cho distance info
@@ -181,6 +274,7 @@ void parseResponse(String response) {
   int detectedObjects = doc["detected_objects"];
   bool alertTriggered = doc["alert_triggered"];
   bool distanceEnabled = doc["distance_estimation_enabled"];
+  applyCaptureAdvice(doc["capture"]["interval_ms"] | 0, doc["capture"]["jpeg_quality"] | 0);
   
   Serial.println("=== Detection Results ===");
   Serial.println("Success: " + String(success));
@@ -0,0 +1,231 @@
+import threading
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from current_field import solve_intercept_in_field
+from intercept_solver import solve_intercept
+
+# Trạng thái phao không nhận nhiệm vụ (RESCUING/RETURNING: đang cứu hoặc đưa người về trạm)
+UNAVAILABLE_STATUSES = {'OFFLINE', 'CHARGING', 'MAINTENANCE', 'RESCUING', 'RETURNING'}
+
+# Chi phí cho cặp phao/target không thể thực hiện
+INFEASIBLE_COST = 1e9
+
+
+class FleetAssigner:
+    """
+    Class phân công phao cứu hộ cho người gặp nạn
+
+    Chi phí của mỗi cặp phao/target là thời gian tới điểm gặp (intercept_solver).
+    Target được phân công theo từng mức ưu tiên (CRITICAL trước, rồi HIGH với
+    các phao còn lại, ...), trong mỗi mức phân công tối ưu bằng thuật toán
+    Hungarian (scipy linear_sum_assignment), nên khi thiếu phao người khẩn
+    cấp hơn luôn được nhận phao trước. Mỗi camera (scope) có hệ tọa độ
+    riêng nên phao chỉ được phân công cho target cùng scope với phao, bài toán
+    được giải riêng cho từng scope. Phân công hiện tại được giảm chi
+    phí một tỉ lệ switch_margin để phao không đổi target khi lợi ích không
+    đáng kể, và chỉ giải lại khi phao hoặc target thay đổi.
+    """
+
+    def __init__(self, switch_margin=0.15, min_battery=20.0, default_speed=4.0, buoy_timeout=30.0):
+        """
+        Khởi tạo FleetAssigner
+
+        Args:
+            switch_margin (float): Tỉ lệ chi phí phải giảm để đổi target của phao đang làm nhiệm vụ
+            min_battery (float): Phao có pin dưới mức này (%) không nhận nhiệm vụ
+            default_speed (float): Tốc độ phao nếu phao không báo (m/s)
+            buoy_timeout (float): Phao không báo trạng thái quá thời gian này bị coi là offline (giây)
+        """
+        self.switch_margin = switch_margin
+        self.min_battery = min_battery
+        self.default_speed = default_speed
+        self.buoy_timeout = buoy_timeout
+
+        self._lock = threading.Lock()
+        self._buoys = {}        # buoy_id -> trạng thái phao
+        self._targets = {}      # scope -> {"targets": [...], "current": (vx, vy)}
+        self._assignments = {}  # buoy_id -> assignment
+        self._dirty = False
+        self._available_ids = frozenset()
+        self.current_field = None
+        self.solve_count = 0
+        self.last_solve_ms = 0.0
+
+    def update_buoy(self, buoy_id, x, y, speed=None, battery=100.0, status='IDLE', timestamp=None, scope='default'):
+        """
+        Cập nhật vị trí và trạng thái phao
+
+        Args:
+            scope (str): Camera có hệ tọa độ chứa vị trí phao (cùng scope với set_targets)
+
+        Returns:
+            dict: Phân công hiện tại của phao (None nếu không có)
+        """
+        buoy = {
+            "buoy_id": buoy_id,
+            "x_m": float(x),
+            "y_m": float(y),
+            "speed_mps": float(speed) if speed else self.default_speed,
+            "battery": float(battery),
+            "status": status,
+            "scope": str(scope),
+            "updated_at": time.time() if timestamp is None else timestamp
+        }
+        with self._lock:
+            previous = self._buoys.get(buoy_id)
+            self._buoys[buoy_id] = buoy
+            if previous is None or any(previous[k] != buoy[k] for k in ('x_m', 'y_m', 'speed_mps', 'status', 'scope')) \
+                    or self._available(previous) != self._available(buoy):
+                self._dirty = True
+        return self.assignment_for(buoy_id)
+
+    def remove_buoy(self, buoy_id):
+        with self._lock:
+            if self._buoys.pop(buoy_id, None) is not None:
+                self._assignments.pop(buoy_id, None)
+                self._dirty = True
+
+    def set_targets(self, scope, targets, current=(0.0, 0.0)):
+        """
+        Cập nhật target của một nguồn (camera)
+
+        Args:
+            scope (str): Nguồn của target
+            targets (list): Target dạng {"target_id", "x_m", "y_m", "velocity" ((vx, vy) hoặc None), "priority"}
+            current (tuple): Vector dòng chảy tại nguồn (m/s)
+        """
+        entry = {"targets": list(targets), "current": tuple(float(c) for c in current)}
+        with self._lock:
+            if self._targets.get(scope) != entry:
+                if entry["targets"]:
+                    self._targets[scope] = entry
+                else:
+                    self._targets.pop(scope, None)
+                self._dirty = True
+
+    def set_current_field(self, current_field):
+        """
+        Dùng trường dòng chảy (CurrentField) thay cho dòng chảy của từng nguồn, None để bỏ
+        """
+        with self._lock:
+            self.current_field = current_field
+            self._dirty = True
+
+    def buoys(self):
+        with self._lock:
+            return [dict(buoy, available=self._available(buoy)) for buoy in self._buoys.values()]
+
+    def assignment_for(self, buoy_id):
+        with self._lock:
+            assignment = self._assignments.get(buoy_id)
+            return dict(assignment) if assignment else None
+
+    def solve(self, now=None):
+        """
+        Phân công phao cho target, chỉ giải lại khi dữ liệu thay đổi
+
+        Returns:
+            dict: assignments, unassigned_targets, idle_buoys
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            # Phao mất kết nối (quá buoy_timeout) cũng làm thay đổi tập phao sẵn sàng
+            available_ids = frozenset(b['buoy_id'] for b in self._buoys.values() if self._available(b, now))
+            if self._dirty or available_ids != self._available_ids:
+                self._available_ids = available_ids
+                self._solve(now)
+                self._dirty = False
+            return self._describe()
+
+    def _available(self, buoy, now=None):
+        now = time.time() if now is None else now
+        return (buoy['status'] not in UNAVAILABLE_STATUSES and
+                buoy['battery'] >= self.min_battery and
+                now - buoy['updated_at'] <= self.buoy_timeout)
+
+    def _solve(self, now):
+        start = time.perf_counter()
+        buoys = [b for b in self._buoys.values() if self._available(b, now)]
+        if not buoys or not self._targets:
+            self._assignments = {}
+            return
+
+        # Tọa độ của các camera không cùng hệ: mỗi scope là một bài toán riêng
+        assignments = {}
+        for scope, entry in self._targets.items():
+            group = [b for b in buoys if b['scope'] == scope]
+            if group and entry["targets"]:
+                assignments.update(self._solve_scope(group, entry))
+        self._assignments = assignments
+        self.solve_count += 1
+        self.last_solve_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    def _solve_scope(self, buoys, entry):
+        targets = entry["targets"]
+        positions = np.array([[b['x_m'], b['y_m']] for b in buoys])
+        speeds = np.array([b['speed_mps'] for b in buoys])
+
+        if self.current_field is not None:
+            # Trường dòng chảy: target chưa có vận tốc trôi theo dòng tại chỗ
+            field = self.current_field
+            velocities = np.array([t['velocity'] if t.get('velocity') is not None else field.sample([t['x_m'], t['y_m']])
+                                   for t in targets])
+            result = solve_intercept_in_field(positions, speeds, [[t['x_m'], t['y_m']] for t in targets],
+                                              field, velocities)
+        else:
+            # Target chưa có vận tốc tin cậy coi như trôi theo dòng chảy của camera
+            velocities = [t['velocity'] if t.get('velocity') is not None else entry["current"] for t in targets]
+            result = solve_intercept(positions, speeds, [[t['x_m'], t['y_m']] for t in targets],
+                                     velocities, entry["current"])
+        time_matrix, heading, point = result['time'], result['heading_degrees'], result['point']
+
+        cost = np.where(np.isfinite(time_matrix), time_matrix, INFEASIBLE_COST)
+
+        # Giữ phân công cũ trừ khi phân công mới tốt hơn rõ rệt
+        target_index = {t['target_id']: j for j, t in enumerate(targets)}
+        for i, buoy in enumerate(buoys):
+            previous = self._assignments.get(buoy['buoy_id'])
+            if previous and previous['target_id'] in target_index:
+                cost[i, target_index[previous['target_id']]] *= 1.0 - self.switch_margin
+
+        # Mức ưu tiên cao hơn (số nhỏ hơn) chọn phao trước, mức sau dùng các phao còn lại
+        free = list(range(len(buoys)))
+        assignments = {}
+        for priority in sorted({t.get('priority', 4) for t in targets}):
+            columns = [j for j, t in enumerate(targets) if t.get('priority', 4) == priority]
+            if not free:
+                break
+            rows, cols = linear_sum_assignment(cost[np.ix_(free, columns)])
+            taken = set()
+            for r, c in zip(rows, cols):
+                i, j = free[r], columns[c]
+                if cost[i, j] >= INFEASIBLE_COST:
+                    continue
+                taken.add(i)
+                target = targets[j]
+                assignments[buoys[i]['buoy_id']] = {
+                    "buoy_id": buoys[i]['buoy_id'],
+                    "target_id": target['target_id'],
+                    "priority": priority,
+                    "intercept_time_s": round(float(time_matrix[i, j]), 1),
+                    "intercept_x_m": round(float(point[i, j, 0]), 2),
+                    "intercept_y_m": round(float(point[i, j, 1]), 2),
+                    "heading_degrees": round(float(heading[i, j]), 1),
+                    "speed_mps": float(speeds[i])
+                }
+            free = [i for i in free if i not in taken]
+        return assignments
+
+    def _describe(self):
+        assigned_targets = {a['target_id'] for a in self._assignments.values()}
+        all_targets = [t['target_id'] for entry in self._targets.values() for t in entry["targets"]]
+        return {
+            "assignments": [dict(a) for a in self._assignments.values()],
+            "unassigned_targets": [t for t in all_targets if t not in assigned_targets],
+            "idle_buoys": [b for b in self._buoys if b not in self._assignments],
+            "solve_count": self.solve_count,
+            "last_solve_ms": self.last_solve_ms
+        }
@@ -0,0 +1,289 @@
+import argparse
+import multiprocessing
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Handle của một frame trong pool: chỉ handle được gửi giữa các process, không gửi pixel
+FrameHandle = namedtuple('FrameHandle', ['slot', 'generation', 'shape'])
+
+
+def _attach(name):
+    # Process con chỉ gắn vào vùng nhớ của process tạo pool, không được tự giải phóng khi thoát
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class FramePool:
+    """
+    Class pool frame trong shared memory dùng chung giữa process ingest và inference
+
+    Pool gồm số slot cố định, mỗi slot đủ chứa một frame kích thước tối đa
+    max_shape, nên bộ nhớ dùng cho frame không vượt quá slots * kích thước
+    slot dù có bao nhiêu camera. Process ingest ghi frame đã decode thẳng vào
+    slot (cv2.VideoCapture.read vào view của slot, không copy) rồi chỉ gửi
+    FrameHandle qua queue; process inference đọc frame qua view của slot.
+    Mỗi slot có reference count: slot được dùng lại khi mọi bên giữ handle
+    đã release. Handle mang generation của slot nên handle cũ (slot đã được
+    dùng lại) bị phát hiện thay vì đọc nhầm frame khác.
+
+    Pool được truyền cho process con qua multiprocessing.Process(args=...).
+    """
+
+    def __init__(self, slots=8, max_shape=(1080, 1920, 3), context=None):
+        """
+        Khởi tạo FramePool (process tạo pool là chủ vùng nhớ)
+
+        Args:
+            slots (int): Số frame tối đa cùng tồn tại
+            max_shape (tuple): Kích thước frame lớn nhất (height, width, channels)
+            context: multiprocessing context của các process dùng pool (mặc định context mặc định)
+        """
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self._owner = True
+        context = context or multiprocessing.get_context()
+        self._cond = context.Condition()
+        self._refs = context.RawArray('i', slots)         # Reference count từng slot
+        self._generation = context.RawArray('q', slots)   # Tăng mỗi lần slot được cấp lại
+        self._stats = context.RawArray('q', 2)            # Số frame đã cấp, số lần pool đầy
+
+    def __getstate__(self):
+        return {
+            "name": self._shm.name,
+            "slots": self.slots,
+            "max_shape": self.max_shape,
+            "cond": self._cond,
+            "refs": self._refs,
+            "generation": self._generation,
+            "stats": self._stats
+        }
+
+    def __setstate__(self, state):
+        self.slots = state['slots']
+        self.max_shape = state['max_shape']
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self._shm = _attach(state['name'])
+        self._owner = False
+        self._cond = state['cond']
+        self._refs = state['refs']
+        self._generation = state['generation']
+        self._stats = state['stats']
+
+    def allocate(self, shape, timeout=None):
+        """
+        Lấy một slot trống cho frame kích thước shape (reference count = 1)
+
+        Args:
+            shape (tuple): (height, width, channels) của frame
+            timeout (float): Thời gian chờ slot trống (giây), None = chờ mãi, 0 = không chờ
+
+        Returns:
+            tuple: (FrameHandle, np.array view của slot để ghi frame), None nếu hết slot
+                (camera nên bỏ frame này thay vì dùng thêm bộ nhớ)
+        """
+        shape = tuple(int(s) for s in shape)
+        if int(np.prod(shape)) > self.slot_bytes:
+            raise ValueError(f"Frame {shape} larger than pool slot {self.max_shape}")
+
+        with self._cond:
+            slot = self._free_slot()
+            if slot is None:
+                self._stats[1] += 1
+                if timeout == 0 or not self._cond.wait_for(lambda: self._free_slot() is not None, timeout):
+                    return None
+                slot = self._free_slot()
+            self._refs[slot] = 1
+            self._generation[slot] += 1
+            self._stats[0] += 1
+            handle = FrameHandle(slot, self._generation[slot], shape)
+        return handle, self._view(handle)
+
+    def put(self, frame, timeout=None):
+        """
+        Copy frame (ví dụ ảnh decode từ HTTP) vào một slot
+
+        Returns:
+            FrameHandle hoặc None nếu hết slot
+        """
+        allocated = self.allocate(frame.shape, timeout)
+        if allocated is None:
+            return None
+        handle, view = allocated
+        np.copyto(view, frame.reshape(handle.shape))
+        return handle
+
+    def view(self, handle):
+        """
+        Frame của handle (np.array trỏ thẳng vào shared memory, không copy)
+
+        Raises:
+            ValueError: Handle đã hết hạn (slot đã được release và cấp lại)
+        """
+        with self._cond:
+            self._check(handle)
+        return self._view(handle)
+
+    def retain(self, handle, count=1):
+        """
+        Tăng reference count trước khi gửi handle cho thêm count bên nhận
+        """
+        with self._cond:
+            self._check(handle)
+            self._refs[handle.slot] += count
+
+    def release(self, handle):
+        """
+        Giảm reference count, slot được dùng lại khi về 0
+        """
+        with self._cond:
+            self._check(handle)
+            self._refs[handle.slot] -= 1
+            if self._refs[handle.slot] == 0:
+                self._cond.notify_all()
+
+    def frame(self, handle):
+        """
+        Context manager đọc frame rồi release: with pool.frame(handle) as image: ...
+        """
+        return _FrameContext(self, handle)
+
+    def stats(self):
+        with self._cond:
+            in_use = sum(1 for refs in self._refs if refs > 0)
+            return {
+                "slots": self.slots,
+                "in_use": in_use,
+                "slot_mb": round(self.slot_bytes / 2 ** 20, 2),
+                "capacity_mb": round(self.slots * self.slot_bytes / 2 ** 20, 1),
+                "allocated": self._stats[0],
+                "exhausted": self._stats[1]
+            }
+
+    def close(self):
+        """
+        Đóng vùng nhớ (process tạo pool giải phóng luôn vùng nhớ)
+        """
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def _free_slot(self):
+        for slot in range(self.slots):
+            if self._refs[slot] == 0:
+                return slot
+        return None
+
+    def _check(self, handle):
+        if self._generation[handle.slot] != handle.generation or self._refs[handle.slot] <= 0:
+            raise ValueError(f"Stale frame handle for slot {handle.slot}")
+
+    def _view(self, handle):
+        return np.ndarray(handle.shape, dtype=np.uint8, buffer=self._shm.buf, offset=handle.slot * self.slot_bytes)
+
+
+class _FrameContext:
+    def __init__(self, pool, handle):
+        self.pool = pool
+        self.handle = handle
+
+    def __enter__(self):
+        return self.pool.view(self.handle)
+
+    def __exit__(self, *exc):
+        self.pool.release(self.handle)
+        return False
+
+
+def read_into_pool(capture, pool, shape, timeout=0, grabbed=False):
+    """
+    Đọc frame tiếp theo của cv2.VideoCapture thẳng vào một slot của pool
+
+    Args:
+        capture: cv2.VideoCapture đang mở
+        shape (tuple): (height, width, 3) của frame camera
+        timeout (float): Thời gian chờ slot trống (mặc định bỏ frame ngay nếu pool đầy)
+        grabbed (bool): Frame đã được grab(), chỉ cần decode (retrieve)
+
+    Returns:
+        tuple: (ok, FrameHandle hoặc None nếu hết slot)
+    """
+    allocated = pool.allocate(shape, timeout)
+    if allocated is None:
+        # Vẫn đọc frame để camera không bị tụt lại phía sau
+        return grabbed or capture.grab(), None
+    handle, view = allocated
+    ok, image = capture.retrieve(view) if grabbed else capture.read(view)
+    if not ok or image is None or image.shape != view.shape or image.ctypes.data != view.ctypes.data:
+        # Không đọc được hoặc OpenCV không ghi vào buffer của slot (kích thước khác)
+        if ok and image is not None and image.size == view.size:
+            np.copyto(view, image.reshape(view.shape))
+        else:
+            pool.release(handle)
+            return ok, None
+    return True, handle
+
+
+def _benchmark_consumer(queue, done, pool):
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        if pool is None:
+            checksum = int(item[0, 0, 0])
+        else:
+            with pool.frame(item) as image:
+                checksum = int(image[0, 0, 0])
+        done.put(checksum)
+
+
+def benchmark(frames=200, shape=(1080, 1920, 3), slots=8):
+    """
+    So sánh gửi frame qua multiprocessing.Queue (pickle) với gửi FrameHandle
+    """
+    frame = np.random.randint(0, 255, shape, dtype=np.uint8)
+    results = {}
+    for mode in ('pickle', 'shared_memory'):
+        pool = FramePool(slots, shape) if mode == 'shared_memory' else None
+        queue, done = multiprocessing.Queue(maxsize=slots), multiprocessing.Queue()
+        worker = multiprocessing.Process(target=_benchmark_consumer, args=(queue, done, pool), daemon=True)
+        worker.start()
+        start = time.perf_counter()
+        for _ in range(frames):
+            queue.put(frame if pool is None else pool.put(frame))
+        for _ in range(frames):
+            done.get()
+        elapsed = time.perf_counter() - start
+        queue.put(None)
+        worker.join()
+        results[mode] = {"fps": round(frames / elapsed, 1), "ms_per_frame": round(elapsed / frames * 1000, 2)}
+        if pool is not None:
+            results[mode]["pool"] = pool.stats()
+            pool.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark shared-memory frame transport against pickling")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--slots', type=int, default=8)
+    args = parser.parse_args()
+    for mode, result in benchmark(args.frames, (args.height, args.width, 3), args.slots).items():
+        print(f"{mode}: {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import contextlib
+import threading
+import time
+
+import cv2
+
+from tracing import current_trace_id, tracer
+
+# Màu khung theo class (BGR) - class 0 là drowning
+DROWNING_COLOR = (0, 0, 255)
+DEFAULT_COLOR = (0, 200, 0)
+
+
+class FrameRenderer:
+    """
+    Class để hiển thị frame đã detect lên Streamlit ở một luồng riêng
+
+    Vòng lặp detect chỉ gửi frame mới nhất vào renderer rồi tiếp tục ngay,
+    renderer tự vẽ khung bằng cv2, giới hạn FPS hiển thị, thu nhỏ ảnh và
+    encode JPEG trước khi đẩy lên trình duyệt. Frame cũ chưa kịp hiển thị
+    sẽ bị bỏ qua nên client chậm không làm chậm detect và cảnh báo.
+    """
+
+    def __init__(self, st_frame, max_fps=10, max_width=720, jpeg_quality=70, caption='Detected Video'):
+        """
+        Khởi tạo FrameRenderer
+
+        Args:
+            st_frame: Streamlit placeholder (st.empty()) để hiển thị ảnh
+            max_fps (float): FPS hiển thị tối đa
+            max_width (int): Chiều rộng tối đa của ảnh gửi lên trình duyệt (pixel)
+            jpeg_quality (int): Chất lượng JPEG (0-100)
+            caption (str): Chú thích dưới ảnh
+        """
+        self.st_frame = st_frame
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.max_width = max_width
+        self.jpeg_quality = int(jpeg_quality)
+        self.caption = caption
+
+        self.rendered_frames = 0
+        self.dropped_frames = 0
+
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._pending = None
+        self._running = True
+        self._last_render = 0.0
+
+        self._thread = threading.Thread(target=self._render_loop, daemon=True)
+        try:
+            # Cho phép luồng phụ cập nhật placeholder của phiên Streamlit hiện tại
+            from streamlit.runtime.scriptrunner import add_script_run_ctx
+            add_script_run_ctx(self._thread)
+        except ImportError:
+            pass
+        self._thread.start()
+
+    def submit(self, image, boxes, classes, confidences, ids=None, names=None):
+        """
+        Gửi frame cần hiển thị (không chặn)
+
+        Args:
+            image (np.array): Frame BGR gốc
+            boxes (np.array): Bounding box [N, 4] dạng [x1, y1, x2, y2] theo pixel của image
+            classes (np.array): Class id của từng box
+            confidences (np.array): Confidence của từng box
+            ids (np.array): Tracker id của từng box (nếu có, None với box chưa thuộc track nào)
+            names (dict): Tên class theo id
+        """
+        with self._lock:
+            if self._pending is not None:
+                self.dropped_frames += 1
+            # Trace của frame (nếu được lấy mẫu) tiếp tục ở luồng hiển thị
+            self._pending = ((image, boxes, classes, confidences, ids, names), current_trace_id())
+        self._event.set()
+
+    def close(self, timeout=1.0):
+        """
+        Dừng luồng hiển thị
+        """
+        self._running = False
+        self._event.set()
+        self._thread.join(timeout)
+
+    def _render_loop(self):
+        while self._running:
+            self._event.wait()
+            if not self._running:
+                break
+
+            # Giới hạn FPS hiển thị, frame mới đến trong lúc chờ sẽ thay frame cũ
+            wait = self.min_interval - (time.time() - self._last_render)
+            if wait > 0:
+                time.sleep(wait)
+
+            with self._lock:
+                pending = self._pending
+                self._pending = None
+                self._event.clear()
+
+            if pending is None:
+                continue
+
+            frame, trace_id = pending
+            try:
+                with tracer.trace('render', trace_id=trace_id) if trace_id is not None else contextlib.nullcontext():
+                    with tracer.span('encode'):
+                        jpeg = self.encode(*frame)
+                    if jpeg is not None:
+                        with tracer.span('streamlit_image'):
+                            self.st_frame.image(jpeg, caption=self.caption, use_column_width=True)
+                        self.rendered_frames += 1
+            except Exception as e:
+                print(f"Error rendering frame: {e}")
+            self._last_render = time.time()
+
+    def encode(self, image, boxes, classes, confidences, ids=None, names=None):
+        """
+        Thu nhỏ frame, vẽ khung và encode JPEG
+
+        Returns:
+            bytes: Ảnh JPEG đã encode, None nếu encode lỗi
+        """
+        height, width = image.shape[:2]
+        scale = min(1.0, self.max_width / float(width))
+        if scale < 1.0:
+            image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            image = image.copy()
+
+        draw_boxes(image, boxes, classes, confidences, ids, names, scale)
+
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return None
+        return buffer.tobytes()
+
+
+def draw_boxes(image, boxes, classes, confidences, ids=None, names=None, scale=1.0):
+    """
+    Vẽ bounding box và nhãn trực tiếp lên ảnh bằng cv2
+
+    Args:
+        image (np.array): Ảnh BGR (bị sửa trực tiếp)
+        boxes (np.array): Bounding box [N, 4] dạng [x1, y1, x2, y2]
+        classes (np.array): Class id của từng box
+        confidences (np.array): Confidence của từng box
+        ids (np.array): Tracker id của từng box (nếu có, None với box chưa thuộc track nào)
+        names (dict): Tên class theo id
+        scale (float): Hệ số nhân tọa độ box với kích thước ảnh
+    """
+    if boxes is None:
+        return image
+
+    thickness = max(1, int(round(min(image.shape[:2]) / 300)))
+    for i in range(len(boxes)):
+        x1, y1, x2, y2 = (int(v * scale) for v in boxes[i])
+        class_id = int(classes[i])
+        color = DROWNING_COLOR if class_id == 0 else DEFAULT_COLOR
+
+        label = names.get(class_id, str(class_id)) if names else str(class_id)
+        if ids is not None and ids[i] is not None:
+            label = f"id:{int(ids[i])} {label}"
+        label = f"{label} {float(confidences[i]):.2f}"
+
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, thickness)
+        (text_w, text_h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        top = max(y1, text_h + baseline)
+        cv2.rectangle(image, (x1, top - text_h - baseline), (x1 + text_w, top), color, -1)
+        cv2.putText(image, label, (x1, top - baseline), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+
+    return image
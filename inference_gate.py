@@ -0,0 +1,65 @@
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Độ ưu tiên (số nhỏ chạy trước)
+PRIORITY_LIVE = 10        # Frame từ camera trực tiếp (/detect)
+PRIORITY_BACKGROUND = 100  # Job phân tích video
+
+
+class InferenceGate:
+    """
+    Class để sắp xếp thứ tự chạy inference trên model theo độ ưu tiên
+
+    Mỗi lần gọi model (một frame hoặc một batch) phải lấy slot qua gate.
+    Khi slot trống, request có độ ưu tiên cao nhất đang chờ được chạy trước,
+    cùng độ ưu tiên thì đến trước chạy trước. Job nền chỉ giữ slot trong
+    một batch nên frame trực tiếp chờ tối đa một batch.
+    """
+
+    def __init__(self, concurrency=1):
+        """
+        Khởi tạo InferenceGate
+
+        Args:
+            concurrency (int): Số lần inference được chạy đồng thời
+        """
+        self.concurrency = concurrency
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._active = 0
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_LIVE):
+        """
+        Chờ đến lượt chạy inference
+
+        Args:
+            priority (int): Độ ưu tiên (số nhỏ chạy trước)
+        """
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while self._active >= self.concurrency or self._waiting[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        """
+        Số request đang chạy và đang chờ
+        """
+        with self._cond:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiting),
+                "waiting_live": sum(1 for priority, _ in self._waiting if priority < PRIORITY_BACKGROUND)
+            }
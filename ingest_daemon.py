@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Daemon ingest nhiều camera RTSP/webcam không cần giao diện (không Streamlit)
+
+Mỗi camera trong file cấu hình có một process đọc riêng: mở stream với cấu
+hình độ trễ thấp, grab liên tục để bỏ frame cũ trong buffer, chỉ decode frame
+cần gửi (theo fps của camera) thẳng vào FramePool, tự kết nối lại với backoff
+khi mất kết nối hoặc stream bị treo. Process chính gom frame của các camera
+thành batch, detect một lần cho cả batch rồi cập nhật cảnh báo và detection log.
+
+Ví dụ:
+    python ingest_daemon.py --config cameras.json
+    python ingest_daemon.py --config cameras.json --batch 16 --fps 1
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import signal
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import settings
+from alert_monitor import AlertMonitor
+from detection_log import DetectionLog, safe_camera_id
+from frame_pool import FramePool, read_into_pool
+from frame_renderer import draw_boxes
+from model_registry import ModelRegistry
+from tracing import tracer
+from water_mask import WaterMaskStore
+
+# Cấu hình FFmpeg cho RTSP: TCP (không mất gói), không buffer, giải mã độ trễ thấp
+FFMPEG_CAPTURE_OPTIONS = 'rtsp_transport;tcp|fflags;nobuffer|flags;low_delay'
+
+# Chỉ số bộ đếm của mỗi camera trong mảng counters
+GRABBED, SENT, DROPPED, RECONNECTS = range(4)
+COUNTERS = ('grabbed', 'sent', 'dropped', 'reconnects')
+
+# Exit code của process đọc khi camera cấu hình sai (không chạy lại, EX_CONFIG)
+EXIT_MISCONFIGURED = 78
+
+
+def load_cameras(path):
+    """
+    Đọc danh sách camera từ file JSON
+
+    {"cameras": [{"id": "pool_1", "source": "rtsp://...", "fps": 2}, {"id": "webcam", "source": 0}]}
+
+    Returns:
+        list: [{"id", "source", "fps"}]
+    """
+    with open(path) as config_file:
+        config = json.load(config_file)
+    cameras = config['cameras'] if isinstance(config, dict) else config
+
+    seen = set()
+    for camera in cameras:
+        if not camera.get('id') or camera.get('source') in (None, ''):
+            raise ValueError(f"Camera {camera} needs an id and a source")
+        if camera['id'] in seen:
+            raise ValueError(f"Duplicate camera id '{camera['id']}'")
+        seen.add(camera['id'])
+        camera['fps'] = float(camera.get('fps', settings.INGEST_FPS))
+    if not cameras:
+        raise ValueError(f"No cameras in {path}")
+    return cameras
+
+
+def _is_webcam(source):
+    return isinstance(source, int) or str(source).isdigit()
+
+
+def open_capture(source, timeout=settings.INGEST_STALE_SECONDS):
+    """
+    Mở cv2.VideoCapture với cấu hình độ trễ thấp
+
+    Stream mạng dùng backend FFmpeg với timeout mở/đọc (grab không bị treo mãi
+    khi camera mất kết nối), buffer của capture giữ tối đa một frame.
+    """
+    if _is_webcam(source):
+        capture = cv2.VideoCapture(int(source))
+    else:
+        # FFmpeg đọc biến môi trường lúc mở stream (mỗi reader là một process riêng)
+        os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', FFMPEG_CAPTURE_OPTIONS)
+        params = []
+        for name in ('CAP_PROP_OPEN_TIMEOUT_MSEC', 'CAP_PROP_READ_TIMEOUT_MSEC'):
+            prop = getattr(cv2, name, None)  # OpenCV >= 4.5.2
+            if prop is not None:
+                params += [prop, int(timeout * 1000)]
+        try:
+            capture = cv2.VideoCapture(str(source), cv2.CAP_FFMPEG, params)
+        except (TypeError, cv2.error):
+            capture = cv2.VideoCapture(str(source))
+    capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return capture
+
+
+def _reader_main(camera, index, pool, frames, pending, counters, stop, options):
+    """
+    Process đọc một camera: grab liên tục, gửi FrameHandle khi tới lượt, tự kết nối lại
+    """
+    # Ctrl+C do process chính xử lý (đặt stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cv2.setNumThreads(1)
+    source = camera['source']
+    is_file = not _is_webcam(source) and os.path.isfile(str(source))
+    counter_base = index * len(COUNTERS)
+    backoff = options['reconnect_min']
+
+    def status(state, message=''):
+        frames.put(('status', index, state, message))
+
+    while not stop.is_set():
+        capture = open_capture(source, options['stale_seconds'])
+        if not capture.isOpened():
+            capture.release()
+            status('offline', f"cannot open stream, retry in {backoff:.0f}s")
+        else:
+            status('online')
+            # File video được phát theo fps gốc để giống một camera thật
+            file_interval = 1.0 / (capture.get(cv2.CAP_PROP_FPS) or 25.0) if is_file else 0.0
+            send_interval = 1.0 / camera['fps'] if camera['fps'] > 0 else 0.0
+            shape = None
+            failures = 0
+            last_frame = next_send = next_grab = time.monotonic()
+
+            while not stop.is_set():
+                if file_interval:
+                    time.sleep(max(0.0, next_grab - time.monotonic()))
+                    next_grab += file_interval
+                # grab() không decode: frame không cần gửi bị bỏ khỏi buffer với chi phí thấp
+                if not capture.grab():
+                    failures += 1
+                    if failures >= 3 or time.monotonic() - last_frame > options['stale_seconds']:
+                        status('offline', 'stream ended' if is_file else 'no frames, reconnecting')
+                        break
+                    continue
+                now = time.monotonic()
+                failures = 0
+                last_frame = now
+                backoff = options['reconnect_min']
+                counters[counter_base + GRABBED] += 1
+
+                # Chỉ gửi khi tới lượt và frame trước của camera đã được xử lý xong
+                if now < next_send or pending[index]:
+                    continue
+                if shape is None:
+                    ok, image = capture.retrieve()
+                    if not ok or image is None:
+                        continue
+                    shape = image.shape
+                    try:
+                        handle = pool.put(image, timeout=0)
+                    except ValueError:
+                        # Frame lớn hơn slot của pool: kết nối lại cũng không khác, dừng hẳn camera này
+                        status('misconfigured', f"frame {shape} larger than FRAME_POOL_MAX_SHAPE {pool.max_shape}")
+                        capture.release()
+                        raise SystemExit(EXIT_MISCONFIGURED)
+                else:
+                    ok, handle = read_into_pool(capture, pool, shape, grabbed=True)
+                if handle is None:
+                    counters[counter_base + DROPPED] += 1
+                    continue
+                pending[index] = 1
+                frames.put(('frame', index, handle, time.time()))
+                counters[counter_base + SENT] += 1
+                next_send = now + send_interval
+            capture.release()
+
+        if stop.is_set():
+            break
+        counters[counter_base + RECONNECTS] += 1
+        # Backoff lũy thừa kèm jitter để nhiều camera không kết nối lại cùng lúc
+        stop.wait(backoff * random.uniform(0.8, 1.2))
+        backoff = min(backoff * 2, options['reconnect_max'])
+
+
+class IngestDaemon:
+    """
+    Class chạy các process đọc camera và vòng inference theo batch
+
+    Các process đọc chỉ gửi FrameHandle qua queue, pixel nằm trong FramePool.
+    Mỗi camera có tối đa một frame đang chờ xử lý nên camera chậm hoặc inference
+    chậm không làm dồn frame cũ: reader tiếp tục grab và chỉ gửi frame mới nhất.
+    """
+
+    def __init__(self, cameras, model_path=settings.DROWNING_MODEL, confidence=0.4, imgsz=settings.MODEL_IMGSZ,
+                 batch_size=settings.INGEST_BATCH, batch_wait=settings.INGEST_BATCH_WAIT,
+                 reconnect_min=settings.INGEST_RECONNECT_MIN, reconnect_max=settings.INGEST_RECONNECT_MAX,
+                 stale_seconds=settings.INGEST_STALE_SECONDS, status_interval=settings.INGEST_STATUS_INTERVAL,
+                 models=None, detection_log=None, water_masks=None, alert_cooldown=30):
+        """
+        Khởi tạo IngestDaemon
+
+        Args:
+            cameras (list): [{"id", "source", "fps"}] từ load_cameras
+            model_path (str): Đường dẫn weights
+            confidence (float): Ngưỡng confidence
+            imgsz (int): Kích thước input của model
+            batch_size (int): Số frame tối đa mỗi batch
+            batch_wait (float): Thời gian chờ gom batch (giây)
+            reconnect_min (float): Backoff kết nối lại ban đầu (giây)
+            reconnect_max (float): Backoff kết nối lại tối đa (giây)
+            stale_seconds (float): Không có frame mới trong khoảng này thì kết nối lại (giây)
+            status_interval (float): Thời gian giữa hai dòng trạng thái (giây)
+            models (ModelRegistry): Registry model (mặc định load model_path)
+            detection_log (DetectionLog): Nơi ghi kết quả detect
+            water_masks (WaterMaskStore): Mask mặt nước theo camera
+            alert_cooldown (float): Thời gian chờ giữa các cảnh báo của một camera (giây)
+        """
+        self.cameras = cameras
+        self.model_path = str(model_path)
+        self.confidence = confidence
+        self.imgsz = imgsz
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.status_interval = status_interval
+        self.options = {
+            "reconnect_min": reconnect_min,
+            "reconnect_max": reconnect_max,
+            "stale_seconds": stale_seconds
+        }
+        self.models = models or ModelRegistry(self.model_path)
+        self.detection_log = detection_log or DetectionLog(settings.DETECTION_LOG_DIR,
+                                                           flush_interval=settings.DETECTION_LOG_FLUSH_SECONDS)
+        self.water_masks = water_masks
+        self.monitors = [AlertMonitor(window_seconds=10, min_frames=5, cooldown=alert_cooldown) for _ in cameras]
+        self.states = ['starting'] * len(cameras)
+
+        # spawn: process đọc không kế thừa model/CUDA/luồng của process chính
+        self._context = multiprocessing.get_context('spawn')
+        slots = max(settings.FRAME_POOL_SLOTS, len(cameras) + 1)
+        self.pool = FramePool(slots, settings.FRAME_POOL_MAX_SHAPE, self._context)
+        self._frames = self._context.Queue()
+        self._pending = self._context.RawArray('b', len(cameras))
+        self._counters = self._context.RawArray('q', len(cameras) * len(COUNTERS))
+        self._stop = self._context.Event()
+        self._readers = [None] * len(cameras)
+        self._alerts = queue.Queue(maxsize=16)
+        self._processed = 0
+
+    def start(self):
+        for index in range(len(self.cameras)):
+            self._start_reader(index)
+        threading.Thread(target=self._alert_loop, name='ingest-alerts', daemon=True).start()
+
+    def _start_reader(self, index):
+        camera = self.cameras[index]
+        self._pending[index] = 0
+        reader = self._context.Process(
+            target=_reader_main,
+            args=(camera, index, self.pool, self._frames, self._pending, self._counters, self._stop, self.options),
+            name=f"ingest-{camera['id']}",
+            daemon=True
+        )
+        reader.start()
+        self._readers[index] = reader
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """
+        Vòng inference: gom batch, detect, cập nhật cảnh báo tới khi stop()
+        """
+        self.start()
+        # Load model trong lúc các camera đang kết nối
+        self.models.get(self.model_path)
+        print(f"Ingest daemon running: {len(self.cameras)} cameras, batch {self.batch_size}, "
+              f"pool {self.pool.stats()['capacity_mb']} MB")
+        last_status = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                batch = self._next_batch()
+                if batch:
+                    self._process_batch(batch)
+                if time.monotonic() - last_status >= self.status_interval:
+                    self._supervise()
+                    print(self.status_line())
+                    last_status = time.monotonic()
+        finally:
+            self.shutdown()
+
+    def _next_batch(self):
+        # Chờ frame đầu tiên, sau đó gom thêm tối đa batch_wait giây
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            timeout = 0.5 if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                message = self._frames.get(timeout=timeout)
+            except queue.Empty:
+                if deadline is not None:
+                    break
+                self._supervise()
+                continue
+            if message[0] == 'status':
+                self._on_status(*message[1:])
+                continue
+            batch.append(message[1:])
+            if deadline is None:
+                deadline = time.monotonic() + self.batch_wait
+        return batch
+
+    def _process_batch(self, batch):
+        images, offsets = [], []
+        for index, handle, _ in batch:
+            image = self.pool.view(handle)
+            water_mask = self.water_masks.get(self.cameras[index]['id']) if self.water_masks else None
+            if water_mask is not None:
+                image, offset = water_mask.crop(image)
+            else:
+                offset = (0, 0)
+            images.append(image)
+            offsets.append(offset)
+
+        try:
+            with tracer.trace('ingest_batch', frames=len(batch)):
+                with self.models.acquire(self.model_path) as model, tracer.span('inference'):
+                    results = model.predict(images, imgsz=self.imgsz, conf=self.confidence, verbose=False)
+                for (index, handle, timestamp), offset, result in zip(batch, offsets, results):
+                    self._record(index, handle, timestamp, offset, result)
+        except Exception as ex:
+            print(f"Error detecting batch of {len(batch)} frames: {ex}")
+        finally:
+            for index, handle, _ in batch:
+                self.pool.release(handle)
+                self._pending[index] = 0
+        self._processed += len(batch)
+
+    def _record(self, index, handle, timestamp, offset, result):
+        camera_id = self.cameras[index]['id']
+        boxes = result.boxes
+        class_ids = np.empty(0)
+        scores = np.empty(0)
+        bboxes = np.empty((0, 4), dtype=np.float32)
+        if boxes is not None and len(boxes) > 0:
+            class_ids = boxes.cls.cpu().numpy()
+            scores = boxes.conf.cpu().numpy()
+            bboxes = boxes.xyxy.cpu().numpy().astype(np.float32)
+            bboxes += np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+            water_mask = self.water_masks.get(camera_id) if self.water_masks else None
+            if water_mask is not None:
+                on_water = water_mask.contains(bboxes, handle.shape)
+                class_ids, scores, bboxes = class_ids[on_water], scores[on_water], bboxes[on_water]
+
+        detected_classes = class_ids.tolist()
+        alert_triggered = self.monitors[index].update(detected_classes, timestamp)
+        self.detection_log.append(camera_id, timestamp, bboxes, detected_classes, scores.tolist())
+        if alert_triggered:
+            # Vẽ lên frame đầy đủ (không chỉ vùng mặt nước) trước khi release: sau đó slot có thể đã chứa frame khác
+            image = draw_boxes(self.pool.view(handle).copy(), bboxes, class_ids, scores, names=result.names)
+            try:
+                self._alerts.put_nowait((camera_id, image))
+            except queue.Full:
+                print(f"Alert queue full, alert of {camera_id} not sent")
+
+    def _alert_loop(self):
+        # Gửi cảnh báo tuần tự ngoài vòng inference (upload ảnh + Twilio mất vài giây)
+        from helper import send_message
+        directory = os.path.join('runs', 'alerts')
+        while True:
+            camera_id, image = self._alerts.get()
+            try:
+                # Ảnh riêng của daemon, không dùng chung runs/detect/predict với API/Streamlit
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"ingest-{safe_camera_id(camera_id)}.jpg")
+                cv2.imwrite(path, image)
+                send_message(path)
+                print(f"Drowning alert sent for {camera_id}!")
+            except Exception as ex:
+                print(f"Error sending alert for {camera_id}: {ex}")
+
+    def _on_status(self, index, state, message):
+        if state != self.states[index] or message:
+            print(f"Camera {self.cameras[index]['id']}: {state}{f' ({message})' if message else ''}")
+        self.states[index] = state
+
+    def _supervise(self):
+        # Process đọc bị chết (lỗi OpenCV/FFmpeg) thì chạy lại, trừ camera cấu hình sai
+        for index, reader in enumerate(self._readers):
+            if reader is not None and not reader.is_alive() and reader.exitcode == EXIT_MISCONFIGURED:
+                # Lý do đã được reader báo qua status, không chạy lại
+                self.states[index] = 'misconfigured'
+                self._readers[index] = None
+            elif reader is not None and not reader.is_alive() and not self._stop.is_set():
+                print(f"Camera {self.cameras[index]['id']}: reader exited ({reader.exitcode}), restarting")
+                self.states[index] = 'restarting'
+                self._start_reader(index)
+
+    def stats(self):
+        cameras = {}
+        for index, camera in enumerate(self.cameras):
+            base = index * len(COUNTERS)
+            cameras[camera['id']] = dict(zip(COUNTERS, self._counters[base:base + len(COUNTERS)]))
+            cameras[camera['id']]['state'] = self.states[index]
+        return {"processed": self._processed, "cameras": cameras, "pool": self.pool.stats()}
+
+    def status_line(self):
+        stats = self.stats()
+        cameras = ', '.join(f"{camera_id} {c['state']} {c['sent']}/{c['grabbed']}"
+                            + (f" r{c['reconnects']}" if c['reconnects'] else '')
+                            for camera_id, c in stats['cameras'].items())
+        return f"Ingest: {stats['processed']} frames detected, pool {stats['pool']['in_use']}/{stats['pool']['slots']} | {cameras}"
+
+    def shutdown(self):
+        self._stop.set()
+        for reader in self._readers:
+            if reader is not None:
+                reader.join(timeout=5)
+                if reader.is_alive():
+                    reader.terminate()
+                    reader.join()
+        print(self.status_line())
+        # Handle còn trong queue không cần release: pool bị đóng ngay sau đó
+        self.pool.close()
+        self.detection_log.flush()
+        print("Ingest daemon stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless multi-camera ingest and drowning detection')
+    parser.add_argument('--config', default=str(settings.INGEST_CONFIG_PATH), help='Camera list (JSON)')
+    parser.add_argument('--model', default=settings.DROWNING_MODEL, help='Path to model file (default: best.pt)')
+    parser.add_argument('--confidence', type=float, default=0.4, help='Confidence threshold (default: 0.4)')
+    parser.add_argument('--imgsz', type=int, default=settings.MODEL_IMGSZ, help='Model input size')
+    parser.add_argument('--batch', type=int, default=settings.INGEST_BATCH, help='Frames per inference batch')
+    parser.add_argument('--fps', type=float, default=None, help='Frames per second per camera (overrides config)')
+    args = parser.parse_args()
+
+    cameras = load_cameras(args.config)
+    if args.fps is not None:
+        for camera in cameras:
+            camera['fps'] = args.fps
+
+    daemon = IngestDaemon(cameras, args.model, args.confidence, args.imgsz, args.batch,
+                          water_masks=WaterMaskStore(settings.WATER_MASK_DIR))
+    signal.signal(signal.SIGINT, lambda *_: daemon.stop())
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    daemon.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import numpy as np
+
+
+def current_vector(current_direction, current_speed):
+    """
+    Vector dòng chảy (vx, vy) từ hướng (độ, 0 = Bắc/trục Y, 90 = Đông/trục X) và tốc độ (m/s)
+    """
+    direction = np.radians(current_direction)
+    return np.array([current_speed * np.sin(direction), current_speed * np.cos(direction)])
+
+
+def solve_intercept(buoy_positions, buoy_speeds, target_positions, target_velocities=None, current=(0.0, 0.0)):
+    """
+    Tính điểm gặp sớm nhất giữa các phao và các target đang di chuyển
+
+    Phao đi với tốc độ buoy_speeds so với mặt nước và bị dòng chảy đẩy theo,
+    target di chuyển với vận tốc target_velocities (mặc định trôi theo dòng
+    chảy). Điểm gặp sau thời gian t thỏa |D + W t| = s t với D = P_target - P_buoy,
+    W = V_target - current, giải phương trình bậc hai cho mọi cặp phao/target.
+
+    Args:
+        buoy_positions (np.array): [B, 2] vị trí phao (m)
+        buoy_speeds (np.array): [B] hoặc số, tốc độ phao so với nước (m/s)
+        target_positions (np.array): [T, 2] vị trí target (m)
+        target_velocities (np.array): [T, 2] hoặc [B, T, 2] vận tốc target (m/s), None = trôi theo dòng chảy
+        current (tuple): Vector dòng chảy (vx, vy) (m/s), hoặc [B, T, 2] dòng chảy trung bình trên
+            đường đi của từng phao (trường dòng chảy, xem current_field.py)
+
+    Returns:
+        dict: Mảng [B, T]:
+            - time: thời gian đến điểm gặp (giây, inf nếu không đuổi kịp)
+            - point: [B, T, 2] điểm gặp (m)
+            - heading_degrees: hướng phao cần giữ so với mặt nước (độ, 0 = trục Y)
+            - reachable: True nếu đuổi kịp
+    """
+    buoys = np.asarray(buoy_positions, dtype=np.float64).reshape(-1, 2)
+    targets = np.asarray(target_positions, dtype=np.float64).reshape(-1, 2)
+    pairs = (len(buoys), len(targets), 2)
+    current = np.broadcast_to(np.asarray(current, dtype=np.float64), pairs)
+    speeds = np.broadcast_to(np.asarray(buoy_speeds, dtype=np.float64), (len(buoys),))
+    if target_velocities is None:
+        velocities = current
+    else:
+        velocities = np.asarray(target_velocities, dtype=np.float64)
+        velocities = np.broadcast_to(velocities if velocities.ndim == 3 else velocities.reshape(-1, 2), pairs)
+
+    D = targets[None, :, :] - buoys[:, None, :]      # [B, T, 2]
+    W = velocities - current                          # [B, T, 2] vận tốc target so với nước
+    s = speeds[:, None]                               # [B, 1]
+
+    a = np.sum(W * W, axis=2) - s ** 2
+    b = 2 * np.sum(D * W, axis=2)
+    c = np.sum(D * D, axis=2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        disc = b ** 2 - 4 * a * c
+        sqrt_disc = np.sqrt(np.maximum(disc, 0.0))
+        t1 = (-b - sqrt_disc) / (2 * a)
+        t2 = (-b + sqrt_disc) / (2 * a)
+        # a = 0 (tốc độ phao bằng tốc độ target so với nước): phương trình bậc nhất
+        linear = np.where(b < 0, -c / b, np.inf)
+
+    t1 = np.where(t1 >= 0, t1, np.inf)
+    t2 = np.where(t2 >= 0, t2, np.inf)
+    time = np.where(np.abs(a) < 1e-9, linear, np.minimum(t1, t2))
+    time = np.where(disc < 0, np.inf, time)
+    time = np.where(c < 1e-12, 0.0, time)  # Phao đã ở vị trí target
+    reachable = np.isfinite(time)
+
+    safe_time = np.where(reachable, time, 0.0)
+    point = targets[None, :, :] + velocities * safe_time[:, :, None]
+
+    # Hướng phao so với nước: (D + W t) / (s t), t = 0 thì hướng thẳng tới target
+    through_water = D + W * safe_time[:, :, None]
+    heading = np.degrees(np.arctan2(through_water[..., 0], through_water[..., 1])) % 360
+
+    return {
+        "time": time,
+        "point": point,
+        "heading_degrees": heading,
+        "reachable": reachable
+    }
@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import settings
+
+
+class _ModelEntry:
+    """
+    Một model đã load cùng thông tin phiên bản
+    """
+
+    def __init__(self, model, model_path, version):
+        self.model = model
+        self.model_path = model_path
+        self.version = version
+        self.mtime = _get_mtime(model_path)
+        self.loaded_at = time.time()
+        self.in_flight = 0
+
+
+def _get_mtime(model_path):
+    try:
+        return os.stat(model_path).st_mtime
+    except OSError:
+        return None
+
+
+class ModelRegistry:
+    """
+    Class để load mỗi file weights một lần, giữ model sẵn sàng và cho phép
+    thay weights mới một cách nguyên tử (hot-swap)
+
+    File weights trên đĩa là nguồn dữ liệu chung giữa Streamlit app và API:
+    khi swap, file mới được os.replace() vào đúng đường dẫn, các registry ở
+    process khác sẽ thấy mtime thay đổi và tự load lại ở lần get() tiếp theo.
+    Request đang chạy giữ tham chiếu tới model cũ nên vẫn hoàn thành bình thường.
+    """
+
+    def __init__(self, default_path=settings.DROWNING_MODEL, loader=None):
+        """
+        Khởi tạo ModelRegistry
+
+        Args:
+            default_path (str): Đường dẫn weights mặc định
+            loader (callable): Hàm load model từ đường dẫn (mặc định helper.load_model)
+        """
+        self.default_path = str(default_path)
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._entries = {}
+        self._retired = []
+
+    def _load(self, model_path):
+        if self._loader is None:
+            from helper import load_model
+            self._loader = load_model
+        return self._loader(model_path)
+
+    def _load_lock(self, model_path):
+        with self._lock:
+            return self._load_locks.setdefault(model_path, threading.Lock())
+
+    def get(self, model_path=None):
+        """
+        Lấy model, load nếu chưa có hoặc nếu file weights đã bị thay
+
+        Args:
+            model_path (str): Đường dẫn weights (mặc định default_path)
+
+        Returns:
+            Model YOLO đang dùng cho đường dẫn này
+        """
+        return self._get_entry(model_path).model
+
+    def _get_entry(self, model_path=None):
+        model_path = str(model_path or self.default_path)
+        entry = self._entries.get(model_path)
+        if entry is not None and entry.mtime == _get_mtime(model_path):
+            return entry
+
+        # Chỉ một luồng load mỗi file, các luồng khác chờ rồi dùng kết quả
+        with self._load_lock(model_path):
+            entry = self._entries.get(model_path)
+            if entry is not None and entry.mtime == _get_mtime(model_path):
+                return entry
+            model = self._load(model_path)
+            return self._install(model_path, model)
+
+    def _install(self, model_path, model):
+        with self._lock:
+            old = self._entries.get(model_path)
+            entry = _ModelEntry(model, model_path, old.version + 1 if old else 1)
+            self._entries[model_path] = entry
+            if old is not None:
+                self._retired.append(old)
+            self._retired = [e for e in self._retired if e.in_flight > 0]
+        if old is not None:
+            print(f"Model swapped: {model_path} (version {entry.version})")
+        return entry
+
+    @contextmanager
+    def acquire(self, model_path=None):
+        """
+        Mượn model cho một request, model không bị giải phóng khi swap
+        cho đến khi request kết thúc
+
+        Args:
+            model_path (str): Đường dẫn weights (mặc định default_path)
+        """
+        entry = self._get_entry(model_path)
+        with self._lock:
+            entry.in_flight += 1
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.in_flight -= 1
+
+    def swap(self, model_path=None, new_weights_path=None):
+        """
+        Thay model bằng weights mới một cách nguyên tử
+
+        Weights mới được load trước, chỉ khi load thành công mới được
+        os.replace() vào model_path và thay vào registry.
+
+        Args:
+            model_path (str): Đường dẫn weights cần thay (mặc định default_path)
+            new_weights_path (str): File weights mới, None để load lại file hiện tại
+
+        Returns:
+            dict: Thông tin model sau khi swap
+        """
+        model_path = str(model_path or self.default_path)
+        with self._load_lock(model_path):
+            model = self._load(new_weights_path or model_path)
+            if new_weights_path and os.path.abspath(new_weights_path) != os.path.abspath(model_path):
+                os.replace(new_weights_path, model_path)
+            entry = self._install(model_path, model)
+        return self._describe(entry)
+
+    def set_default(self, model_path):
+        """
+        Đổi weights mặc định và load ngay
+        """
+        self.default_path = str(model_path)
+        return self.get()
+
+    def is_loaded(self, model_path=None):
+        return str(model_path or self.default_path) in self._entries
+
+    def info(self):
+        """
+        Thông tin các model đang giữ trong registry
+        """
+        with self._lock:
+            return {
+                "default_path": self.default_path,
+                "models": [self._describe(e) for e in self._entries.values()],
+                "retired_in_flight": sum(e.in_flight for e in self._retired)
+            }
+
+    def _describe(self, entry):
+        return {
+            "model_path": entry.model_path,
+            "version": entry.version,
+            "loaded_at": entry.loaded_at,
+            "mtime": entry.mtime,
+            "in_flight": entry.in_flight
+        }
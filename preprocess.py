@@ -0,0 +1,146 @@
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+
+class LetterboxParams:
+    """
+    Thông số letterbox cho một độ phân giải đầu vào
+    """
+
+    def __init__(self, image_shape, scale, new_size, pad, output_shape):
+        self.image_shape = image_shape    # (height, width) của frame gốc
+        self.scale = scale                # Hệ số resize
+        self.new_size = new_size          # (width, height) sau resize
+        self.pad = pad                    # (left, top) pixel pad
+        self.output_shape = output_shape  # (height, width) input của model
+
+
+class LetterboxPreprocessor:
+    """
+    Class để đưa frame camera về đúng kích thước input của model bằng một
+    lần resize + pad duy nhất
+
+    Kết quả có cùng kích thước với letterbox của ultralytics (cạnh dài bằng
+    imgsz, cạnh còn lại pad lên bội số của stride) nên ultralytics không
+    resample lại. Buffer đầu ra được cấp phát một lần cho mỗi stream và dùng
+    lại cho các frame sau, thông số scale/pad được cache theo độ phân giải.
+    Mỗi stream nên dùng một preprocessor riêng.
+    """
+
+    def __init__(self, imgsz=640, stride=32, pad_value=114, interpolation=cv2.INTER_LINEAR):
+        """
+        Khởi tạo LetterboxPreprocessor
+
+        Args:
+            imgsz (int): Kích thước input của model (cạnh dài)
+            stride (int): Stride của model, kích thước đầu ra là bội số của stride
+            pad_value (int): Giá trị pixel vùng pad
+            interpolation (int): Phương pháp resize của cv2
+        """
+        self.imgsz = imgsz
+        self.stride = stride
+        self.pad_value = pad_value
+        self.interpolation = interpolation
+        self._params = {}
+        self._buffer = None
+
+    def get_params(self, image_shape):
+        """
+        Lấy thông số letterbox (đã cache) cho độ phân giải của frame
+
+        Args:
+            image_shape (tuple): (height, width) của frame gốc
+
+        Returns:
+            LetterboxParams
+        """
+        image_shape = tuple(image_shape[:2])
+        params = self._params.get(image_shape)
+        if params is None:
+            height, width = image_shape
+            scale = min(self.imgsz / height, self.imgsz / width)
+            new_w, new_h = int(round(width * scale)), int(round(height * scale))
+
+            # Pad tối thiểu lên bội số của stride, chia đều hai bên như ultralytics
+            dw = (self.imgsz - new_w) % self.stride
+            dh = (self.imgsz - new_h) % self.stride
+            left, top = int(round(dw / 2 - 0.1)), int(round(dh / 2 - 0.1))
+
+            params = LetterboxParams(image_shape, scale, (new_w, new_h), (left, top), (new_h + dh, new_w + dw))
+            self._params[image_shape] = params
+        return params
+
+    def process(self, image):
+        """
+        Resize + pad frame vào buffer input của model
+
+        Args:
+            image (np.array): Frame BGR gốc
+
+        Returns:
+            tuple: (model_input, params). model_input là buffer dùng lại giữa
+            các frame, chỉ hợp lệ đến lần gọi process() tiếp theo.
+        """
+        params = self.get_params(image.shape)
+        out_h, out_w = params.output_shape
+        if (out_h, out_w) == tuple(image.shape[:2]):
+            return image, params
+
+        if self._buffer is None or self._buffer.shape[:2] != (out_h, out_w):
+            self._buffer = np.full((out_h, out_w, 3), self.pad_value, dtype=np.uint8)
+
+        # Resize thẳng vào vùng giữa của buffer, vùng pad giữ nguyên từ lần cấp phát
+        left, top = params.pad
+        new_w, new_h = params.new_size
+        roi = self._buffer[top:top + new_h, left:left + new_w]
+        cv2.resize(image, (new_w, new_h), dst=roi, interpolation=self.interpolation)
+        return self._buffer, params
+
+    @staticmethod
+    def map_boxes(boxes, params):
+        """
+        Chuyển bounding box từ tọa độ input model về pixel của frame gốc
+
+        Args:
+            boxes (np.array): [N, 4] dạng [x1, y1, x2, y2] theo input model
+            params (LetterboxParams): Thông số letterbox của frame
+
+        Returns:
+            np.array: [N, 4] theo pixel của frame gốc
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        left, top = params.pad
+        mapped = (boxes - np.array([left, top, left, top], dtype=np.float32)) / params.scale
+        height, width = params.image_shape
+        np.clip(mapped[:, 0::2], 0, width, out=mapped[:, 0::2])
+        np.clip(mapped[:, 1::2], 0, height, out=mapped[:, 1::2])
+        return mapped
+
+
+class PreprocessorPool:
+    """
+    Pool các LetterboxPreprocessor cho các luồng xử lý request song song,
+    mỗi luồng mượn một preprocessor (và buffer của nó) trong lúc xử lý.
+    Preprocessor được giữ riêng theo imgsz để đổi kích thước input khi chạy
+    (giảm chất lượng khi quá tải) không phải cấp phát lại buffer mỗi lần
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._free = {}  # imgsz -> preprocessor đang rảnh
+
+    @contextmanager
+    def acquire(self, imgsz=None):
+        imgsz = imgsz or self._kwargs.get('imgsz', 640)
+        with self._lock:
+            free = self._free.setdefault(imgsz, [])
+            preprocessor = free.pop() if free else LetterboxPreprocessor(**dict(self._kwargs, imgsz=imgsz))
+        try:
+            yield preprocessor
+        finally:
+            with self._lock:
+                self._free[imgsz].append(preprocessor)
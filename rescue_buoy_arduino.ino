@@ -12,6 +12,8 @@
 const char* ssid = "YOUR_WIFI_SSID";
 const char* password = "YOUR_WIFI_PASSWORD";
 const char* apiUrl = "http://YOUR_SERVER_IP:5000";
+const char* buoyId = "buoy-1";  // Id phao trong đội (phân công nhiều phao)
+const char* cameraId = "default";  // Camera có hệ tọa độ chứa vị trí phao (phao chỉ nhận target của camera này)
 
 // Pin definitions
 #define MOTOR_FORWARD_PIN 26
@@ -46,6 +48,42 @@ const int MIN_SPEED = 0;
 const int SERVO_MIN_ANGLE = 0;
 const int SERVO_MAX_ANGLE = 180;
 const float BATTERY_DRAIN_RATE = 0.1; // % per second
+const int SUBSCRIBE_TIMEOUT_S = 20; // Thời gian API giữ long-poll (giây)
+
+// Version lệnh cứu hộ đã nhận, API chỉ gửi target thay đổi sau version này
+long commandVersion = -1;
+// Epoch của version (đổi khi camera chuyển sang API instance khác qua camera_router)
+String commandEpoch = "";
+// Các target đang có hiệu lực (target_id -> lệnh cứu hộ), cập nhật theo updated/removed của mỗi delta
+DynamicJsonDocument targetTable(8192);
+
+// Nhiệm vụ chạy theo máy trạng thái trong loop() (không dùng delay): lệnh mới chỉ đổi hướng/tốc độ
+enum MissionState { MISSION_IDLE, MISSION_NAVIGATING, MISSION_RESCUING, MISSION_RETURNING };
+MissionState missionState = MISSION_IDLE;
+unsigned long phaseStartedAt = 0;
+String missionTarget = "";
+// Thời gian mô phỏng của từng giai đoạn (trong thực tế dùng GPS/IMU để biết đã tới nơi)
+const unsigned long NAVIGATE_MS = 5000;
+const unsigned long RESCUE_MS = 3000;
+const unsigned long RETURN_MS = 3000;
+// Thời gian long-poll khi đang làm nhiệm vụ, để loop() tiếp tục điều khiển phao giữa các lần nhận lệnh
+const int MISSION_SUBSCRIBE_TIMEOUT_S = 1;
+
+// Lệnh cứu hộ dạng nhị phân (Accept: application/octet-stream), khớp COMMAND trong compact_encoding.py
+struct __attribute__((packed)) RescueCommand {
+  uint8_t version;
+  uint8_t priority;    // 1 = CRITICAL ... 4 = LOW
+  uint8_t depthMode;   // Index trong DEPTH_MODES
+  uint8_t flags;       // bit0 emergency, bit1 intercept_feasible
+  float heading;
+  float speed;
+  float x;
+  float y;
+  float z;
+  float estimatedDuration;
+};
+const char* DEPTH_MODES[] = {"SURFACE_LEVEL", "FLOAT_HIGH", "DIVE_SHALLOW", "DIVE_DEEP"};
+const char* PRIORITY_LEVELS[] = {"CRITICAL", "HIGH", "MEDIUM", "LOW"};
 
 void setup() {
   Serial.begin(115200);
@@ -79,10 +117,13 @@ void loop() {
   
   // Chờ lệnh từ API hoặc cảm biến
   if (buoyStatus.isDeployed) {
-    // Có thể thêm logic để lắng nghe lệnh từ API
-    delay(1000);
+    // Long-poll: API trả về ngay khi có cảnh báo hoặc target thay đổi
+    waitForRescueCommands();
   }
   
+  // Chuyển giai đoạn nhiệm vụ khi hết thời gian của giai đoạn hiện tại
+  updateMission();
+  
   delay(100);
 }
 
@@ -200,6 +241,7 @@ bool getRescueCommands(float distance_m, float angle_x, float angle_y) {
   HTTPClient http;
   http.begin(String(apiUrl) + "/rescue_commands");
   http.addHeader("Content-Type", "application/json");
+  http.addHeader("Accept", "application/octet-stream");  // Lệnh dạng nhị phân 28 byte thay cho JSON
   
   // Tạo JSON payload
   String payload = "{\"distance_m\":" + String(distance_m) + 
@@ -210,21 +252,21 @@ bool getRescueCommands(float distance_m, float angle_x, float angle_y) {
   
   int httpResponseCode = http.POST(payload);
   
-  if (httpResponseCode > 0) {
-    String response = http.getString();
-    Serial.println("Response: " + response);
-    
-    // Parse JSON response
-    DynamicJsonDocument doc(2048);
-    DeserializationError error = deserializeJson(doc, response);
-    
-    if (!error && doc["success"]) {
+  if (httpResponseCode == 200) {
+    // Đọc thẳng vào struct, không cần buffer JSON
+    RescueCommand command;
+    WiFiClient* stream = http.getStreamPtr();
+    if (http.getSize() == sizeof(command) &&
+        stream->readBytes((uint8_t*)&command, sizeof(command)) == sizeof(command)) {
+      http.end();
       // Thực hiện lệnh cứu hộ
-      executeRescueCommands(doc["commands"]);
+      executeRescueCommand(command);
       return true;
     } else {
       Serial.println("Failed to parse response");
     }
+  } else if (httpResponseCode > 0) {
+    Serial.println("Error response: " + http.getString());
   } else {
     Serial.println("Error on HTTP request");
   }
@@ -233,98 +275,188 @@ bool getRescueCommands(float distance_m, float angle_x, float angle_y) {
   return false;
 }
 
-void executeRescueCommands(JsonObject commands) {
-  Serial.println("🚨 Executing rescue commands...");
+void reportBuoyStatus() {
+  // Báo vị trí/trạng thái để API phân công phao
+  HTTPClient http;
+  http.begin(String(apiUrl) + "/fleet/buoys?camera_id=" + String(cameraId));
+  http.addHeader("Content-Type", "application/json");
+  String payload = "{\"buoy_id\":\"" + String(buoyId) + "\"" +
+                   ",\"camera_id\":\"" + String(cameraId) + "\"" +
+                   ",\"x_m\":" + String(buoyStatus.currentX) +
+                   ",\"y_m\":" + String(buoyStatus.currentY) +
+                   ",\"battery\":" + String(buoyStatus.batteryLevel) +
+                   ",\"status\":\"" + buoyStatus.status + "\"}";
+  http.POST(payload);
+  http.end();
+}
+
+bool waitForRescueCommands() {
+  if (WiFi.status() != WL_CONNECTED) {
+    return false;
+  }
+  reportBuoyStatus();
   
-  // Lấy thông tin điều khiển
-  JsonObject targetCoords = commands["target_coordinates"];
-  JsonObject movement = commands["movement"];
-  JsonObject mission = commands["mission"];
+  HTTPClient http;
+  // camera_id: camera_router chuyển tới instance phụ trách camera, chỉ nhận target của camera đó
+  int timeoutS = missionState == MISSION_IDLE ? SUBSCRIBE_TIMEOUT_S : MISSION_SUBSCRIBE_TIMEOUT_S;
+  http.begin(String(apiUrl) + "/rescue_commands/subscribe?since=" + String(commandVersion) +
+             "&epoch=" + commandEpoch + "&camera_id=" + String(cameraId) +
+             "&timeout=" + String(timeoutS));
+  http.setTimeout((timeoutS + 10) * 1000);
+  
+  int httpResponseCode = http.GET();
+  bool executed = false;
+  
+  if (httpResponseCode == 200) {
+    DynamicJsonDocument doc(4096);
+    DeserializationError error = deserializeJson(doc, http.getStream());
+    
+    if (!error && doc["changed"]) {
+      commandVersion = doc["version"];
+      commandEpoch = doc["epoch"].as<String>();
+      
+      // Delta chỉ chứa target thay đổi: áp vào bảng target trước khi chọn,
+      // nếu không target không đổi bị quên và target đã xóa vẫn được chọn
+      if (doc["full"] || targetTable.isNull()) {
+        targetTable.to<JsonObject>();
+      }
+      JsonObject targets = targetTable.as<JsonObject>();
+      for (JsonPair kv : doc["updated"].as<JsonObject>()) {
+        // Key dạng String để được copy vào targetTable (doc bị giải phóng khi hàm kết thúc)
+        targets[String(kv.key().c_str())] = kv.value();
+      }
+      for (JsonVariant removed : doc["removed"].as<JsonArray>()) {
+        targets.remove(removed.as<const char*>());
+      }
+      if (targetTable.overflowed()) {
+        // Bảng đầy: lần sau nhận lại toàn bộ danh sách
+        Serial.println("Target table full, resyncing");
+        commandVersion = -1;
+      }
+      // Bộ nhớ của target bị xóa/ghi đè chỉ được thu hồi khi gom rác (làm mất hiệu lực các JsonObject cũ)
+      targetTable.garbageCollect();
+      targets = targetTable.as<JsonObject>();
+      
+      // Ưu tiên target API phân công cho phao này, nếu API chưa phân công
+      // phao nào thì chọn target có mức ưu tiên cao nhất (priority nhỏ nhất)
+      JsonObject best;
+      JsonObject mine;
+      bool anyAssigned = false;
+      int bestPriority = 100;
+      for (JsonPair kv : targets) {
+        JsonObject target = kv.value().as<JsonObject>();
+        JsonObject assignment = target["assignment"];
+        if (!assignment.isNull()) {
+          anyAssigned = true;
+          if (assignment["buoy_id"] == buoyId) {
+            mine = target;
+          }
+        }
+        int priority = target["priority"] | 100;
+        if (priority < bestPriority) {
+          bestPriority = priority;
+          best = target;
+        }
+      }
+      JsonObject selected = anyAssigned ? mine : best;
+      
+      if (!selected.isNull()) {
+        applyRescueTarget(selected);
+        executed = true;
+      } else if (missionState == MISSION_NAVIGATING) {
+        // Target không còn hoặc đã giao cho phao khác
+        Serial.println("Target " + missionTarget + " cancelled");
+        startReturn();
+      }
+    }
+  } else {
+    Serial.println("Error on subscribe request");
+    delay(1000);
+  }
   
-  float targetX = targetCoords["x"];
-  float targetY = targetCoords["y"];
-  float targetZ = targetCoords["z"];
-  float heading = movement["heading"];
-  float speed = movement["speed"];
-  String depthMode = movement["depth_mode"].as<String>();
-  String priority = mission["priority"].as<String>();
+  http.end();
+  return executed;
+}
+
+void executeRescueCommand(const RescueCommand& command) {
+  String depthMode = DEPTH_MODES[command.depthMode < 4 ? command.depthMode : 0];
+  String priority = PRIORITY_LEVELS[command.priority >= 1 && command.priority <= 4 ? command.priority - 1 : 3];
   
-  Serial.println("Target: X=" + String(targetX) + "m, Y=" + String(targetY) + "m, Z=" + String(targetZ) + "m");
-  Serial.println("Heading: " + String(heading) + "°, Speed: " + String(speed) + " m/s");
+  Serial.println("Target: X=" + String(command.x) + "m, Y=" + String(command.y) + "m, Z=" + String(command.z) + "m");
   Serial.println("Priority: " + priority);
   
-  // Thực hiện điều khiển
-  navigateToTarget(heading, speed, depthMode);
-  
-  // Thực hiện cứu hộ
-  performRescue();
-  
-  // Trở về
-  returnToBase();
-  
-  Serial.println("✅ Rescue mission completed!");
+  applyCommands("manual", command.heading, command.speed, depthMode);
 }
 
-void navigateToTarget(float heading, float speed, String depthMode) {
-  Serial.println("🧭 Navigating to target...");
+void applyRescueTarget(JsonObject target) {
+  // Như _apply_commands của rescue_buoy_example.py: hướng/tốc độ tới điểm gặp do API tính
+  // cho phao này nếu được phân công, nếu không thì hướng/tốc độ chung của lệnh cứu hộ
+  JsonObject movement = target["commands"]["movement"];
+  JsonObject assignment = target["assignment"];
+  float heading = assignment.isNull() ? movement["heading"].as<float>() : assignment["heading_degrees"].as<float>();
+  float speed = assignment.isNull() ? movement["speed"].as<float>() : assignment["speed_mps"].as<float>();
+  applyCommands(target["target_id"].as<String>(), heading, speed, movement["depth_mode"].as<String>());
+}
+
+void applyCommands(String targetId, float heading, float speed, String depthMode) {
+  // Đang cứu/đưa người về: không nhận target khác cho tới khi về trạm
+  if (missionState == MISSION_RESCUING || missionState == MISSION_RETURNING) {
+    return;
+  }
   
-  // Set heading
-  setHeading(heading);
+  if (missionState == MISSION_IDLE || targetId != missionTarget) {
+    Serial.println("🚨 Target " + targetId + " (version " + String(commandVersion) + ")");
+    missionTarget = targetId;
+    missionState = MISSION_NAVIGATING;
+    phaseStartedAt = millis();
+  }
   
-  // Set speed
+  // Cùng target: chỉ cập nhật hướng/tốc độ theo vị trí mới, giai đoạn tiếp tục chạy
+  setHeading(heading);
   setMotorSpeed(speed * 50); // Convert m/s to PWM (0-255)
-  
-  // Set depth
   setDepthMode(depthMode);
-  
-  // Simulate movement time (trong thực tế sẽ dùng GPS/IMU)
-  delay(5000);
-  
-  // Stop
-  setMotorSpeed(0);
-  
-  Serial.println("Reached target");
 }
 
-void performRescue() {
+void updateMission() {
+  unsigned long elapsed = millis() - phaseStartedAt;
+  
+  if (missionState == MISSION_NAVIGATING && elapsed >= NAVIGATE_MS) {
+    setMotorSpeed(0);
+    Serial.println("Reached target");
+    startRescue();
+  } else if (missionState == MISSION_RESCUING && elapsed >= RESCUE_MS) {
+    digitalWrite(LED_RED_PIN, LOW);
+    noTone(BUZZER_PIN);
+    Serial.println("Rescue operation completed");
+    startReturn();
+  } else if (missionState == MISSION_RETURNING && elapsed >= RETURN_MS) {
+    setMotorSpeed(0);
+    digitalWrite(LED_GREEN_PIN, LOW);
+    missionState = MISSION_IDLE;
+    missionTarget = "";
+    Serial.println("✅ Rescue mission completed!");
+  }
+}
+
+void startRescue() {
   Serial.println("🛟 Performing rescue operation...");
+  missionState = MISSION_RESCUING;
+  phaseStartedAt = millis();
   
-  // Bật LED đỏ để báo hiệu cứu hộ
+  // Bật LED đỏ và phát âm thanh báo hiệu cứu hộ
   digitalWrite(LED_RED_PIN, HIGH);
-  
-  // Phát âm thanh cảnh báo
   tone(BUZZER_PIN, 2000, 2000);
-  
-  // Simulate rescue time
-  delay(3000);
-  
-  // Tắt LED và buzzer
-  digitalWrite(LED_RED_PIN, LOW);
-  noTone(BUZZER_PIN);
-  
-  Serial.println("Rescue operation completed");
 }
 
-void returnToBase() {
+void startReturn() {
   Serial.println("🏠 Returning to base...");
+  missionState = MISSION_RETURNING;
+  phaseStartedAt = millis();
   
-  // Bật LED xanh
+  // Bật LED xanh, về gốc (0°) với tốc độ trung bình
   digitalWrite(LED_GREEN_PIN, HIGH);
-  
-  // Set heading về gốc (0°)
   setHeading(0);
-  
-  // Set speed trung bình
   setMotorSpeed(100);
-  
-  // Simulate return time
-  delay(3000);
-  
-  // Stop và tắt LED
-  setMotorSpeed(0);
-  digitalWrite(LED_GREEN_PIN, LOW);
-  
-  Serial.println("Returned to base");
 }
 
 // Control Functions
@@ -388,8 +520,14 @@ void updateBattery() {
 }
 
 void updateStatus() {
-  // Update status based on current state
-  if (buoyStatus.currentSpeed > 0) {
+  // Update status based on current state (RESCUING/RETURNING: API không giao target khác)
+  if (missionState == MISSION_RESCUING) {
+    buoyStatus.status = "RESCUING";
+  } else if (missionState == MISSION_RETURNING) {
+    buoyStatus.status = "RETURNING";
+  } else if (missionState == MISSION_NAVIGATING) {
+    buoyStatus.status = "ON_MISSION";
+  } else if (buoyStatus.currentSpeed > 0) {
     buoyStatus.status = "MOVING";
   } else if (buoyStatus.isDeployed) {
     buoyStatus.status = "DEPLOYED";
@@ -8,18 +8,24 @@ import requests
 import time
 import json
 import math
+import sys
 
 class RescueBuoy:
     """
     Class điều khiển phao cứu hộ tự động
     """
     
-    def __init__(self, api_url="http://localhost:5000"):
+    def __init__(self, api_url="http://localhost:5000", buoy_id="buoy-1", camera_id="default"):
         self.api_url = api_url
+        self.buoy_id = buoy_id
+        self.camera_id = camera_id  # Camera có hệ tọa độ chứa vị trí phao
         self.current_position = {"x": 0, "y": 0, "z": 0}  # Vị trí hiện tại của phao
         self.is_deployed = False
         self.battery_level = 100.0
         self.status = "IDLE"
+        self.command_version = -1  # Version lệnh cứu hộ đã nhận từ API
+        self.command_epoch = None  # Epoch của version (đổi khi camera chuyển sang API instance khác)
+        self.targets = {}  # target_id -> lệnh cứu hộ đang có hiệu lực
         
     def get_rescue_coordinates(self, distance_info, environment_data=None):
         """
@@ -75,6 +81,122 @@ class RescueBuoy:
             print(f"Error connecting to API: {e}")
             return None
     
+    def wait_for_commands(self, timeout=25):
+        """
+        Chờ lệnh cứu hộ mới từ API (long-poll)
+        
+        API giữ request đến khi có cảnh báo hoặc target thay đổi, chỉ trả về
+        các target thay đổi kể từ version phao đã nhận.
+        
+        Returns:
+            bool: True nếu danh sách target thay đổi
+        """
+        # camera_id: camera_router chuyển tới instance phụ trách camera, chỉ nhận target của camera đó
+        params = {"since": self.command_version, "epoch": self.command_epoch,
+                  "camera_id": self.camera_id, "timeout": timeout}
+        try:
+            response = requests.get(f"{self.api_url}/rescue_commands/subscribe",
+                                    params=params, timeout=timeout + 10)
+            if response.status_code != 200:
+                print(f"Error subscribing to rescue commands: {response.text}")
+                time.sleep(1)
+                return False
+            
+            update = response.json()
+            if not update.get('changed'):
+                return False
+            
+            if update['full']:
+                self.targets = {}
+            self.targets.update(update['updated'])
+            for target_id in update['removed']:
+                self.targets.pop(target_id, None)
+            self.command_version = update['version']
+            self.command_epoch = update.get('epoch')
+            return True
+        except Exception as e:
+            print(f"Error connecting to API: {e}")
+            time.sleep(1)
+            return False
+    
+    def report_status(self, max_speed=4.0):
+        """
+        Báo vị trí và trạng thái phao cho API để phân công nhiều phao
+        
+        Returns:
+            dict: Phân công hiện tại của phao (None nếu không có)
+        """
+        payload = {
+            "buoy_id": self.buoy_id,
+            "camera_id": self.camera_id,
+            "x_m": self.current_position['x'],
+            "y_m": self.current_position['y'],
+            "speed_mps": max_speed,
+            "battery": self.battery_level,
+            "status": self.status
+        }
+        try:
+            response = requests.post(f"{self.api_url}/fleet/buoys", params={"camera_id": self.camera_id},
+                                     json=payload, timeout=5)
+            if response.status_code == 200:
+                return response.json().get('assignment')
+            print(f"Error reporting status: {response.text}")
+        except Exception as e:
+            print(f"Error connecting to API: {e}")
+        return None
+    
+    def _select_target(self):
+        """
+        Chọn target của phao: target được phân công cho phao này, nếu API chưa
+        phân công phao nào thì lấy target ưu tiên cao nhất
+        """
+        if not self.targets:
+            return None
+        
+        assigned = [t for t in self.targets.values() if t.get('assignment')]
+        if assigned:
+            mine = [t for t in assigned if t['assignment']['buoy_id'] == self.buoy_id]
+            return mine[0] if mine else None
+        return min(self.targets.values(), key=lambda t: t['priority'])
+    
+    def listen_for_missions(self):
+        """
+        Nhận lệnh cứu hộ theo kiểu push và điều khiển phao theo target ưu tiên nhất
+        """
+        print("📡 Waiting for rescue commands...")
+        while True:
+            # Báo trạng thái trước mỗi lần chờ để API biết phao còn hoạt động
+            self.report_status()
+            if not self.wait_for_commands():
+                continue
+            
+            target = self._select_target()
+            if target is None:
+                print("No rescue target for this buoy")
+                continue
+            
+            # Cập nhật hướng/tốc độ theo vị trí mới của target
+            print(f"🚨 Target {target['target_id']} (version {self.command_version})")
+            self._apply_commands(target['commands'], target.get('assignment'))
+    
+    def _apply_commands(self, commands, assignment=None):
+        """
+        Điều chỉnh hướng, tốc độ và độ sâu theo lệnh mới nhất
+        
+        Args:
+            commands (dict): Lệnh cứu hộ của target
+            assignment (dict): Phân công từ API, có hướng tới điểm gặp tính từ vị trí phao này
+        """
+        movement = commands['movement']
+        self.status = "ON_MISSION"
+        if assignment:
+            self._set_heading(assignment['heading_degrees'])
+            self._set_speed(assignment['speed_mps'])
+        else:
+            self._set_heading(movement['heading'])
+            self._set_speed(movement['speed'])
+        self._set_depth_mode(movement['depth_mode'])
+    
     def execute_rescue_mission(self, rescue_target):
         """
         Thực hiện nhiệm vụ cứu hộ
@@ -279,6 +401,10 @@ def main():
             target = rescue_data['rescue_targets'][0]
             buoy.execute_rescue_mission(target)
     
+    # Nhận lệnh cứu hộ mới ngay khi API phát cảnh báo
+    if '--listen' in sys.argv:
+        buoy.listen_for_missions()
+    
     # Hiển thị trạng thái cuối
     print("\n📊 Final Status:")
     status = buoy.get_status()
@@ -1,6 +1,9 @@
 import math
 import numpy as np
 
+from intercept_solver import current_vector, solve_intercept
+from current_field import solve_intercept_in_field
+
 class RescueCoordinates:
     """
     Class để tính toán tọa độ chính xác cho phao cứu hộ
@@ -33,6 +36,21 @@ class RescueCoordinates:
         Returns:
             dict: Tọa độ và thông tin điều khiển phao
         """
+        x_distance, y_distance, z_distance = self.position_from_angles(
+            distance_m, angle_x_degrees, angle_y_degrees, water_level
+        )
+        
+        return self.calculate_rescue_from_position(
+            x_distance, y_distance, z_distance, current_direction, current_speed, distance_m
+        )
+    
+    def position_from_angles(self, distance_m, angle_x_degrees, angle_y_degrees, water_level=0.0):
+        """
+        Đổi khoảng cách và góc lệch so với camera sang tọa độ 3D
+        
+        Returns:
+            tuple: (x, y, z) theo mét
+        """
         # Chuyển góc sang radian
         angle_x = math.radians(angle_x_degrees)
         angle_y = math.radians(angle_y_degrees)
@@ -47,30 +65,75 @@ class RescueCoordinates:
         # Z: độ cao so với mặt nước
         z_distance = distance_m * math.sin(angle_y) - self.camera_height + water_level
         
-        # Tính toán ảnh hưởng của dòng chảy
-        current_rad = math.radians(current_direction)
-        current_x = current_speed * math.sin(current_rad)
-        current_y = current_speed * math.cos(current_rad)
+        return x_distance, y_distance, z_distance
+    
+    def calculate_rescue_from_position(self, x_distance, y_distance, z_distance,
+                                       current_direction=0.0, current_speed=0.0, distance_m=None,
+                                       velocity=None, buoy_position=(0.0, 0.0), buoy_speed=None,
+                                       current_field=None):
+        """
+        Tính toán tọa độ và thông tin điều khiển phao từ vị trí 3D (ví dụ vị trí đã lọc của target)
+        
+        Phao được hướng tới điểm gặp sớm nhất với người gặp nạn theo tốc độ phao,
+        vận tốc của người và dòng chảy, không phải vị trí lúc detect.
+        
+        Args:
+            x_distance, y_distance, z_distance (float): Vị trí người gặp nạn (m)
+            current_direction (float): Hướng dòng chảy (độ, 0 = Bắc, 90 = Đông)
+            current_speed (float): Tốc độ dòng chảy (m/s)
+            distance_m (float): Khoảng cách từ camera (mặc định tính từ x, y)
+            velocity (tuple): Vận tốc (vx, vy) của người (m/s), None = trôi theo dòng chảy
+            buoy_position (tuple): Vị trí xuất phát của phao (m)
+            buoy_speed (float): Tốc độ phao (m/s), mặc định theo mức độ khẩn cấp
+            current_field (CurrentField): Trường dòng chảy, nếu có sẽ thay cho current_direction/current_speed
+            
+        Returns:
+            dict: Tọa độ và thông tin điều khiển phao
+        """
+        if distance_m is None:
+            distance_m = math.hypot(x_distance, y_distance)
+        
+        # Phân loại mức độ khẩn cấp và chọn tốc độ phao
+        urgency_level = self._calculate_urgency_level(distance_m, z_distance)
+        speed = self._calculate_optimal_speed(distance_m, urgency_level) if buoy_speed is None else buoy_speed
         
-        # Điều chỉnh tọa độ do dòng chảy (ước tính thời gian phao đến)
-        estimated_time = distance_m / 2.0  # Ước tính thời gian phao di chuyển (m/s)
-        drift_x = current_x * estimated_time
-        drift_y = current_y * estimated_time
+        # Điểm gặp sớm nhất có tính tốc độ phao, chuyển động của người và dòng chảy
+        if current_field is not None:
+            # Dòng chảy thay đổi theo vị trí: tính theo đường đi của phao và đường trôi của người
+            intercept = solve_intercept_in_field(
+                [buoy_position], speed, [(x_distance, y_distance)], current_field,
+                None if velocity is None else [velocity]
+            )
+            current_x, current_y = current_field.sample([x_distance, y_distance])
+            current_speed = round(float(math.hypot(current_x, current_y)), 2)
+            current_direction = round(math.degrees(math.atan2(current_x, current_y)) % 360, 1)
+        else:
+            intercept = solve_intercept(
+                [buoy_position], speed, [(x_distance, y_distance)],
+                None if velocity is None else [velocity], current_vector(current_direction, current_speed)
+            )
+        feasible = bool(intercept['reachable'][0, 0])
+        if feasible:
+            estimated_time = float(intercept['time'][0, 0])
+            final_x, final_y = (float(v) for v in intercept['point'][0, 0])
+            heading = float(intercept['heading_degrees'][0, 0])
+        else:
+            # Không đuổi kịp (dòng chảy/người nhanh hơn phao): đi thẳng tới vị trí hiện tại
+            final_x, final_y = x_distance, y_distance
+            estimated_time = math.hypot(final_x - buoy_position[0], final_y - buoy_position[1]) / speed
+            heading = math.degrees(math.atan2(final_x - buoy_position[0], final_y - buoy_position[1])) % 360
         
-        # Tọa độ cuối cùng cho phao
-        final_x = x_distance + drift_x
-        final_y = y_distance + drift_y
+        # Độ trôi của người trong thời gian phao di chuyển
+        drift_x = final_x - x_distance
+        drift_y = final_y - y_distance
         
-        # Tính góc điều khiển phao
-        target_angle = math.degrees(math.atan2(final_x, final_y))
+        # Hướng tới điểm gặp (theo mặt đất)
+        target_angle = math.degrees(math.atan2(final_x - buoy_position[0], final_y - buoy_position[1]))
         if target_angle < 0:
             target_angle += 360
         
         # Tính khoảng cách thực tế cần di chuyển
-        actual_distance = math.sqrt(final_x**2 + final_y**2)
-        
-        # Phân loại mức độ khẩn cấp
-        urgency_level = self._calculate_urgency_level(distance_m, z_distance)
+        actual_distance = math.hypot(final_x - buoy_position[0], final_y - buoy_position[1])
         
         # Thông tin điều khiển phao
         rescue_info = {
@@ -83,14 +146,16 @@ class RescueCoordinates:
             "control": {
                 "target_angle_degrees": round(target_angle, 1),
                 "target_angle_radians": round(math.radians(target_angle), 3),
-                "speed_mps": self._calculate_optimal_speed(actual_distance, urgency_level),
-                "estimated_time_seconds": round(actual_distance / 2.0, 1)
+                "speed_mps": speed,
+                "estimated_time_seconds": round(estimated_time, 1),
+                "intercept_feasible": feasible
             },
             "environment": {
                 "current_drift_x": round(drift_x, 2),
                 "current_drift_y": round(drift_y, 2),
                 "current_speed": current_speed,
-                "current_direction": current_direction
+                "current_direction": current_direction,
+                "current_field": current_field is not None
             },
             "urgency": {
                 "level": urgency_level,
@@ -98,7 +163,8 @@ class RescueCoordinates:
                 "description": self._get_urgency_description(urgency_level)
             },
             "navigation": {
-                "heading_degrees": round(target_angle, 1),
+                # Hướng phao giữ so với mặt nước, đã bù dòng chảy
+                "heading_degrees": round(heading, 1),
                 "distance_to_target": round(actual_distance, 2),
                 "depth_adjustment": self._calculate_depth_adjustment(z_distance)
             }
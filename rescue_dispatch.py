@@ -0,0 +1,143 @@
+import threading
+import uuid
+from collections import deque
+
+
+class RescueDispatcher:
+    """
+    Class phát lệnh cứu hộ tới phao theo kiểu push
+
+    Mỗi lần có cảnh báo hoặc target thay đổi, lệnh mới được publish và
+    version tăng lên. Phao giữ version đã nhận và chờ (long-poll hoặc SSE)
+    cho đến khi có version mới, server chỉ gửi các target thay đổi hoặc bị
+    xóa kể từ version đó. Version chỉ có nghĩa trong một process (epoch):
+    phao chuyển sang instance khác (camera_router) nhận lại toàn bộ danh sách.
+    """
+
+    def __init__(self, history_size=1024):
+        """
+        Khởi tạo RescueDispatcher
+
+        Args:
+            history_size (int): Số thay đổi gần nhất được giữ để tính delta,
+                client cũ hơn sẽ nhận toàn bộ danh sách target
+        """
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self._cond = threading.Condition()
+        self._targets = {}
+        self._changes = deque(maxlen=history_size)
+
+    def publish(self, scope, targets):
+        """
+        Cập nhật danh sách target của một nguồn (camera), chỉ ghi nhận thay đổi
+
+        Args:
+            scope (str): Nguồn của target (ví dụ camera_id), target cũ cùng
+                nguồn không còn trong danh sách mới sẽ bị xóa
+            targets (dict): target_id -> lệnh cứu hộ
+
+        Returns:
+            int: Version sau khi publish
+        """
+        with self._cond:
+            changes = []
+            for target_id, payload in targets.items():
+                if self._targets.get(target_id) != payload:
+                    changes.append((target_id, payload))
+
+            for target_id, payload in list(self._targets.items()):
+                if payload.get('scope') == scope and target_id not in targets:
+                    changes.append((target_id, None))
+
+            if not changes:
+                return self.version
+
+            self.version += 1
+            for target_id, payload in changes:
+                if payload is None:
+                    self._targets.pop(target_id, None)
+                else:
+                    self._targets[target_id] = payload
+                self._changes.append((self.version, target_id))
+            self._cond.notify_all()
+            return self.version
+
+    def snapshot(self):
+        """
+        Toàn bộ target hiện tại
+        """
+        with self._cond:
+            return self._full()
+
+    def updates_since(self, since):
+        """
+        Các thay đổi kể từ version since
+
+        Returns:
+            dict: version, full (True nếu là toàn bộ danh sách), updated, removed
+        """
+        with self._cond:
+            return self._delta(since)
+
+    def wait_for_update(self, since, timeout=25.0, epoch=None, scope=None):
+        """
+        Chờ đến khi có version mới hơn since (long-poll)
+
+        Args:
+            since (int): Version client đã nhận
+            timeout (float): Thời gian chờ tối đa (giây)
+            epoch (str): Epoch của version since, khác epoch hiện tại thì trả về toàn bộ ngay
+            scope (str): Chỉ gửi target của nguồn này (camera_id), None = mọi nguồn
+
+        Returns:
+            dict: Delta như updates_since, hoặc None nếu hết thời gian chờ
+        """
+        with self._cond:
+            if epoch is not None and epoch != self.epoch:
+                return self._filter(self._full(), scope)
+            if not self._cond.wait_for(lambda: self.version != since, timeout):
+                return None
+            return self._filter(self._delta(since), scope)
+
+    def _filter(self, update, scope):
+        if scope is not None:
+            # Target bị xóa không còn scope, phao bỏ qua id không có trong danh sách của nó
+            update["updated"] = {target_id: payload for target_id, payload in update["updated"].items()
+                                 if payload.get('scope') == scope}
+        return update
+
+    def _full(self):
+        return {
+            "version": self.version,
+            "epoch": self.epoch,
+            "full": True,
+            "updated": dict(self._targets),
+            "removed": []
+        }
+
+    def _delta(self, since):
+        oldest = self._changes[0][0] if self._changes else self.version + 1
+        if since > self.version or since < oldest - 1:
+            # Client không cùng lịch sử (server khởi động lại) hoặc quá cũ
+            return self._full()
+
+        updated, removed = {}, []
+        for version, target_id in self._changes:
+            if version <= since:
+                continue
+            if target_id in self._targets:
+                updated[target_id] = self._targets[target_id]
+            elif target_id not in removed:
+                removed.append(target_id)
+        for target_id in updated:
+            if target_id in removed:
+                removed.remove(target_id)
+
+        return {
+            "version": self.version,
+            "epoch": self.epoch,
+            "full": False,
+            "updated": updated,
+            "removed": removed
+        }
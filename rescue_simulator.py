@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Mô phỏng sự kiện rời rạc cho nhiệm vụ cứu hộ bằng phao
+
+Chạy hàng nghìn nhiệm vụ (nhiều phao, người trôi theo dòng chảy, hao pin)
+với đồng hồ ảo, dùng đúng code lập kế hoạch của API (RescueCoordinates +
+FleetAssigner), để so sánh các chiến lược lập kế hoạch mà không phải chờ
+thời gian thực như rescue_buoy_example.py.
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import math
+import time
+
+import numpy as np
+
+from current_field import CurrentField
+from fleet_assignment import FleetAssigner
+from intercept_solver import current_vector
+from rescue_coordinates import RescueCoordinates
+
+# Chiến lược lập kế hoạch
+STRATEGIES = ('intercept', 'direct')
+
+# Tên mức ưu tiên (priority = index + 1)
+PRIORITY_LEVELS = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+
+# Trạng thái phao trong mô phỏng
+IDLE = 'IDLE'
+ON_MISSION = 'ON_MISSION'
+RESCUING = 'RESCUING'
+RETURNING = 'RETURNING'
+CHARGING = 'CHARGING'
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p90": round(float(np.percentile(values, 90)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2)
+    }
+
+
+class RescueSimulator:
+    """
+    Class mô phỏng nhiệm vụ cứu hộ theo sự kiện rời rạc
+
+    Mỗi nhiệm vụ là một hàng đợi sự kiện (người xuất hiện, detect định kỳ,
+    phao tới điểm hẹn, cứu xong, về trạm, sạc xong) theo đồng hồ ảo. Ở mỗi
+    lần lập kế hoạch, vị trí và vận tốc quan sát (có nhiễu) của người được
+    đưa qua RescueCoordinates và FleetAssigner như trong API; phao giữ hướng
+    được giao so với mặt nước và bị dòng chảy thật đẩy đi, nên sai số của
+    kế hoạch thể hiện thành lần tới trượt và thời gian cứu dài hơn.
+    """
+
+    def __init__(self, buoys=3, strategy='intercept', current_direction=90.0, current_speed=0.3,
+                 current_field=None, area=((-40.0, 40.0), (10.0, 60.0)), base=(0.0, 0.0),
+                 buoy_speed=4.0, return_speed=2.0, swim_speed=0.3, capture_radius=2.0,
+                 rescue_duration=5.0, detect_interval=2.0, position_noise=0.5, velocity_noise=0.1,
+                 battery=(40.0, 100.0), battery_per_meter=0.05, battery_per_second=0.01,
+                 min_battery=20.0, charge_time=600.0, max_mission_time=900.0, seed=0):
+        """
+        Khởi tạo RescueSimulator
+
+        Args:
+            buoys (int): Số phao
+            strategy (str): 'intercept' (tới điểm gặp, bù dòng chảy) hoặc 'direct' (đi thẳng tới vị trí quan sát)
+            current_direction (float): Hướng dòng chảy (độ, 0 = Bắc, 90 = Đông)
+            current_speed (float): Tốc độ dòng chảy (m/s)
+            current_field (CurrentField): Trường dòng chảy, nếu có sẽ thay cho current_direction/current_speed
+            area (tuple): ((x_min, x_max), (y_min, y_max)) khu vực người gặp nạn xuất hiện (m)
+            base (tuple): Vị trí trạm phao (m)
+            buoy_speed (float): Tốc độ phao báo cho FleetAssigner (m/s)
+            return_speed (float): Tốc độ phao khi đưa người về trạm (m/s)
+            swim_speed (float): Tốc độ tự bơi tối đa của người (m/s)
+            capture_radius (float): Phao cách người dưới khoảng này thì cứu được (m)
+            rescue_duration (float): Thời gian cứu tại chỗ (giây)
+            detect_interval (float): Chu kỳ detect và lập lại kế hoạch (giây, 0 = chỉ khi có sự kiện)
+            position_noise (float): Độ lệch vị trí quan sát (m)
+            velocity_noise (float): Độ lệch vận tốc quan sát (m/s)
+            battery (tuple): Khoảng pin ban đầu của phao (%)
+            battery_per_meter (float): Pin tiêu hao theo quãng đường (%/m)
+            battery_per_second (float): Pin tiêu hao theo thời gian hoạt động (%/giây)
+            min_battery (float): Dưới mức pin này phao về sạc
+            charge_time (float): Thời gian sạc đầy (giây)
+            max_mission_time (float): Người chưa được cứu sau thời gian này tính là thất bại (giây)
+            seed (int): Seed ngẫu nhiên
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}', expected one of {STRATEGIES}")
+        self.buoy_count = buoys
+        self.strategy = strategy
+        self.current_direction = current_direction
+        self.current_speed = current_speed
+        self.current_field = current_field
+        self.current = current_vector(current_direction, current_speed)
+        self.area = np.asarray(area, dtype=np.float64)
+        self.base = np.asarray(base, dtype=np.float64)
+        self.buoy_speed = buoy_speed
+        self.return_speed = return_speed
+        self.swim_speed = swim_speed
+        self.capture_radius = capture_radius
+        self.rescue_duration = rescue_duration
+        self.detect_interval = detect_interval
+        self.position_noise = position_noise
+        self.velocity_noise = velocity_noise
+        self.battery = battery
+        self.battery_per_meter = battery_per_meter
+        self.battery_per_second = battery_per_second
+        self.min_battery = min_battery
+        self.charge_time = charge_time
+        self.max_mission_time = max_mission_time
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)  # Nhiễu quan sát
+
+        self.planner = RescueCoordinates()
+
+    def run(self, missions=1000, victims=(1, 4), arrival_window=60.0):
+        """
+        Chạy nhiều nhiệm vụ và tổng hợp kết quả
+
+        Args:
+            missions (int): Số nhiệm vụ
+            victims (tuple): Khoảng số người gặp nạn mỗi nhiệm vụ (min, max)
+            arrival_window (float): Người xuất hiện ngẫu nhiên trong khoảng thời gian này (giây)
+
+        Returns:
+            dict: Phân bố thời gian cứu, tỉ lệ cứu được, thời gian tính toán của planner
+        """
+        self._reset_stats()
+        wall_start = time.perf_counter()
+        for mission in range(missions):
+            # Kịch bản chỉ phụ thuộc seed và số thứ tự nhiệm vụ: mọi chiến lược gặp cùng kịch bản
+            self._run_mission(self._scenario(np.random.default_rng([self.seed, mission]), victims, arrival_window))
+        wall_time = time.perf_counter() - wall_start
+
+        total = self.stats['victims']
+        return {
+            "strategy": self.strategy,
+            "missions": missions,
+            "buoys": self.buoy_count,
+            "victims": total,
+            "rescued": len(self.stats['rescue_times']),
+            "rescue_rate": round(len(self.stats['rescue_times']) / total, 4) if total else None,
+            "time_to_rescue_s": _percentiles(self.stats['rescue_times']),
+            "time_to_rescue_by_priority_s": {
+                PRIORITY_LEVELS[priority - 1]: _percentiles(times)
+                for priority, times in sorted(self.stats['rescue_by_priority'].items())
+            },
+            "missed_arrivals": self.stats['misses'],
+            "low_battery_returns": self.stats['charges'],
+            "replans": len(self.stats['planner_ms']),
+            "planner_ms": _percentiles(self.stats['planner_ms']),
+            "fleet_solve_ms": _percentiles(self.stats['fleet_ms']),
+            "simulated_time_s": round(self.stats['simulated_time'], 1),
+            "wall_time_s": round(wall_time, 3)
+        }
+
+    def _reset_stats(self):
+        self.stats = {
+            "victims": 0,
+            "rescue_times": [],
+            "rescue_by_priority": {},  # mức ưu tiên khi được cứu -> thời gian cứu
+            "misses": 0,
+            "charges": 0,
+            "planner_ms": [],
+            "fleet_ms": [],
+            "simulated_time": 0.0
+        }
+
+    def _scenario(self, rng, victims, arrival_window):
+        count = int(rng.integers(victims[0], victims[1] + 1))
+        swim = rng.normal(0.0, 1.0, (count, 2))
+        swim *= (rng.uniform(0.0, self.swim_speed, count) / np.maximum(np.linalg.norm(swim, axis=1), 1e-9))[:, None]
+        return {
+            "appear_times": np.sort(rng.uniform(0.0, arrival_window, count)),
+            "positions": np.stack([rng.uniform(*self.area[0], count), rng.uniform(*self.area[1], count)], axis=1),
+            "depths": rng.uniform(-3.0, 0.0, count),
+            "swim": swim,
+            "battery": rng.uniform(*self.battery, self.buoy_count)
+        }
+
+    def _run_mission(self, scenario):
+        self.now = 0.0
+        self._events = []
+        self._seq = itertools.count()
+        self.fleet = FleetAssigner(min_battery=self.min_battery, buoy_timeout=math.inf)
+        if self.current_field is not None and self.strategy == 'intercept':
+            self.fleet.set_current_field(self.current_field)
+
+        self.buoys = {}
+        for i in range(self.buoy_count):
+            self.buoys[f"buoy-{i}"] = {
+                "buoy_id": f"buoy-{i}",
+                "status": IDLE,
+                "battery": float(scenario['battery'][i]),
+                "leg": self._leg(self.base, np.zeros(2), math.inf),
+                "target_id": None,
+                "generation": 0
+            }
+
+        self.victims = {}
+        for i, appear_time in enumerate(scenario['appear_times']):
+            self._push(appear_time, 'appear', {
+                "victim_id": f"victim-{i}",
+                "p0": scenario['positions'][i],
+                "z": float(scenario['depths'][i]),
+                "swim": scenario['swim'][i]
+            })
+        self._remaining = len(scenario['appear_times'])
+        self.stats['victims'] += self._remaining
+
+        # Hết người cần cứu hoặc quá max_mission_time thì kết thúc nhiệm vụ
+        while self._events and self._remaining:
+            event_time, _, kind, data = heapq.heappop(self._events)
+            if event_time > self.max_mission_time:
+                break
+            self.now = event_time
+            getattr(self, f"_on_{kind}")(*data)
+        self.stats['simulated_time'] += self.now
+
+    def _push(self, event_time, kind, *data):
+        heapq.heappush(self._events, (event_time, next(self._seq), kind, data))
+
+    # Chuyển động
+
+    def _current_at(self, position):
+        if self.current_field is not None:
+            return self.current_field.sample(position)
+        return self.current
+
+    def _victim_position(self, victim, t):
+        # Người trôi theo dòng chảy và tự bơi với vận tốc không đổi
+        dt = t - victim['t0']
+        if self.current_field is not None:
+            drifted = self.current_field.integrate_drift(victim['p0'], dt, steps=max(1, int(dt // 5) + 1))
+        else:
+            drifted = victim['p0'] + self.current * dt
+        position = drifted + victim['swim'] * dt
+        # Gốc mới để lần tích phân sau ngắn
+        victim['p0'], victim['t0'] = position, t
+        return position
+
+    def _victim_velocity(self, victim, position):
+        return self._current_at(position) + victim['swim']
+
+    def _leg(self, start, velocity, end_time):
+        return {"start": np.asarray(start, dtype=np.float64), "velocity": np.asarray(velocity, dtype=np.float64),
+                "t0": self.now, "t1": end_time}
+
+    def _buoy_position(self, buoy, t=None):
+        leg = buoy['leg']
+        t = self.now if t is None else t
+        return leg['start'] + leg['velocity'] * (min(t, leg['t1']) - leg['t0'])
+
+    def _end_leg(self, buoy, active=True):
+        # Trừ pin cho đoạn đường vừa đi, phao dừng tại vị trí hiện tại
+        leg = buoy['leg']
+        position = self._buoy_position(buoy)
+        duration = min(self.now, leg['t1']) - leg['t0']
+        if active:
+            distance = float(np.linalg.norm(position - leg['start']))
+            buoy['battery'] = max(0.0, buoy['battery'] - distance * self.battery_per_meter
+                                  - duration * self.battery_per_second)
+        buoy['leg'] = self._leg(position, np.zeros(2), math.inf)
+        return position
+
+    # Sự kiện
+
+    def _on_appear(self, victim):
+        self.victims[victim['victim_id']] = dict(victim, appear_time=self.now, t0=self.now,
+                                                 rescued_at=None, in_rescue=False, priority=4)
+        self._replan()
+        if self.detect_interval > 0 and not any(kind == 'detect' for _, _, kind, _ in self._events):
+            self._push(self.now + self.detect_interval, 'detect')
+
+    def _on_detect(self):
+        if any(not v['in_rescue'] for v in self.victims.values()):
+            self._replan()
+            self._push(self.now + self.detect_interval, 'detect')
+
+    def _on_arrive(self, buoy_id, generation):
+        buoy = self.buoys[buoy_id]
+        if buoy['generation'] != generation:
+            return  # Kế hoạch đã thay đổi trước khi phao tới
+        position = self._end_leg(buoy)
+        victim = self.victims.get(buoy['target_id'])
+        if victim is not None and not victim['in_rescue'] and \
+                np.linalg.norm(self._victim_position(victim, self.now) - position) <= self.capture_radius:
+            victim['in_rescue'] = True
+            buoy['status'] = RESCUING
+            self._push(self.now + self.rescue_duration, 'rescued', buoy_id, victim['victim_id'])
+        else:
+            self.stats['misses'] += 1
+            buoy['status'] = IDLE
+            buoy['target_id'] = None
+        self._replan()
+
+    def _on_rescued(self, buoy_id, victim_id):
+        victim = self.victims[victim_id]
+        victim['rescued_at'] = self.now
+        self._remaining -= 1
+        self.stats['rescue_times'].append(self.now - victim['appear_time'])
+        self.stats['rescue_by_priority'].setdefault(victim['priority'], []).append(self.now - victim['appear_time'])
+
+        # Đưa người về trạm
+        buoy = self.buoys[buoy_id]
+        buoy['battery'] = max(0.0, buoy['battery'] - self.rescue_duration * self.battery_per_second)
+        position = self._buoy_position(buoy)
+        offset = self.base - position
+        duration = float(np.linalg.norm(offset)) / self.return_speed
+        buoy['status'] = RETURNING
+        buoy['target_id'] = None
+        buoy['generation'] += 1
+        buoy['leg'] = self._leg(position, offset / duration if duration > 0 else np.zeros(2), self.now + duration)
+        self._push(self.now + duration, 'home', buoy_id)
+
+    def _on_home(self, buoy_id):
+        buoy = self.buoys[buoy_id]
+        self._end_leg(buoy)
+        if buoy['battery'] < self.min_battery:
+            self.stats['charges'] += 1
+            buoy['status'] = CHARGING
+            self._push(self.now + self.charge_time, 'charged', buoy_id)
+        else:
+            buoy['status'] = IDLE
+        self._replan()
+
+    def _on_charged(self, buoy_id):
+        self.buoys[buoy_id]['battery'] = 100.0
+        self.buoys[buoy_id]['status'] = IDLE
+        self._replan()
+
+    # Lập kế hoạch
+
+    def _observe(self, victim):
+        position = self._victim_position(victim, self.now)
+        observed = position + self.rng.normal(0.0, self.position_noise, 2)
+        velocity = self._victim_velocity(victim, position) + self.rng.normal(0.0, self.velocity_noise, 2)
+        return observed, velocity
+
+    def _replan(self):
+        active = [v for v in self.victims.values() if not v['in_rescue']]
+
+        # Planner như API: mức độ khẩn cấp và tốc độ phao cho từng người
+        start = time.perf_counter()
+        targets = []
+        for victim in active:
+            observed, velocity = self._observe(victim)
+            if self.strategy == 'direct':
+                # Đi thẳng tới vị trí quan sát, không tính chuyển động của người và dòng chảy
+                rescue_info = self.planner.calculate_rescue_from_position(
+                    observed[0], observed[1], victim['z'], velocity=(0.0, 0.0))
+                velocity = (0.0, 0.0)
+            else:
+                rescue_info = self.planner.calculate_rescue_from_position(
+                    observed[0], observed[1], victim['z'], self.current_direction, self.current_speed,
+                    velocity=tuple(velocity), current_field=self.current_field)
+            victim['priority'] = rescue_info['urgency']['priority']
+            targets.append({
+                "target_id": victim['victim_id'],
+                "x_m": float(observed[0]),
+                "y_m": float(observed[1]),
+                "velocity": tuple(float(v) for v in velocity),
+                "priority": rescue_info['urgency']['priority']
+            })
+        planner_ms = (time.perf_counter() - start) * 1000
+
+        # Phân công phao
+        start = time.perf_counter()
+        for buoy in self.buoys.values():
+            position = self._buoy_position(buoy)
+            self.fleet.update_buoy(buoy['buoy_id'], position[0], position[1], speed=self.buoy_speed,
+                                   battery=buoy['battery'], status=buoy['status'], timestamp=self.now,
+                                   scope='sim')
+        planned_current = (0.0, 0.0) if self.strategy == 'direct' else self.current
+        self.fleet.set_targets('sim', targets, planned_current)
+        plan = self.fleet.solve(self.now)
+        self.stats['fleet_ms'].append((time.perf_counter() - start) * 1000)
+        self.stats['planner_ms'].append(planner_ms)
+
+        assigned = {a['buoy_id']: a for a in plan['assignments']}
+        for buoy in self.buoys.values():
+            if buoy['status'] not in (IDLE, ON_MISSION):
+                continue
+            assignment = assigned.get(buoy['buoy_id'])
+            if assignment is None:
+                if buoy['status'] == ON_MISSION:
+                    self._end_leg(buoy)
+                    buoy['status'] = IDLE
+                    buoy['target_id'] = None
+                    buoy['generation'] += 1
+                continue
+            self._dispatch(buoy, assignment)
+
+    def _dispatch(self, buoy, assignment):
+        # Phao giữ hướng được giao so với mặt nước, dòng chảy thật đẩy phao đi
+        position = self._end_leg(buoy, active=buoy['status'] == ON_MISSION)
+        heading = math.radians(assignment['heading_degrees'])
+        through_water = assignment['speed_mps'] * np.array([math.sin(heading), math.cos(heading)])
+        duration = assignment['intercept_time_s']
+        if self.current_field is not None:
+            planned = np.array([assignment['intercept_x_m'], assignment['intercept_y_m']])
+            current = self.current_field.mean_along_path(position, planned)
+        else:
+            current = self.current
+
+        buoy['status'] = ON_MISSION
+        buoy['target_id'] = assignment['target_id']
+        buoy['generation'] += 1
+        buoy['leg'] = self._leg(position, through_water + current, self.now + duration)
+        self._push(self.now + duration, 'arrive', buoy['buoy_id'], buoy['generation'])
+
+
+def check_priority_order():
+    """
+    Kiểm tra nhanh FleetAssigner khi thiếu phao: một phao, người CRITICAL ở 20 m
+    và người LOW ở 60 m, phao phải được giao cho người CRITICAL dù tới người LOW
+    cũng chỉ mất 15 giây
+
+    Returns:
+        bool: True nếu đúng
+    """
+    fleet = FleetAssigner()
+    fleet.update_buoy('buoy-0', 0.0, 0.0, speed=4.0, scope='check')
+    fleet.set_targets('check', [
+        {"target_id": "critical", "x_m": 20.0, "y_m": 0.0, "velocity": (0.0, 0.0), "priority": 1},
+        {"target_id": "low", "x_m": -60.0, "y_m": 0.0, "velocity": (0.0, 0.0), "priority": 4}
+    ])
+    plan = fleet.solve()
+    assigned = [a['target_id'] for a in plan['assignments']]
+    passed = assigned == ['critical']
+    print(f"Scarce-buoy check: buoy assigned to {assigned or 'nothing'}, unassigned {plan['unassigned_targets']} "
+          f"-> {'OK' if passed else 'FAILED (urgent victim left without a buoy)'}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Discrete-event rescue mission simulator')
+    parser.add_argument('--missions', type=int, default=1000, help='Number of simulated missions (default: 1000)')
+    parser.add_argument('--buoys', type=int, default=3, help='Number of buoys (default: 3)')
+    parser.add_argument('--victims', type=int, nargs=2, default=(1, 4), metavar=('MIN', 'MAX'),
+                        help='Victims per mission (default: 1 4)')
+    parser.add_argument('--strategy', nargs='+', choices=STRATEGIES, default=list(STRATEGIES),
+                        help='Planning strategies to compare (default: all)')
+    parser.add_argument('--current-direction', type=float, default=90.0, help='Current direction in degrees (default: 90)')
+    parser.add_argument('--current-speed', type=float, default=0.3, help='Current speed in m/s (default: 0.3)')
+    parser.add_argument('--current-field', default=None, help='Gridded current field file (.json/.npz)')
+    parser.add_argument('--detect-interval', type=float, default=2.0, help='Re-detection interval in seconds (default: 2)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+    parser.add_argument('--check', action='store_true',
+                        help='Only check that urgent victims get a buoy first when buoys are scarce')
+
+    args = parser.parse_args()
+    if args.check:
+        raise SystemExit(0 if check_priority_order() else 1)
+
+    field = CurrentField.from_file(args.current_field) if args.current_field else None
+    reports = []
+    for strategy in args.strategy:
+        # Cùng seed cho mọi chiến lược để so sánh trên cùng các kịch bản
+        simulator = RescueSimulator(buoys=args.buoys, strategy=strategy, current_direction=args.current_direction,
+                                    current_speed=args.current_speed, current_field=field,
+                                    detect_interval=args.detect_interval, seed=args.seed)
+        reports.append(simulator.run(args.missions, tuple(args.victims)))
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    for report in reports:
+        rescue = report['time_to_rescue_s'] or {}
+        print(f"[{report['strategy']}] {report['rescued']}/{report['victims']} rescued "
+              f"({report['rescue_rate']:.1%}), missed arrivals: {report['missed_arrivals']}, "
+              f"low-battery returns: {report['low_battery_returns']}")
+        print(f"  time to rescue (s): mean {rescue.get('mean')}, p50 {rescue.get('p50')}, "
+              f"p90 {rescue.get('p90')}, p99 {rescue.get('p99')}, max {rescue.get('max')}")
+        for level, times in report['time_to_rescue_by_priority_s'].items():
+            print(f"    {level}: mean {times['mean']}, p90 {times['p90']}")
+        print(f"  planner: {report['planner_ms']['mean']} ms mean / {report['planner_ms']['p99']} ms p99, "
+              f"fleet solve: {report['fleet_solve_ms']['mean']} ms mean / {report['fleet_solve_ms']['p99']} ms p99 "
+              f"over {report['replans']} replans")
+        print(f"  simulated {report['simulated_time_s']} s in {report['wall_time_s']} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import threading
+import time
+
+# Mức rủi ro của camera (số nhỏ được ưu tiên inference trước)
+RISK_ALERT = 0      # Đang trong thời gian cảnh báo
+RISK_ELEVATED = 1   # Vừa detect được class drowning
+RISK_QUIET = 2      # Không có dấu hiệu đuối nước gần đây
+
+RISK_LEVEL_NAMES = {RISK_ALERT: 'ALERT', RISK_ELEVATED: 'ELEVATED', RISK_QUIET: 'QUIET'}
+
+# Chất lượng JPEG gợi ý cho camera theo mức rủi ro (thang ESP32: 0-63, số nhỏ = chất lượng cao)
+JPEG_QUALITY = {RISK_ALERT: 10, RISK_ELEVATED: 12, RISK_QUIET: 15}
+
+
+class RiskScheduler:
+    """
+    Class chấm điểm rủi ro từng camera để ưu tiên inference
+
+    Mỗi frame có class drowning đẩy điểm rủi ro của camera lên bằng confidence
+    cao nhất của class đó, điểm giảm một nửa sau mỗi half_life giây. Camera
+    đang trong thời gian cảnh báo có điểm tối đa. Điểm quyết định độ ưu tiên
+    và tốc độ frame được nhận của camera (AdmissionController policy): camera
+    yên tĩnh chỉ được min_rate frame/giây (gấp đôi nếu có người trong khung
+    hình), camera có dấu hiệu đuối nước được tới max_rate và được chạy trước.
+    Cùng tốc độ đó được gợi ý lại cho camera (capture_advice) để camera tự
+    chụp thưa hơn thay vì gửi frame rồi bị từ chối; riêng camera yên tĩnh
+    được gợi ý chụp không nhanh hơn quiet_capture_rate để tiết kiệm pin/băng
+    thông như khi chụp theo chu kỳ cố định.
+    """
+
+    def __init__(self, drowning_class=0, half_life=20.0, alert_seconds=30.0, elevated_threshold=0.1,
+                 min_rate=1.0, max_rate=10.0, load_threshold=0.5, quiet_capture_rate=0.2):
+        """
+        Khởi tạo RiskScheduler
+
+        Args:
+            drowning_class (int): Class id của drowning
+            half_life (float): Thời gian điểm rủi ro giảm một nửa (giây)
+            alert_seconds (float): Thời gian giữ mức ALERT sau khi cảnh báo (giây)
+            elevated_threshold (float): Điểm tối thiểu để camera ở mức ELEVATED
+            min_rate (float): Tốc độ frame của camera yên tĩnh (frame/giây)
+            max_rate (float): Tốc độ frame của camera đang cảnh báo (frame/giây)
+            load_threshold (float): Trên mức tải này camera không cảnh báo được gợi ý chụp thưa hơn
+            quiet_capture_rate (float): Tốc độ chụp tối đa gợi ý cho camera yên tĩnh (frame/giây)
+        """
+        self.drowning_class = drowning_class
+        self.half_life = half_life
+        self.alert_seconds = alert_seconds
+        self.elevated_threshold = elevated_threshold
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.load_threshold = load_threshold
+        self.quiet_capture_rate = quiet_capture_rate
+        self.quiet_rate_scale = 1.0  # DegradationController giảm khi quá tải
+
+        self._lock = threading.Lock()
+        self._scores = {}       # camera_id -> (điểm, thời điểm)
+        self._alert_until = {}  # camera_id -> hết thời gian cảnh báo
+        self._activity = {}     # camera_id -> tỉ lệ frame gần đây có đối tượng (EWMA)
+
+    def record(self, camera_id, classes, confidences, alert_triggered=False, timestamp=None):
+        """
+        Cập nhật điểm rủi ro từ kết quả detect của một frame
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        evidence = max((float(conf) for cls, conf in zip(classes, confidences)
+                        if int(cls) == self.drowning_class), default=0.0)
+        with self._lock:
+            score = max(self._decayed(camera_id, timestamp), evidence)
+            self._scores[camera_id] = (score, timestamp)
+            self._activity[camera_id] = 0.8 * self._activity.get(camera_id, 0.0) + 0.2 * (len(classes) > 0)
+            if alert_triggered:
+                self._alert_until[camera_id] = timestamp + self.alert_seconds
+
+    def risk(self, camera_id, now=None):
+        """
+        Điểm rủi ro hiện tại của camera (0-1)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._state(camera_id, now)[0]
+
+    def policy(self, camera_id, now=None):
+        """
+        Độ ưu tiên và tốc độ frame của camera (policy cho AdmissionController)
+
+        Returns:
+            tuple: (mức rủi ro, frame/giây)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            risk, level = self._state(camera_id, now)
+        return level, self._rate(camera_id, risk, level)
+
+    def capture_advice(self, camera_id, load=0.0, now=None):
+        """
+        Gợi ý cho camera: thời gian tới lần chụp sau và chất lượng JPEG
+
+        Args:
+            camera_id (str): Id camera
+            load (float): Mức tải của server (0-1, AdmissionController.load())
+
+        Returns:
+            dict: interval_ms, jpeg_quality, risk_level
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            risk, level = self._state(camera_id, now)
+            rate = self._rate(camera_id, risk, level)
+        quality = JPEG_QUALITY[level]
+        if level == RISK_QUIET:
+            rate = min(rate, self.quiet_capture_rate)
+
+        # Server tải nặng: camera không cảnh báo chụp thưa hơn (tới 1/4 tốc độ) và nén mạnh hơn
+        if level != RISK_ALERT and load > self.load_threshold:
+            overload = (load - self.load_threshold) / (1.0 - self.load_threshold)
+            rate *= 1.0 - 0.75 * min(overload, 1.0)
+            quality += 5 if level == RISK_QUIET else 0
+        return {
+            "interval_ms": int(round(1000.0 / rate)),
+            "jpeg_quality": quality,
+            "risk_level": RISK_LEVEL_NAMES[level]
+        }
+
+    def stats(self, now=None):
+        """
+        Điểm, mức rủi ro và tốc độ frame của từng camera
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            cameras = sorted(set(self._scores) | set(self._alert_until))
+            states = {camera_id: self._state(camera_id, now) for camera_id in cameras}
+        return {
+            camera_id: {
+                "risk": round(risk, 3),
+                "level": RISK_LEVEL_NAMES[level],
+                "rate_fps": round(self._rate(camera_id, risk, level), 2),
+                "activity": round(self._activity.get(camera_id, 0.0), 3)
+            }
+            for camera_id, (risk, level) in states.items()
+        }
+
+    def export_state(self, camera_id, drop=False):
+        """
+        Điểm rủi ro, thời gian cảnh báo và mức hoạt động của camera (dạng JSON)
+
+        Args:
+            drop (bool): Xóa camera khỏi scheduler này sau khi export
+        """
+        with self._lock:
+            pop = dict.pop if drop else dict.get
+            return {
+                "score": pop(self._scores, camera_id, None),
+                "alert_until": pop(self._alert_until, camera_id, None),
+                "activity": pop(self._activity, camera_id, None)
+            }
+
+    def import_state(self, camera_id, state):
+        with self._lock:
+            for store, key in ((self._scores, 'score'), (self._alert_until, 'alert_until'),
+                               (self._activity, 'activity')):
+                if state.get(key) is None:
+                    store.pop(camera_id, None)
+                else:
+                    store[camera_id] = tuple(state[key]) if key == 'score' else state[key]
+
+    def camera_ids(self):
+        with self._lock:
+            return sorted(set(self._scores) | set(self._alert_until))
+
+    def _decayed(self, camera_id, now):
+        score, updated_at = self._scores.get(camera_id, (0.0, now))
+        return score * 0.5 ** (max(now - updated_at, 0.0) / self.half_life)
+
+    def _state(self, camera_id, now):
+        # (điểm rủi ro, mức rủi ro)
+        if self._alert_until.get(camera_id, 0.0) > now:
+            return 1.0, RISK_ALERT
+        risk = self._decayed(camera_id, now)
+        return risk, RISK_ELEVATED if risk >= self.elevated_threshold else RISK_QUIET
+
+    def _rate(self, camera_id, risk, level):
+        if level == RISK_QUIET:
+            # Có người trong khung hình thì chụp dày hơn, tối đa gấp đôi min_rate
+            return self.min_rate * (1.0 + self._activity.get(camera_id, 0.0)) * self.quiet_rate_scale
+        return self.min_rate + (self.max_rate - self.min_rate) * risk
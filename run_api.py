@@ -6,7 +6,7 @@ Script để chạy Drowning Detection API
 import argparse
 import os
 import sys
-from api import app
+from api import app, model_registry
 
 def main():
     parser = argparse.ArgumentParser(description='Drowning Detection API Server')
@@ -23,6 +23,13 @@ def main():
         print("Please make sure the model file exists in the current directory.")
         sys.exit(1)
     
+    if os.path.abspath(args.model) != os.path.abspath(model_registry.default_path):
+        try:
+            model_registry.set_default(args.model)
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            sys.exit(1)
+    
     print("=" * 50)
     print("🌊 Drowning Detection API Server")
     print("=" * 50)
@@ -36,7 +43,19 @@ def main():
     print("- GET  /health - Health check")
     print("- POST /detect - Detect drowning (accepts JSON or form data)")
     print("- POST /detect_base64 - Detect drowning (base64 only)")
+    print("- POST /detect_and_plan - Detect and plan rescue in one request")
+    print("- GET  /metrics - Admission control and inference queue metrics")
+    print("- POST /jobs/video - Queue a video for background analysis")
+    print("- GET  /jobs/<job_id> - Video job progress")
+    print("- GET  /model - Current model info")
+    print("- POST /model/swap - Hot-swap model weights")
     print("- GET/POST /config - Configure Twilio settings")
+    print("- GET  /rescue_commands/subscribe - Long-poll rescue command updates")
+    print("- GET  /fleet/assignments - Buoy-to-victim assignments")
+    print("- GET/POST/DELETE /current_field - Gridded water-current field")
+    print("- GET/POST/DELETE /water_mask/<camera_id> - Per-camera water region (crop + filter)")
+    print("- GET  /state/cameras, POST /state/export|/state/import - Per-camera state for camera_router.py")
+    print("- GET/POST /tracing - Frame tracing status / sample rate (Chrome trace files in runs/traces)")
     print()
     print("Starting server...")
     print(f"API will be available at: http://{args.host}:{args.port}")
@@ -50,9 +50,103 @@ DETECTION_MODEL = MODEL_DIR / 'yolov8n.pt'
 
 SEGMENTATION_MODEL = MODEL_DIR / 'yolov8n-seg.pt'
 
+# Custom drowning model, shared by app.py and api.py through the model registry
+DROWNING_MODEL = 'best.pt'
+# Model input size, frames are letterboxed to it once before inference
+MODEL_IMGSZ = 640
+# Number of inference calls allowed to run on the model at the same time
+INFERENCE_CONCURRENCY = 1
+
+# Admission control for live frames (API): per-camera rate limit, bounded fair queues and a deadline
+ADMISSION_RATE = 5.0          # frames per second per camera (burst is scaled for risk-adjusted rates)
+ADMISSION_BURST = 10
+ADMISSION_QUEUE_SIZE = 4      # waiting frames per camera
+ADMISSION_MAX_QUEUED = 32     # waiting frames across all cameras
+ADMISSION_DEADLINE = 2.0      # seconds from arrival to result
+
+# Risk-aware scheduling (API): cameras with recent drowning detections or an active alert
+# are served first and may send up to RISK_MAX_RATE frames/s, quiet cameras RISK_MIN_RATE
+RISK_MIN_RATE = 1.0
+RISK_MAX_RATE = 10.0
+RISK_HALF_LIFE = 20.0         # seconds for the drowning evidence of a camera to halve
+# Capture rate advised to quiet cameras (0.2 = one frame every 5 s, the ESP32 sketch's fixed interval)
+RISK_QUIET_CAPTURE_RATE = 0.2
+
+# SLO-driven degradation (API): when a stage's p95 latency stays above its target the API steps down
+# NORMAL -> REDUCED_INPUT -> LIGHT_MODEL -> QUIET_THROTTLE -> NO_ANNOTATIONS, and back up when it recovers
+SLO_TARGETS = {
+    'queue': 0.5,             # seconds waiting for admission
+    'inference': 0.4,         # seconds in model.predict
+    'total': 1.5              # seconds from arrival to result
+}
+DEGRADED_IMGSZ = 480
+# Lighter variant of DROWNING_MODEL trained on the same classes (e.g. a yolov8n fine-tune), None to skip that step.
+# The stock COCO DETECTION_MODEL has different classes and must not replace the drowning model
+LIGHT_DROWNING_MODEL = None
+DEGRADED_QUIET_RATE_SCALE = 0.5
+
+# Durable detection log (API), partitioned per camera and per hour
+DETECTION_LOG_DIR = ROOT / 'runs' / 'detection_log'
+DETECTION_LOG_FLUSH_SECONDS = 1.0
+
+# Background video analysis jobs (API)
+VIDEO_JOBS_DIR = ROOT / 'runs' / 'jobs'
+VIDEO_JOB_WORKERS = 1
+VIDEO_JOB_BATCH = 8
+
+# Local cache of YouTube/remote videos (video_cache.py): content-addressed files, least recently used evicted first
+VIDEO_CACHE_DIR = ROOT / 'runs' / 'video_cache'
+VIDEO_CACHE_MAX_BYTES = 5 * 2 ** 30
+VIDEO_READ_AHEAD_FRAMES = 32  # frames decoded ahead on a background thread
+
+# Rescue target tracking (API): smoothed targets are re-published at a fixed rate
+TRACK_PUBLISH_INTERVAL = 0.5
+TRACK_MAX_AGE = 3.0
+TRACK_MIN_HITS = 2
+# Per-camera box tracker (ultralytics config) that gives detections stable ids across frames
+BOX_TRACKER = 'bytetrack.yaml'
+
+# Gridded water-current field (API), loaded at startup if the file exists (.json or .npz)
+CURRENT_FIELD_PATH = ROOT / 'current_field.json'
+
+# Per-camera water-region masks (API): frames are cropped to the water before inference and
+# detections outside it are dropped. Masks come from SEGMENTATION_MODEL (classes below) or an operator polygon
+WATER_MASK_DIR = ROOT / 'runs' / 'water_masks'
+WATER_MASK_CLASSES = ('water', 'sea', 'river', 'lake', 'pool', 'swimming pool')
+WATER_MASK_MARGIN = 0.05      # crop margin around the water, fraction of the frame size
+
+# Camera router (camera_router.py): cameras are sharded across API instances by consistent hashing
+ROUTER_REPLICAS = 100         # points per instance on the hash ring
+ROUTER_TIMEOUT = 60.0         # seconds, read timeout when forwarding (long-poll subscriptions wait up to 60s)
+
+# Shared-memory frame pool (frame_pool.py) between ingest and inference processes: fixed slots, fixed memory ceiling
+FRAME_POOL_SLOTS = 16
+FRAME_POOL_MAX_SHAPE = (1080, 1920, 3)  # largest frame (height, width, channels) a slot can hold
+
+# Headless ingest daemon (ingest_daemon.py): one reader process per camera listed in INGEST_CONFIG_PATH,
+# frames handed over through the frame pool and detected in batches
+INGEST_CONFIG_PATH = ROOT / 'cameras.json'
+INGEST_FPS = 2.0              # default frames per second sent to inference per camera (the rest are drained)
+INGEST_BATCH = 8              # frames per inference batch
+INGEST_BATCH_WAIT = 0.05      # seconds to wait for a batch to fill
+INGEST_RECONNECT_MIN = 1.0    # seconds, reconnect backoff doubles up to INGEST_RECONNECT_MAX
+INGEST_RECONNECT_MAX = 30.0
+INGEST_STALE_SECONDS = 10.0   # reconnect if a stream delivers no frame for this long
+INGEST_STATUS_INTERVAL = 30.0 # seconds between status lines
+
+# Frame tracing (tracing.py): spans of sampled frames written in Chrome trace format to TRACE_DIR/trace-<pid>.json
+TRACE_DIR = ROOT / 'runs' / 'traces'
+TRACE_SAMPLE_RATE = 0.01      # fraction of frames traced, 0 disables tracing (alerts are always traced)
+TRACE_MAX_BYTES = 50 * 2 ** 20  # trace file is rotated to .1 past this size
+
 # Webcam
 WEBCAM_PATH = 0
 
+# Display config (Streamlit render stage)
+DISPLAY_MAX_FPS = 10
+DISPLAY_MAX_WIDTH = 720
+DISPLAY_JPEG_QUALITY = 70
+
 account_sid = ''
 auth_token = ''
 from_=''
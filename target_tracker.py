@@ -0,0 +1,291 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+
+
+class TargetTracker:
+    """
+    Class lọc vị trí người gặp nạn bằng Kalman filter (vận tốc không đổi)
+
+    Mỗi target có trạng thái [x, y, vx, vy] (mét, mét/giây, hệ tọa độ mặt
+    nước của camera). Trạng thái của mọi target được lưu chung trong mảng
+    nên bước dự đoán và cập nhật chạy một lần cho cả batch. Đo đạc được
+    ghép với target theo tracker id nếu có, nếu không thì theo target gần
+    nhất trong ngưỡng gate_distance.
+    """
+
+    def __init__(self, process_noise=0.5, measurement_noise=0.7, gate_distance=3.0, max_age=3.0,
+                 depth_smoothing=0.3):
+        """
+        Khởi tạo TargetTracker
+
+        Args:
+            process_noise (float): Độ lệch gia tốc ngẫu nhiên của người (m/s^2)
+            measurement_noise (float): Độ lệch vị trí đo từ detect (m)
+            gate_distance (float): Khoảng cách tối đa để ghép đo đạc với target (m)
+            max_age (float): Target không được cập nhật quá thời gian này sẽ bị xóa (giây)
+            depth_smoothing (float): Hệ số làm mượt độ sâu z (0-1, càng nhỏ càng mượt)
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.gate_distance = gate_distance
+        self.max_age = max_age
+        self.depth_smoothing = depth_smoothing
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self.state = np.zeros((0, 4))          # [x, y, vx, vy]
+        self.covariance = np.zeros((0, 4, 4))
+        self.depth = np.zeros(0)
+        self.updated_at = np.zeros(0)          # Thời điểm của trạng thái
+        self.last_seen = np.zeros(0)           # Thời điểm đo đạc gần nhất
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.track_ids = np.zeros(0, dtype=np.int64)
+        self.cameras = np.zeros(0, dtype=object)
+        self.source_ids = np.zeros(0, dtype=object)  # Tracker id từ model (None nếu không có)
+        self.meta = []
+
+    def update(self, camera_id, timestamp, positions, source_ids=None, meta=None):
+        """
+        Cập nhật các target của một camera với vị trí đo được trong một frame
+
+        Args:
+            camera_id (str): Id camera
+            timestamp (float): Thời điểm frame
+            positions (np.array): [N, 3] vị trí (x, y, z) đo được (mét)
+            source_ids (list): Tracker id của từng đo đạc (None nếu không có)
+            meta (list): Thông tin kèm theo của từng đo đạc (object_id, class_id, ...)
+
+        Returns:
+            list: Target đã lọc tương ứng với từng đo đạc
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        count = len(positions)
+        source_ids = list(source_ids) if source_ids is not None else [None] * count
+        meta = list(meta) if meta is not None else [{} for _ in range(count)]
+
+        with self._lock:
+            self._prune(timestamp)
+            rows = np.flatnonzero(self.cameras == camera_id)
+            self._predict(rows, timestamp)
+
+            assigned = self._associate(rows, positions, source_ids)
+            is_new = assigned < 0
+
+            matched = np.flatnonzero(~is_new)
+            if len(matched):
+                self._correct(assigned[matched], positions[matched])
+                self.last_seen[assigned[matched]] = timestamp
+                self.hits[assigned[matched]] += 1
+                for i in matched:
+                    self.meta[assigned[i]] = meta[i]
+                    if source_ids[i] is not None:
+                        # Target ghép theo vị trí nhận tracker id mới (track bị mất rồi tìm lại, camera vừa chuyển instance)
+                        self.source_ids[assigned[i]] = source_ids[i]
+
+            new = np.flatnonzero(is_new)
+            if len(new):
+                assigned[new] = np.arange(len(self.state), len(self.state) + len(new))
+                self._add(camera_id, timestamp, positions[new], [source_ids[i] for i in new],
+                          [meta[i] for i in new])
+
+            return [self._describe(row, timestamp) for row in assigned]
+
+    def targets(self, camera_id=None, now=None, min_hits=1):
+        """
+        Vị trí và vận tốc đã lọc của các target, dự đoán tới thời điểm now
+
+        Args:
+            camera_id (str): Id camera (None = tất cả camera)
+            now (float): Thời điểm cần dự đoán (mặc định hiện tại)
+            min_hits (int): Chỉ lấy target đã được đo ít nhất min_hits lần (bỏ detect nhiễu)
+
+        Returns:
+            list: Target đã lọc
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._prune(now)
+            rows = np.arange(len(self.state)) if camera_id is None else np.flatnonzero(self.cameras == camera_id)
+            rows = rows[self.hits[rows] >= min_hits]
+            dt = np.maximum(now - self.updated_at[rows], 0.0)
+            position = self.state[rows, :2] + self.state[rows, 2:] * dt[:, None]
+            return [self._describe(row, now, position[i]) for i, row in enumerate(rows)]
+
+    def camera_ids(self):
+        with self._lock:
+            return sorted(set(self.cameras.tolist()))
+
+    def export_camera(self, camera_id, drop=False):
+        """
+        Trạng thái các target của một camera dạng JSON (chuyển camera sang API instance khác)
+
+        Args:
+            drop (bool): Xóa target của camera khỏi tracker này sau khi export
+        """
+        with self._lock:
+            rows = np.flatnonzero(self.cameras == camera_id)
+            state = {
+                "track_ids": self.track_ids[rows].tolist(),
+                "state": self.state[rows].tolist(),
+                "covariance": self.covariance[rows].tolist(),
+                "depth": self.depth[rows].tolist(),
+                "updated_at": self.updated_at[rows].tolist(),
+                "last_seen": self.last_seen[rows].tolist(),
+                "hits": self.hits[rows].tolist(),
+                "source_ids": self.source_ids[rows].tolist(),
+                "meta": [self.meta[row] for row in rows]
+            }
+            if drop:
+                self._keep(self.cameras != camera_id)
+            return state
+
+    def import_camera(self, camera_id, state):
+        """
+        Thay target của camera bằng trạng thái từ export_camera, giữ nguyên track id
+        """
+        track_ids = np.asarray(state['track_ids'], dtype=np.int64)
+        n = len(track_ids)
+        with self._lock:
+            self._keep(self.cameras != camera_id)
+            self.state = np.concatenate([self.state, np.asarray(state['state'], dtype=np.float64).reshape(n, 4)])
+            self.covariance = np.concatenate([self.covariance,
+                                              np.asarray(state['covariance'], dtype=np.float64).reshape(n, 4, 4)])
+            self.depth = np.concatenate([self.depth, np.asarray(state['depth'], dtype=np.float64)])
+            self.updated_at = np.concatenate([self.updated_at, np.asarray(state['updated_at'], dtype=np.float64)])
+            self.last_seen = np.concatenate([self.last_seen, np.asarray(state['last_seen'], dtype=np.float64)])
+            self.hits = np.concatenate([self.hits, np.asarray(state['hits'], dtype=np.int64)])
+            self.track_ids = np.concatenate([self.track_ids, track_ids])
+            ids = np.empty(n, dtype=object)
+            ids[:] = state['source_ids']
+            self.source_ids = np.concatenate([self.source_ids, ids])
+            cameras = np.empty(n, dtype=object)
+            cameras[:] = camera_id
+            self.cameras = np.concatenate([self.cameras, cameras])
+            self.meta.extend(state['meta'])
+
+            # Track id mới không được trùng track id vừa nhận
+            if n:
+                self._ids = itertools.count(max(next(self._ids), int(track_ids.max()) + 1))
+
+    def _describe(self, row, timestamp, position=None):
+        position = self.state[row, :2] if position is None else position
+        target = dict(self.meta[row])
+        target.update({
+            "track_id": int(self.track_ids[row]),
+            "camera_id": self.cameras[row],
+            "x_m": float(position[0]),
+            "y_m": float(position[1]),
+            "z_m": float(self.depth[row]),
+            "vx_mps": float(self.state[row, 2]),
+            "vy_mps": float(self.state[row, 3]),
+            "position_std_m": float(np.sqrt(self.covariance[row, 0, 0] + self.covariance[row, 1, 1])),
+            "hits": int(self.hits[row]),
+            "age_s": float(timestamp - self.last_seen[row])
+        })
+        return target
+
+    def _predict(self, rows, timestamp):
+        # Dự đoán trạng thái của các target tới timestamp (cả batch)
+        if len(rows) == 0:
+            return
+        dt = np.maximum(timestamp - self.updated_at[rows], 0.0)
+        n = len(rows)
+
+        F = np.tile(np.eye(4), (n, 1, 1))
+        F[:, 0, 2] = dt
+        F[:, 1, 3] = dt
+
+        q = self.process_noise ** 2
+        Q = np.zeros((n, 4, 4))
+        Q[:, 0, 0] = Q[:, 1, 1] = q * dt ** 3 / 3
+        Q[:, 0, 2] = Q[:, 2, 0] = Q[:, 1, 3] = Q[:, 3, 1] = q * dt ** 2 / 2
+        Q[:, 2, 2] = Q[:, 3, 3] = q * dt
+
+        self.state[rows] = np.einsum('nij,nj->ni', F, self.state[rows])
+        self.covariance[rows] = F @ self.covariance[rows] @ F.transpose(0, 2, 1) + Q
+        self.updated_at[rows] = timestamp
+
+    def _correct(self, rows, measured):
+        # Cập nhật Kalman với vị trí đo (H chọn [x, y])
+        P = self.covariance[rows]
+        S = P[:, :2, :2] + np.eye(2) * self.measurement_noise ** 2
+        K = P[:, :, :2] @ np.linalg.inv(S)
+        innovation = measured[:, :2] - self.state[rows, :2]
+        self.state[rows] += np.einsum('nij,nj->ni', K, innovation)
+        self.covariance[rows] = P - K @ P[:, :2, :]
+
+        alpha = self.depth_smoothing
+        self.depth[rows] = (1 - alpha) * self.depth[rows] + alpha * measured[:, 2]
+
+    def _associate(self, rows, positions, source_ids):
+        # Trả về row của target cho từng đo đạc, -1 nếu là target mới
+        assigned = np.full(len(positions), -1, dtype=np.int64)
+        free = set(rows.tolist())
+
+        # Ghép theo tracker id trước
+        for i, source_id in enumerate(source_ids):
+            if source_id is None:
+                continue
+            for row in free:
+                if self.source_ids[row] == source_id:
+                    assigned[i] = row
+                    free.discard(row)
+                    break
+
+        # Còn lại ghép theo khoảng cách gần nhất (tham lam trên ma trận khoảng cách) với target
+        # không có tracker id hoặc có tracker id không còn xuất hiện trong frame này
+        pending = np.flatnonzero(assigned < 0)
+        present = {source_id for source_id in source_ids if source_id is not None}
+        candidates = np.array(sorted(row for row in free if self.source_ids[row] not in present), dtype=np.int64)
+        if len(pending) and len(candidates):
+            diff = positions[pending, None, :2] - self.state[None, candidates, :2]
+            distance = np.linalg.norm(diff, axis=2)
+            for flat in np.argsort(distance, axis=None):
+                i, j = np.unravel_index(flat, distance.shape)
+                if distance[i, j] > self.gate_distance:
+                    break
+                if assigned[pending[i]] < 0 and candidates[j] in free:
+                    assigned[pending[i]] = candidates[j]
+                    free.discard(candidates[j])
+        return assigned
+
+    def _add(self, camera_id, timestamp, positions, source_ids, meta):
+        n = len(positions)
+        state = np.zeros((n, 4))
+        state[:, :2] = positions[:, :2]
+        covariance = np.tile(np.diag([self.measurement_noise ** 2] * 2 + [1.0, 1.0]), (n, 1, 1))
+
+        self.state = np.concatenate([self.state, state])
+        self.covariance = np.concatenate([self.covariance, covariance])
+        self.depth = np.concatenate([self.depth, positions[:, 2]])
+        self.updated_at = np.concatenate([self.updated_at, np.full(n, timestamp)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(n, timestamp)])
+        self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+        self.track_ids = np.concatenate([self.track_ids, [next(self._ids) for _ in range(n)]]).astype(np.int64)
+        ids = np.empty(n, dtype=object)
+        ids[:] = source_ids
+        self.source_ids = np.concatenate([self.source_ids, ids])
+        cameras = np.empty(n, dtype=object)
+        cameras[:] = camera_id
+        self.cameras = np.concatenate([self.cameras, cameras])
+        self.meta.extend(meta)
+
+    def _prune(self, now):
+        self._keep(now - self.last_seen <= self.max_age)
+
+    def _keep(self, keep):
+        if keep.all():
+            return
+        self.state = self.state[keep]
+        self.covariance = self.covariance[keep]
+        self.depth = self.depth[keep]
+        self.updated_at = self.updated_at[keep]
+        self.last_seen = self.last_seen[keep]
+        self.hits = self.hits[keep]
+        self.track_ids = self.track_ids[keep]
+        self.source_ids = self.source_ids[keep]
+        self.cameras = self.cameras[keep]
+        self.meta = [m for m, k in zip(self.meta, keep) if k]
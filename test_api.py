@@ -3,6 +3,7 @@ import base64
 import json
 from PIL import Image
 import io
+import time
 
 # URL của API
 API_BASE_URL = "http://localhost:5000"
@@ -56,6 +57,24 @@ def test_detect_with_base64():
             print(f"  Object {obj['object_id']}: {obj['position']}")
     print()
 
+def test_detect_and_plan():
+    """Test detect và tính tọa độ cứu hộ trong một request"""
+    print("Testing detect and plan...")
+    
+    image_path = "images/img1.jpg"
+    with open(image_path, 'rb') as f:
+        base64_image = base64.b64encode(f.read()).decode('utf-8')
+    
+    data = {'image': base64_image, 'camera_id': 'test', 'current_direction': 90.0, 'current_speed': 0.5}
+    response = requests.post(f"{API_BASE_URL}/detect_and_plan", json=data)
+    
+    print(f"Status: {response.status_code}")
+    result = response.json()
+    print(f"Alert: {result.get('alert_triggered')}, highest priority: {result.get('highest_priority')}")
+    for target in result.get('rescue_targets', []):
+        print(f"  Object {target['object_id']}: heading {target['navigation']['heading_degrees']}°")
+    print()
+
 def test_config():
     """Test config endpoint"""
     print("Testing config...")
@@ -93,6 +112,30 @@ def test_calibration():
     print(f"Auto calibration - Response: {response.json()}")
     print()
 
+def test_video_job():
+    """Test video analysis job"""
+    print("Testing video analysis job...")
+    
+    video_path = "videos/12727733-preview.mp4"
+    with open(video_path, 'rb') as f:
+        response = requests.post(f"{API_BASE_URL}/jobs/video", files={'video': f}, params={'stride': 5})
+    print(f"Submit job - Status: {response.status_code}")
+    job = response.json()['job']
+    print(f"Submit job - Response: {job}")
+    
+    # Chờ job chạy xong
+    for _ in range(60):
+        job = requests.get(f"{API_BASE_URL}/jobs/{job['job_id']}").json()
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(1)
+    print(f"Job status: {job['status']}, progress: {job['progress']}")
+    
+    response = requests.get(f"{API_BASE_URL}/jobs/{job['job_id']}/results", params={'limit': 5})
+    print(f"Results - Status: {response.status_code}")
+    print(f"Results - Response: {response.json()}")
+    print()
+
 if __name__ == "__main__":
     print("=== Testing Drowning Detection API ===\n")
     
@@ -101,7 +144,9 @@ if __name__ == "__main__":
         test_calibration()  # Calibrate trước khi test detect
         test_detect_with_file()
         test_detect_with_base64()
+        test_detect_and_plan()
         test_config()
+        test_video_job()
         
         print("All tests completed!")
         
@@ -0,0 +1,248 @@
+"""
+Tracing đường đi của một frame từ lúc capture tới cảnh báo
+
+Mỗi frame được lấy mẫu (sample_rate) có một trace id; các span (decode,
+inference, khoảng cách, render, upload imgbb, Twilio, ...) trong cùng luồng
+tự gắn vào trace đang chạy qua contextvars, luồng khác nhận trace id tường
+minh. Span được ghi ra file JSON theo định dạng Chrome trace
+(<TRACE_DIR>/trace-<pid>.json), mở bằng chrome://tracing hoặc ui.perfetto.dev.
+Frame không được lấy mẫu chỉ tốn một lần đọc contextvar mỗi span.
+
+Ví dụ:
+    from tracing import tracer
+
+    with tracer.trace('frame', camera_id='pool_1'):
+        with tracer.span('inference'):
+            results = model.predict(image)
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+import settings
+
+_current_trace = contextvars.ContextVar('trace_id', default=None)
+
+
+def current_trace_id():
+    """
+    Trace id của frame đang xử lý trong luồng hiện tại, None nếu frame không được lấy mẫu
+    """
+    return _current_trace.get()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, trace_id, args):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.args = args
+
+    def __enter__(self):
+        self._ts = time.time_ns() // 1000
+        self._start = time.perf_counter()
+        return self.trace_id
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = int((time.perf_counter() - self._start) * 1e6)
+        args = dict(self.args, trace_id=self.trace_id)
+        if exc_type is not None:
+            args['error'] = f"{exc_type.__name__}: {exc}"
+        self.tracer._emit({"name": self.name, "ph": "X", "ts": self._ts, "dur": duration, "args": args})
+        return False
+
+
+class _Trace:
+    def __init__(self, tracer, name, trace_id, args):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.args = args
+        self._span = None
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_trace.set(self.trace_id)
+        if self.trace_id is None:
+            return None
+        self._span = _Span(self.tracer, self.name, self.trace_id, self.args)
+        return self._span.__enter__()
+
+    def __exit__(self, *exc):
+        try:
+            if self._span is not None:
+                self._span.__exit__(*exc)
+        finally:
+            _current_trace.reset(self._token)
+        return False
+
+
+class Tracer:
+    """
+    Class ghi span theo định dạng Chrome trace, lấy mẫu theo frame
+
+    Span được đưa vào bộ đệm và một luồng nền ghi nối thêm vào file mỗi
+    flush_interval giây (không chặn vòng xử lý frame). File là một JSON array
+    không đóng ']' nên ghi nối thêm được và vẫn đọc được khi process bị dừng
+    giữa chừng; vượt max_bytes thì file cũ được đổi tên thành .1.
+    """
+
+    def __init__(self, directory=settings.TRACE_DIR, sample_rate=settings.TRACE_SAMPLE_RATE,
+                 max_bytes=settings.TRACE_MAX_BYTES, flush_interval=1.0, max_pending=100000):
+        """
+        Khởi tạo Tracer
+
+        Args:
+            directory (str): Thư mục file trace
+            sample_rate (float): Tỉ lệ frame được trace (0 = tắt, 1 = mọi frame)
+            max_bytes (int): Kích thước tối đa của một file trace
+            flush_interval (float): Thời gian giữa hai lần ghi file (giây)
+            max_pending (int): Số span tối đa chờ ghi, vượt quá thì bỏ span
+        """
+        self.directory = str(directory)
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.traces = 0
+        self.events_written = 0
+        self.events_dropped = 0
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = []
+        self._thread_names = set()  # (pid, tid) đã ghi tên luồng
+        self._writer_pid = None
+        atexit.register(self.flush)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"trace-{os.getpid()}.json")
+
+    def configure(self, sample_rate=None):
+        if sample_rate is not None:
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError("sample_rate must be between 0 and 1")
+            self.sample_rate = sample_rate
+
+    def trace(self, name, trace_id=None, always=False, **args):
+        """
+        Bắt đầu trace của một frame (span gốc), các span bên trong tự gắn vào trace
+
+        Args:
+            name (str): Tên span gốc
+            trace_id (str): Tiếp tục trace đã có (luồng/process khác, header X-Trace-Id), luôn được ghi
+            always (bool): Ghi kể cả khi frame không được lấy mẫu (ví dụ gửi cảnh báo)
+            **args: Thông tin thêm của span (camera_id, ...)
+
+        Returns:
+            Context manager trả về trace id, None nếu frame không được lấy mẫu
+        """
+        if trace_id is None and (always or (self.sample_rate > 0 and random.random() < self.sample_rate)):
+            trace_id = uuid.uuid4().hex[:16]
+            self.traces += 1
+        return _Trace(self, name, trace_id, args)
+
+    def span(self, name, **args):
+        """
+        Span trong trace đang chạy của luồng hiện tại (không làm gì nếu không có trace)
+        """
+        trace_id = _current_trace.get()
+        if trace_id is None:
+            return _NOOP
+        return _Span(self, name, trace_id, args)
+
+    def event(self, name, **args):
+        """
+        Sự kiện tức thời trong trace đang chạy (ví dụ cảnh báo được kích hoạt)
+        """
+        trace_id = _current_trace.get()
+        if trace_id is not None:
+            self._emit({"name": name, "ph": "i", "s": "t", "ts": time.time_ns() // 1000,
+                        "args": dict(args, trace_id=trace_id)})
+
+    def _emit(self, event):
+        thread = threading.current_thread()
+        event['pid'] = os.getpid()
+        event['tid'] = thread.ident
+        event['cat'] = 'frame'
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.events_dropped += 1
+                return
+            key = (event['pid'], event['tid'])
+            if key not in self._thread_names:
+                self._thread_names.add(key)
+                self._pending.append({"name": "thread_name", "ph": "M", "pid": key[0], "tid": key[1],
+                                      "args": {"name": thread.name}})
+            self._pending.append(event)
+            if self._writer_pid != event['pid']:
+                # Luồng ghi chưa chạy (hoặc process vừa fork)
+                self._writer_pid = event['pid']
+                threading.Thread(target=self._writer_loop, name='trace-writer', daemon=True).start()
+
+    def _writer_loop(self):
+        pid = os.getpid()
+        while self._writer_pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as ex:
+                print(f"Error writing trace: {ex}")
+
+    def flush(self):
+        """
+        Ghi ngay các span đang chờ
+        """
+        with self._lock:
+            events, self._pending = self._pending, []
+        if not events:
+            return
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path
+            if os.path.exists(path) and os.path.getsize(path) > self.max_bytes:
+                os.replace(path, f"{path}.1")
+                with self._lock:
+                    # File mới cần ghi lại tên luồng
+                    self._thread_names = set()
+            new_file = not os.path.exists(path)
+            with open(path, 'a') as trace_file:
+                if new_file:
+                    trace_file.write('[\n')
+                trace_file.write(''.join(json.dumps(event) + ',\n' for event in events))
+            self.events_written += len(events)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "sample_rate": self.sample_rate,
+            "path": self.path,
+            "traces": self.traces,
+            "events_written": self.events_written,
+            "events_pending": pending,
+            "events_dropped": self.events_dropped
+        }
+
+
+# Tracer dùng chung của process (Streamlit app, API, các module xử lý frame)
+tracer = Tracer()
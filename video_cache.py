@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Cache video YouTube/video từ xa trên đĩa cho các lần phân tích lặp lại
+
+Video được tải nền về thư mục cache, file đặt tên theo sha256 nội dung
+(cùng một video từ nhiều URL chỉ lưu một lần). Index ánh xạ nguồn video
+(ví dụ youtube:<id>:720p) sang nội dung; khi tổng dung lượng vượt giới hạn,
+video lâu nhất chưa dùng bị xóa (LRU). Lần chạy đầu đọc qua mạng trong lúc
+tải, các lần sau đọc từ đĩa. ReadAheadCapture decode trước một số frame
+trên luồng nền để mạng chậm không làm khựng inference.
+
+Ví dụ:
+    python video_cache.py prefetch https://youtu.be/3F6GsMESbDc
+    python video_cache.py list
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+import cv2
+import requests
+
+import settings
+
+
+def resolve_youtube(url, resolution=720):
+    """
+    Stream mp4 của video YouTube
+
+    Returns:
+        tuple: (key của nguồn trong cache, URL stream)
+    """
+    from pytube import YouTube
+    yt = YouTube(url)
+    stream = yt.streams.filter(file_extension="mp4", res=resolution).first()
+    if stream is None:
+        stream = yt.streams.filter(file_extension="mp4", progressive=True).get_highest_resolution()
+    if stream is None:
+        raise ValueError(f"No mp4 stream for {url}")
+    return f"youtube:{yt.video_id}:{stream.resolution}", stream.url
+
+
+class VideoCache:
+    """
+    Class cache video theo nội dung với giới hạn dung lượng (LRU)
+
+    <directory>/objects/<sha256>.mp4 là nội dung video, <directory>/index.json
+    lưu nguồn -> sha256 và kích thước, thời điểm dùng gần nhất của từng file.
+    Tải về file tạm rồi os.replace() nên file trong objects luôn đầy đủ.
+    """
+
+    def __init__(self, directory=settings.VIDEO_CACHE_DIR, max_bytes=settings.VIDEO_CACHE_MAX_BYTES,
+                 chunk_size=1 << 20, timeout=30):
+        """
+        Khởi tạo VideoCache
+
+        Args:
+            directory (str): Thư mục cache
+            max_bytes (int): Tổng dung lượng tối đa của các video trong cache
+            chunk_size (int): Kích thước mỗi lần đọc khi tải (byte)
+            timeout (float): Timeout kết nối/đọc khi tải (giây)
+        """
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._objects_dir = os.path.join(self.directory, 'objects')
+        self._index_path = os.path.join(self.directory, 'index.json')
+        os.makedirs(self._objects_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._downloads = {}  # key -> Thread đang tải
+        self._index = {"sources": {}, "objects": {}}
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path) as index_file:
+                    self._index = json.load(index_file)
+            except Exception as ex:
+                print(f"Error loading video cache index: {ex}")
+
+    def _object_path(self, digest):
+        return os.path.join(self._objects_dir, f"{digest}.mp4")
+
+    def get(self, key):
+        """
+        Đường dẫn file của nguồn nếu đã có trong cache (đánh dấu vừa dùng), None nếu chưa
+        """
+        with self._lock:
+            digest = self._index['sources'].get(key)
+            if digest is None:
+                return None
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                # File bị xóa bên ngoài
+                self._forget(digest)
+                self._save_index()
+                return None
+            self._index['objects'][digest]['last_used'] = time.time()
+            self._save_index()
+            return path
+
+    def prefetch(self, key, url):
+        """
+        Tải nền nguồn về cache (không làm gì nếu đã có hoặc đang tải)
+
+        Returns:
+            threading.Thread đang tải, None nếu đã có trong cache
+        """
+        if self.get(key) is not None:
+            return None
+        with self._lock:
+            download = self._downloads.get(key)
+            if download is None:
+                download = threading.Thread(target=self._download, args=(key, url), name=f"video-cache-{key}",
+                                            daemon=True)
+                self._downloads[key] = download
+                download.start()
+            return download
+
+    def fetch(self, key, url):
+        """
+        Tải (nếu chưa có) và chờ tới khi xong
+
+        Returns:
+            str: Đường dẫn file trong cache, None nếu tải lỗi hoặc video lớn hơn giới hạn cache
+        """
+        download = self.prefetch(key, url)
+        if download is not None:
+            download.join()
+        return self.get(key)
+
+    def open_capture(self, key, url, read_ahead=settings.VIDEO_READ_AHEAD_FRAMES):
+        """
+        Mở video: từ đĩa nếu đã cache, nếu chưa thì đọc qua mạng và tải về cache song song
+
+        Returns:
+            ReadAheadCapture
+        """
+        path = self.get(key)
+        if path is None:
+            self.prefetch(key, url)
+            source = url
+        else:
+            print(f"Video {key} served from cache")
+            source = path
+        return ReadAheadCapture(cv2.VideoCapture(source), read_ahead)
+
+    def _download(self, key, url):
+        tmp_path = os.path.join(self.directory, f"{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with requests.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                with open(tmp_path, 'wb') as tmp_file:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        tmp_file.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise ValueError(f"larger than the cache limit ({self.max_bytes} bytes)")
+            self._install(key, digest.hexdigest(), tmp_path, size)
+            print(f"Video {key} cached ({size / 2 ** 20:.1f} MB)")
+        except Exception as ex:
+            print(f"Error caching video {key}: {ex}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._downloads.pop(key, None)
+
+    def _install(self, key, digest, tmp_path, size):
+        path = self._object_path(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                os.replace(tmp_path, path)
+            self._index['sources'][key] = digest
+            self._index['objects'][digest] = {"size": size, "last_used": time.time()}
+            self._evict(keep=digest)
+            self._save_index()
+
+    def _evict(self, keep=None):
+        # Xóa video lâu nhất chưa dùng tới khi tổng dung lượng không vượt giới hạn
+        objects = self._index['objects']
+        total = sum(entry['size'] for entry in objects.values())
+        for digest in sorted(objects, key=lambda d: objects[d]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            total -= objects[digest]['size']
+            # File đang được đọc vẫn đọc tiếp được sau khi xóa (POSIX)
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+            self._forget(digest)
+
+    def _forget(self, digest):
+        self._index['objects'].pop(digest, None)
+        self._index['sources'] = {k: d for k, d in self._index['sources'].items() if d != digest}
+
+    def _save_index(self):
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, 'w') as index_file:
+            json.dump(self._index, index_file)
+        os.replace(tmp_path, self._index_path)
+
+    def info(self):
+        with self._lock:
+            objects = self._index['objects']
+            return {
+                "directory": self.directory,
+                "total_mb": round(sum(entry['size'] for entry in objects.values()) / 2 ** 20, 1),
+                "max_mb": round(self.max_bytes / 2 ** 20, 1),
+                "downloading": sorted(self._downloads),
+                "sources": {
+                    key: {"sha256": digest, "size": objects[digest]['size'], "last_used": objects[digest]['last_used']}
+                    for key, digest in sorted(self._index['sources'].items()) if digest in objects
+                }
+            }
+
+
+class ReadAheadCapture:
+    """
+    Class bọc cv2.VideoCapture, decode trước tối đa buffer frame trên luồng nền
+
+    Giao diện như cv2.VideoCapture (isOpened, read, get, release) nên dùng
+    thay trực tiếp trong vòng đọc frame. Không bỏ frame: luồng nền chờ khi
+    buffer đầy.
+    """
+
+    def __init__(self, capture, buffer=settings.VIDEO_READ_AHEAD_FRAMES):
+        self._capture = capture
+        self._frames = queue.Queue(maxsize=max(1, buffer))
+        self._stop = threading.Event()
+        self._ended = False
+        self._thread = threading.Thread(target=self._reader, name='read-ahead', daemon=True)
+        if capture.isOpened():
+            self._thread.start()
+        else:
+            self._ended = True
+
+    def _reader(self):
+        while not self._stop.is_set():
+            success, image = self._capture.read()
+            item = image if success else None
+            while not self._stop.is_set():
+                try:
+                    self._frames.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if item is None:
+                break
+
+    def isOpened(self):
+        return not self._ended
+
+    def read(self):
+        if self._ended:
+            return False, None
+        image = self._frames.get()
+        if image is None:
+            self._ended = True
+            return False, None
+        return True, image
+
+    def get(self, prop):
+        return self._capture.get(prop)
+
+    def release(self):
+        self._ended = True
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._capture.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache remote videos for repeat analysis")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    prefetch_parser = subparsers.add_parser('prefetch', help="Download YouTube videos into the cache")
+    prefetch_parser.add_argument('urls', nargs='+')
+    prefetch_parser.add_argument('--resolution', type=int, default=720)
+    subparsers.add_parser('list', help="Show cached videos")
+    args = parser.parse_args()
+
+    cache = VideoCache()
+    if args.command == 'prefetch':
+        for url in args.urls:
+            key, stream_url = resolve_youtube(url, args.resolution)
+            print(f"{key}: {cache.fetch(key, stream_url)}")
+    else:
+        print(json.dumps(cache.info(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
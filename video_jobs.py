@@ -0,0 +1,271 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import cv2
+
+from alert_monitor import AlertMonitor
+from analyze_video import detection_record, get_video_info, iter_frame_batches
+from inference_gate import PRIORITY_BACKGROUND
+
+
+class VideoJobQueue:
+    """
+    Class quản lý hàng đợi job phân tích video lưu trên SQLite
+
+    Job được lưu trên đĩa nên không mất khi khởi động lại API, job đang chạy
+    dở sẽ được chạy tiếp từ frame cuối cùng đã lưu. Worker chạy nền, mỗi
+    batch lấy slot inference với độ ưu tiên thấp hơn frame trực tiếp. Video
+    upload bị xóa khi job kết thúc (done hoặc failed), kết quả vẫn giữ lại.
+    """
+
+    def __init__(self, jobs_dir, model_registry, inference_gate, workers=1, batch_size=8):
+        """
+        Khởi tạo VideoJobQueue
+
+        Args:
+            jobs_dir (str): Thư mục lưu video upload và database
+            model_registry (ModelRegistry): Registry để lấy model
+            inference_gate (InferenceGate): Gate chia sẻ với /detect
+            workers (int): Số worker thread
+            batch_size (int): Số frame mỗi batch inference
+        """
+        self.jobs_dir = str(jobs_dir)
+        self.model_registry = model_registry
+        self.inference_gate = inference_gate
+        self.batch_size = batch_size
+
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._db = sqlite3.connect(os.path.join(self.jobs_dir, 'jobs.db'), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._init_db()
+
+        self._workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._worker_loop, name=f'video-job-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _init_db(self):
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    video_path TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    frames_total INTEGER DEFAULT 0,
+                    frames_done INTEGER DEFAULT 0,
+                    alerts INTEGER DEFAULT 0,
+                    error TEXT
+                )""")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    frame INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    record TEXT NOT NULL
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_job ON results (job_id, seq)")
+
+            # Job đang chạy dở khi API dừng sẽ được chạy tiếp
+            self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self._db.commit()
+
+    def submit(self, video_file, filename='video.mp4', confidence=0.25, stride=1):
+        """
+        Lưu video upload và thêm job vào hàng đợi
+
+        Args:
+            video_file: File object (werkzeug FileStorage) của video
+            filename (str): Tên file gốc để lấy phần mở rộng
+            confidence (float): Ngưỡng confidence
+            stride (int): Chỉ detect mỗi frame thứ N
+
+        Returns:
+            dict: Thông tin job
+        """
+        job_id = uuid.uuid4().hex
+        extension = os.path.splitext(filename)[1] or '.mp4'
+        video_path = os.path.join(self.jobs_dir, f'{job_id}{extension}')
+        video_file.save(video_path)
+
+        options = {"confidence": confidence, "stride": max(1, int(stride))}
+        with self._wakeup:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, video_path, options, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, video_path, json.dumps(options), time.time())
+            )
+            self._db.commit()
+            self._wakeup.notify()
+        return self.get_job(job_id)
+
+    def get_job(self, job_id):
+        """
+        Trạng thái và tiến độ của job
+
+        Returns:
+            dict: Thông tin job, None nếu không tồn tại
+        """
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._describe(row) if row else None
+
+    def list_jobs(self, limit=50):
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._describe(row) for row in rows]
+
+    def get_results(self, job_id, cursor=0, limit=100, result_type=None):
+        """
+        Lấy kết quả của job theo trang
+
+        Args:
+            job_id (str): Id của job
+            cursor (int): Lấy các kết quả sau cursor này (next_cursor của trang trước)
+            limit (int): Số kết quả tối đa
+            result_type (str): 'detection' hoặc 'alert' (None = tất cả)
+
+        Returns:
+            dict: items và next_cursor
+        """
+        query = "SELECT seq, record FROM results WHERE job_id = ? AND seq > ?"
+        params = [job_id, cursor]
+        if result_type:
+            query += " AND type = ?"
+            params.append(result_type)
+        query += " ORDER BY seq LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+
+        return {
+            "items": [json.loads(row['record']) for row in rows],
+            "next_cursor": rows[-1]['seq'] if rows else cursor,
+            "has_more": len(rows) == limit
+        }
+
+    def _describe(self, row):
+        frames_total = row['frames_total'] or 0
+        return {
+            "job_id": row['id'],
+            "status": row['status'],
+            "created_at": row['created_at'],
+            "started_at": row['started_at'],
+            "finished_at": row['finished_at'],
+            "frames_total": frames_total,
+            "frames_done": row['frames_done'],
+            "progress": round(row['frames_done'] / frames_total, 4) if frames_total else 0.0,
+            "alerts": row['alerts'],
+            "error": row['error']
+        }
+
+    def _next_job(self):
+        with self._wakeup:
+            while True:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row:
+                    # Điều kiện status = 'queued' để hai process không cùng nhận một job
+                    claimed = self._db.execute(
+                        "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?) "
+                        "WHERE id = ? AND status = 'queued'",
+                        (time.time(), row['id'])
+                    ).rowcount
+                    self._db.commit()
+                    if claimed:
+                        return row
+                    continue
+                self._wakeup.wait(timeout=5)
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            try:
+                self._run_job(job)
+            except Exception as e:
+                print(f"Video job {job['id']} failed: {e}")
+                with self._lock:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                        (str(e), time.time(), job['id'])
+                    )
+                    self._db.commit()
+            finally:
+                self._remove_video(job)
+
+    def _remove_video(self, job):
+        # Job đang chạy dở khi API dừng vẫn cần video nên chỉ xóa khi job đã kết thúc
+        with self._lock:
+            status = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job['id'],)).fetchone()['status']
+        if status in ('done', 'failed'):
+            try:
+                os.remove(job['video_path'])
+            except OSError:
+                pass
+
+    def _run_job(self, job):
+        job_id = job['id']
+        options = json.loads(job['options'])
+        info = get_video_info(job['video_path'])
+        fps = info['fps']
+
+        # Chạy tiếp từ frame kế tiếp theo stride sau frame cuối cùng đã lưu (giữ đúng pha của stride)
+        with self._lock:
+            last = self._db.execute(
+                "SELECT MAX(frame) AS frame FROM results WHERE job_id = ? AND type = 'detection'", (job_id,)
+            ).fetchone()['frame']
+            self._db.execute("UPDATE jobs SET frames_total = ? WHERE id = ?", (info['frame_count'], job_id))
+            self._db.commit()
+        start = 0 if last is None else last + options['stride']
+
+        alert_monitor = AlertMonitor(window_seconds=10, min_frames=5, cooldown=30)
+        vid_cap = cv2.VideoCapture(job['video_path'])
+        try:
+            for indices, frames in iter_frame_batches(vid_cap, start, info['frame_count'],
+                                                      self.batch_size, options['stride']):
+                # Nhường model cho frame trực tiếp, chỉ giữ slot trong một batch
+                with self.inference_gate.slot(PRIORITY_BACKGROUND):
+                    with self.model_registry.acquire() as model:
+                        results = model.predict(frames, conf=options['confidence'], verbose=False)
+
+                rows = []
+                alerts = 0
+                for frame_idx, result in zip(indices, results):
+                    record = detection_record(result, frame_idx, fps)
+                    rows.append((job_id, frame_idx, 'detection', json.dumps(record)))
+                    if alert_monitor.update(record['classes'], record['timestamp']):
+                        alerts += 1
+                        alert = {"type": "alert", "frame": frame_idx, "timestamp": record['timestamp']}
+                        rows.append((job_id, frame_idx, 'alert', json.dumps(alert)))
+
+                with self._lock:
+                    self._db.executemany(
+                        "INSERT INTO results (job_id, frame, type, record) VALUES (?, ?, ?, ?)", rows
+                    )
+                    self._db.execute(
+                        "UPDATE jobs SET frames_done = ?, alerts = alerts + ? WHERE id = ?",
+                        (indices[-1] + 1, alerts, job_id)
+                    )
+                    self._db.commit()
+        finally:
+            vid_cap.release()
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', frames_done = frames_total, finished_at = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+            self._db.commit()
@@ -0,0 +1,261 @@
+import argparse
+import base64
+import json
+import os
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import settings
+
+
+class WaterMask:
+    """
+    Class vùng mặt nước của một camera: mask nhị phân và vùng crop bao quanh
+
+    Mask được tạo một lần (model segmentation hoặc đa giác do người vận hành
+    đánh dấu) và dùng lại cho mọi frame sau đó: frame được crop về vùng bao
+    mặt nước trước khi inference, detection có tâm nằm ngoài mặt nước bị bỏ.
+    Mask theo từng độ phân giải frame được tính một lần rồi giữ trong cache.
+    """
+
+    def __init__(self, mask, source='polygon', created=None, margin=0.05, polygons=None):
+        """
+        Khởi tạo WaterMask
+
+        Args:
+            mask (np.array): [H, W] mask mặt nước (khác 0 = nước)
+            source (str): 'segmentation' hoặc 'polygon'
+            created (float): Thời điểm tạo mask
+            margin (float): Nới vùng crop thêm tỉ lệ này của kích thước frame mỗi phía
+            polygons (list): Đa giác người vận hành đánh dấu (pixel), nếu có
+        """
+        mask = np.asarray(mask) > 0
+        if mask.ndim != 2 or not mask.any():
+            raise ValueError("Water mask is empty")
+        self.mask = mask
+        self.source = source
+        self.created = time.time() if created is None else created
+        self.margin = margin
+        self.polygons = polygons
+        self._lock = threading.Lock()
+        self._scaled = {}  # (height, width) -> (mask, crop)
+
+    @classmethod
+    def from_polygons(cls, image_shape, polygons, **kwargs):
+        """
+        Tạo mask từ các đa giác [[x, y], ...]; tọa độ trong khoảng 0-1 được
+        hiểu là tỉ lệ theo kích thước frame
+        """
+        height, width = image_shape[:2]
+        points = [np.asarray(polygon, dtype=np.float64).reshape(-1, 2) for polygon in polygons]
+        if not points or any(len(p) < 3 for p in points):
+            raise ValueError("Each water polygon needs at least 3 points")
+        if all(p.max() <= 1.0 for p in points):
+            points = [p * [width, height] for p in points]
+
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(mask, [np.round(p).astype(np.int32) for p in points], 1)
+        return cls(mask, source='polygon', polygons=[p.tolist() for p in points], **kwargs)
+
+    @classmethod
+    def from_segmentation(cls, image, model, class_names=settings.WATER_MASK_CLASSES, confidence=0.25, **kwargs):
+        """
+        Tạo mask từ model segmentation: hợp các mask có class mặt nước
+
+        Args:
+            image (np.array): Frame BGR của camera
+            model: Model YOLO segmentation
+            class_names (tuple): Tên class được coi là mặt nước
+        """
+        results = model.predict(image, conf=confidence, verbose=False)
+        result = results[0]
+        mask = np.zeros(image.shape[:2], dtype=np.uint8)
+        if result.masks is not None:
+            names = result.names
+            for cls, polygon in zip(result.boxes.cls.cpu().numpy(), result.masks.xy):
+                if names[int(cls)] in class_names and len(polygon) >= 3:
+                    cv2.fillPoly(mask, [np.round(polygon).astype(np.int32)], 1)
+        if not mask.any():
+            raise ValueError(f"Segmentation model found no water ({', '.join(class_names)}), mark the water region manually")
+        return cls(mask, source='segmentation', **kwargs)
+
+    def for_shape(self, image_shape):
+        """
+        Mask và vùng crop (x0, y0, x1, y1) cho frame có kích thước image_shape
+        """
+        shape = tuple(image_shape[:2])
+        with self._lock:
+            cached = self._scaled.get(shape)
+            if cached is None:
+                height, width = shape
+                mask = self.mask
+                if mask.shape != shape:
+                    mask = cv2.resize(mask.astype(np.uint8), (width, height), interpolation=cv2.INTER_NEAREST) > 0
+                ys = np.flatnonzero(mask.any(axis=1))
+                xs = np.flatnonzero(mask.any(axis=0))
+                pad_x, pad_y = int(self.margin * width), int(self.margin * height)
+                crop = (max(0, int(xs[0]) - pad_x), max(0, int(ys[0]) - pad_y),
+                        min(width, int(xs[-1]) + 1 + pad_x), min(height, int(ys[-1]) + 1 + pad_y))
+                cached = self._scaled[shape] = (mask, crop)
+            return cached
+
+    def crop(self, image):
+        """
+        Crop frame về vùng mặt nước (view, không copy)
+
+        Returns:
+            tuple: (ảnh đã crop, (x0, y0) offset để đưa box về frame gốc)
+        """
+        _, (x0, y0, x1, y1) = self.for_shape(image.shape)
+        return image[y0:y1, x0:x1], (x0, y0)
+
+    def contains(self, bboxes, image_shape):
+        """
+        Box nào có tâm nằm trên mặt nước
+
+        Args:
+            bboxes (np.array): [N, 4] [x1, y1, x2, y2] theo pixel của frame gốc
+
+        Returns:
+            np.array: [N] bool
+        """
+        mask, _ = self.for_shape(image_shape)
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        height, width = mask.shape
+        cx = np.clip(((bboxes[:, 0] + bboxes[:, 2]) / 2).astype(np.int64), 0, width - 1)
+        cy = np.clip(((bboxes[:, 1] + bboxes[:, 3]) / 2).astype(np.int64), 0, height - 1)
+        return mask[cy, cx]
+
+    def info(self, image_shape=None):
+        shape = self.mask.shape if image_shape is None else image_shape[:2]
+        mask, crop = self.for_shape(shape)
+        x0, y0, x1, y1 = crop
+        return {
+            "source": self.source,
+            "created": self.created,
+            "frame_size": [int(shape[1]), int(shape[0])],
+            "crop": [x0, y0, x1, y1],
+            "water_fraction": round(float(mask.mean()), 3),
+            "crop_fraction": round((x1 - x0) * (y1 - y0) / float(shape[0] * shape[1]), 3)
+        }
+
+    def to_dict(self):
+        """
+        Mask dạng JSON (bit-packed, base64) để chuyển giữa các API instance
+        """
+        return {
+            "shape": list(self.mask.shape),
+            "mask": base64.b64encode(np.packbits(self.mask, axis=1).tobytes()).decode('ascii'),
+            "source": self.source,
+            "created": self.created,
+            "margin": self.margin,
+            "polygons": self.polygons
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        height, width = data['shape']
+        packed = np.frombuffer(base64.b64decode(data['mask']), dtype=np.uint8).reshape(height, -1)
+        mask = np.unpackbits(packed, axis=1, count=width).astype(bool)
+        return cls(mask, source=data.get('source', 'polygon'), created=data.get('created'),
+                   margin=data.get('margin', 0.05), polygons=data.get('polygons'))
+
+    def save(self, path):
+        meta = {"source": self.source, "created": self.created, "margin": self.margin, "polygons": self.polygons}
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, mask=np.packbits(self.mask, axis=1), shape=np.array(self.mask.shape),
+                            meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            height, width = data['shape']
+            mask = np.unpackbits(data['mask'], axis=1, count=int(width)).astype(bool)
+            meta = json.loads(str(data['meta']))
+        return cls(mask, **meta)
+
+
+class WaterMaskStore:
+    """
+    Class lưu mask mặt nước theo camera (mỗi camera một file .npz trong thư mục)
+    """
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._masks = {}
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.npz') and '.tmp' not in name:
+                try:
+                    self._masks[name[:-4]] = WaterMask.load(os.path.join(self.directory, name))
+                except Exception as ex:
+                    print(f"Error loading water mask {name}: {ex}")
+
+    def _path(self, camera_id):
+        if not re.fullmatch(r'[\w.-]+', camera_id) or camera_id.startswith('.'):
+            raise ValueError(f"Invalid camera id '{camera_id}'")
+        return os.path.join(self.directory, f"{camera_id}.npz")
+
+    def get(self, camera_id):
+        with self._lock:
+            return self._masks.get(camera_id)
+
+    def set(self, camera_id, water_mask):
+        water_mask.save(self._path(camera_id))
+        with self._lock:
+            self._masks[camera_id] = water_mask
+
+    def remove(self, camera_id):
+        path = self._path(camera_id)
+        with self._lock:
+            removed = self._masks.pop(camera_id, None) is not None
+        if os.path.exists(path):
+            os.remove(path)
+        return removed
+
+    def camera_ids(self):
+        with self._lock:
+            return sorted(self._masks)
+
+    def info(self):
+        with self._lock:
+            masks = dict(self._masks)
+        return {camera_id: water_mask.info() for camera_id, water_mask in sorted(masks.items())}
+
+
+def main():
+    """
+    Tạo mask mặt nước cho camera từ một frame (chạy một lần hoặc định kỳ bằng cron)
+    """
+    parser = argparse.ArgumentParser(description="Create the water-region mask of a camera")
+    parser.add_argument('camera_id')
+    parser.add_argument('image', help="Frame of the camera (jpg/png)")
+    parser.add_argument('--polygon', help="JSON list of polygons [[[x, y], ...], ...] instead of segmentation")
+    parser.add_argument('--model', default=str(settings.SEGMENTATION_MODEL))
+    parser.add_argument('--classes', default=','.join(settings.WATER_MASK_CLASSES),
+                        help="Comma-separated class names treated as water")
+    parser.add_argument('--margin', type=float, default=settings.WATER_MASK_MARGIN)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        parser.error(f"Cannot read image {args.image}")
+    if args.polygon:
+        water_mask = WaterMask.from_polygons(image.shape, json.loads(args.polygon), margin=args.margin)
+    else:
+        from helper import load_model
+        water_mask = WaterMask.from_segmentation(image, load_model(args.model), tuple(args.classes.split(',')),
+                                                 margin=args.margin)
+
+    WaterMaskStore(settings.WATER_MASK_DIR).set(args.camera_id, water_mask)
+    print(json.dumps(water_mask.info(), indent=2))
+
+
+if __name__ == '__main__':
+    main()